@@ -0,0 +1,575 @@
+"""
+alignment.py
+
+Specialized engines for the DNA alignment problem, scoring with the same reward_match,
+penalty_subst and penalty_insdel as the DnaAlignGame, for sequences too long to align by
+the generic solver. An alignment is the sequence of the game's actions along the optimal
+path: 0 uses both X & Y, 1 uses X only, 2 uses Y only.
+"""
+import os
+import heapq
+import itertools
+import numpy as np
+from concurrent import futures
+
+MATCH, XONLY, YONLY = 0, 1, 2       # the actions of the DnaAlignGame
+
+
+def sequence(x):
+
+    """
+    Converts a DNA sequence into a numpy uint8 array, without copying bytes.
+
+    x:          a str, bytes or uint8 array
+    return:     the uint8 array
+    """
+
+    if isinstance(x, str):
+        x = x.encode('ascii')
+    if isinstance(x, (bytes, bytearray)):
+        return np.frombuffer(x, dtype=np.uint8)
+    return np.asarray(x, dtype=np.uint8)
+
+
+class Alignment(object):
+
+    """
+    The result of an alignment, its score and the actions along the optimal path.
+    """
+
+    def __init__(self, score, actions, x, y, bandHit=False, dropHit=False):
+        """
+        Constructor
+
+        score: the total score of the alignment, None if not aligned to the end
+        actions: a uint8 array of the actions along the optimal path
+        x: the 1st DNA sequence as a uint8 array
+        y: the 2nd DNA sequence as a uint8 array
+        bandHit: whether a path leaving the band could score as much, so a wider band may 
+                 score more
+        dropHit: whether the X-drop pruned any cell, so a larger X may score more, and the 
+                 score is None if it abandoned all the paths before the end of the sequences
+        """
+        self.score = score
+        self.actions = actions
+        self.x = x
+        self.y = y
+        self.bandHit = bandHit
+        self.dropHit = dropHit
+
+    def aligned(self):
+        """
+        return: the two aligned sequences as strings, with '-' for the gaps
+        """
+        useX = self.actions != YONLY
+        useY = self.actions != XONLY
+        x = np.full(len(self.actions), ord('-'), dtype=np.uint8)
+        y = np.full(len(self.actions), ord('-'), dtype=np.uint8)
+        x[useX] = self.x
+        y[useY] = self.y
+        return x.tobytes().decode('ascii'), y.tobytes().decode('ascii')
+
+    def cigar(self):
+        """
+        The CIGAR string of the alignment, with x as the query and y as the reference:
+        '=' for a match, 'X' for a substitution, 'I' for X only and 'D' for Y only.
+
+        return: the CIGAR string, e.g. '3=1X2I4='
+        """
+        codes = np.array([ord('='), ord('I'), ord('D')], dtype=np.uint8)[self.actions]
+        both = np.flatnonzero(self.actions == MATCH)
+        i = np.cumsum(self.actions != YONLY) - 1        # the offsets of the actions in x
+        j = np.cumsum(self.actions != XONLY) - 1        # the offsets of the actions in y
+        codes[both[self.x[i[both]] != self.y[j[both]]]] = ord('X')
+
+        if len(codes) == 0:
+            return ''
+        starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+        lengths = np.diff(np.concatenate([starts, [len(codes)]]))
+        return ''.join('%d%c' % (n, c) for n, c in zip(lengths.tolist(), codes[starts].tolist()))
+
+    def __repr__(self):
+        if self.score is None:
+            return 'Alignment(score=None, dropHit=True)'
+        return 'Alignment(score=%r, cigar=%r, bandHit=%r, dropHit=%r)' % (
+            self.score, self.cigar(), self.bandHit, self.dropHit)
+
+
+class LinearAligner(object):
+
+    """
+    Aligns two DNA sequences in O(n + m) memory by Hirschberg's divide and conquer. The
+    scores of a whole row of subproblems are computed at once with numpy: as the insdel
+    penalty is linear, the gaps along a row are a running maximum.
+    """
+
+    def __init__(self, game, cutoff=1 << 16):
+        """
+        Constructor
+
+        game: the DnaAlignGame, whose scores are used
+        cutoff: the number of cells below which a subproblem is solved by the full table
+        """
+        self.match = game.reward_match
+        self.subst = game.penalty_subst
+        self.insdel = game.penalty_insdel
+        self.cutoff = cutoff
+
+    def score(self, x, y):
+        """
+        Scores the optimal alignment in linear memory, without the traceback.
+
+        x: the 1st DNA sequence
+        y: the 2nd DNA sequence
+        return: the optimal score, same as the utility of DeterministicSolver
+        """
+        return int(self.suffixScores(sequence(x), sequence(y))[0])
+
+    def align(self, x, y):
+        """
+        Aligns two DNA sequences in linear memory.
+
+        x: the 1st DNA sequence
+        y: the 2nd DNA sequence
+        return: the optimal Alignment
+        """
+        x, y = sequence(x), sequence(y)
+        pieces = []
+        score = self._align(x, y, pieces)
+        actions = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.uint8)
+        return Alignment(score, actions, x, y)
+
+    def _align(self, x, y, pieces):
+        """
+        Hirschberg's recursion, splits x in half and y where the halves score the best.
+
+        x: the 1st DNA sequence as a uint8 array
+        y: the 2nd DNA sequence as a uint8 array
+        pieces: the list to append the arrays of actions to, in order
+        return: the optimal score
+        """
+        n, m = len(x), len(y)
+        if n <= 1 or (n + 1) * (m + 1) <= self.cutoff:
+            score, actions = self.table(x, y)
+            pieces.append(actions)
+            return score
+
+        mid = n // 2
+        suffix = self.suffixScores(x[mid:], y)                  # x[mid:] with y[j:]
+        prefix = self.suffixScores(x[mid - 1::-1], y[::-1])     # x[:mid] with y[:j]
+        total = prefix[::-1] + suffix
+        j = int(np.argmax(total))
+        self._align(x[:mid], y[:j], pieces)
+        self._align(x[mid:], y[j:], pieces)
+        return int(total[j])
+
+    def suffixScores(self, x, y):
+        """
+        Computes the optimal scores of aligning x with every suffix of y, row by row from
+        the end of x, keeping only one row.
+
+        x: the 1st DNA sequence as a uint8 array
+        y: the 2nd DNA sequence as a uint8 array
+        return: an int64 array of the scores of x with y[j:], for j in 0..len(y)
+        """
+        m = len(y)
+        gaps = self.insdel * np.arange(m, -1, -1, dtype=np.int64)     # insdel * (m - j)
+        row = gaps.copy()                                           # x[n:] with y[j:]
+        for c in x[::-1].tolist():
+            row = self._row(row, c, y, gaps)
+        return row
+
+    def _row(self, below, c, y, gaps):
+        """
+        Computes a row of the suffix scores from the row below it.
+
+        below: the scores of x[i+1:] with y[j:]
+        c: the character x[i]
+        y: the 2nd DNA sequence as a uint8 array
+        gaps: insdel * (len(y) - j), to turn the gaps along the row into a running maximum
+        return: the scores of x[i:] with y[j:]
+        """
+        row = below + self.insdel                                   # use X only
+        row[:-1] = np.maximum(row[:-1], below[1:] + np.where(y == c, self.match, self.subst))
+        row -= gaps                                                 # then use Y only
+        return np.maximum.accumulate(row[::-1])[::-1] + gaps
+
+    def table(self, x, y):
+        """
+        Solves a small subproblem with the full table of suffix scores, and traces back
+        the optimal path taking the actions in the same order of preference as the solver.
+
+        x: the 1st DNA sequence as a uint8 array
+        y: the 2nd DNA sequence as a uint8 array
+        return: the optimal score, and a uint8 array of the actions
+        """
+        n, m = len(x), len(y)
+        gaps = self.insdel * np.arange(m, -1, -1, dtype=np.int64)
+        table = np.empty((n + 1, m + 1), dtype=np.int64)
+        table[n] = gaps
+        for i in range(n - 1, -1, -1):
+            table[i] = self._row(table[i + 1], x[i], y, gaps)
+
+        actions = []
+        i = j = 0
+        while i < n or j < m:
+            if i < n and j < m:
+                reward = self.match if x[i] == y[j] else self.subst
+                if table[i, j] == reward + table[i + 1, j + 1]:
+                    actions.append(MATCH)
+                    i, j = i + 1, j + 1
+                    continue
+            if i < n and table[i, j] == self.insdel + table[i + 1, j]:
+                actions.append(XONLY)
+                i += 1
+            else:
+                actions.append(YONLY)
+                j += 1
+        return int(table[0, 0]), np.array(actions, dtype=np.uint8)
+
+
+class BandedAligner(object):
+
+    """
+    Aligns two similar DNA sequences visiting only the subproblems near the diagonal, in 
+    O((n + m) * width) time and memory. The banded mode keeps the diagonals j - i within a
+    band around the ones from the start to the end, and the X-drop mode abandons the paths 
+    whose score falls more than X below the best seen so far. The scores are computed row by
+    row forward, from the start of the sequences, so that the X-drop can see them.
+    """
+
+    NEG = -(1 << 60)        # the score of the cells out of the band or dropped
+
+    def __init__(self, game, band=None, xdrop=None):
+        """
+        Constructor
+
+        game: the DnaAlignGame, whose scores are used
+        band: the number of diagonals kept on either side, None for no band
+        xdrop: the score X below the best seen to abandon a path, None for no X-drop
+        """
+        self.match = game.reward_match
+        self.subst = game.penalty_subst
+        self.insdel = game.penalty_insdel
+        self.band = band
+        self.xdrop = xdrop
+
+    def align(self, x, y):
+        """
+        Aligns two DNA sequences within the band and the X-drop.
+
+        x: the 1st DNA sequence
+        y: the 2nd DNA sequence
+        return: the Alignment, optimal among the paths kept, with bandHit and dropHit to
+                tell whether to rerun wider
+        """
+        x, y = sequence(x), sequence(y)
+        n, m = len(x), len(y)
+        if self.band is None:
+            low, high = -n, m
+        else:
+            low, high = min(0, m - n) - self.band, max(0, m - n) + self.band
+        if self.xdrop is None or self.insdel >= 0:      # the gaps alone never drop
+            reach = m
+        else:
+            reach = self.xdrop // -self.insdel + 1
+
+        rows = []           # (first column, directions) of the cells kept in every row
+        start, scores = 0, None
+        best = 0
+        dropHit = False     # whether the X-drop pruned any cell
+        edge = self.NEG     # the best score a path leaving the band could still reach
+        for i in range(n + 1):
+            if i == 0:
+                first, last = 0, min(m, high, reach)
+            else:
+                first, last = max(start, i + low), min(start + len(scores) + reach, i + high, m)
+            if first > last:
+                break
+
+            j = np.arange(first, last + 1)
+            if i == 0:
+                values = self.insdel * j
+                directions = np.full(len(j), YONLY, dtype=np.uint8)
+            else:
+                values, directions = self._row(x[i - 1], y, j, start, scores)
+
+            best = max(best, int(values.max()))
+            if self.xdrop is not None:
+                dropped = (values < best - self.xdrop) & (values > self.NEG // 2)
+                dropHit |= bool(dropped.any())
+                values[dropped] = self.NEG
+            if self.band is not None:
+                edge = max(edge, self._edge(values, first, i, i + low, i < n, n, m),
+                           self._edge(values, first, i, i + high, i + high < m, n, m))
+            kept = np.flatnonzero(values > self.NEG // 2)
+            if len(kept) == 0:
+                break
+            start, scores = first + kept[0], values[kept[0]:kept[-1] + 1]
+            rows.append((start, directions[kept[0]:kept[-1] + 1]))
+
+        if len(rows) < n + 1 or not start <= m < start + len(scores) \
+                or scores[m - start] <= self.NEG // 2:
+            return Alignment(None, np.zeros(0, dtype=np.uint8), x, y, dropHit=True)
+
+        score = int(scores[m - start])
+        actions = []
+        i, j = n, m
+        while i > 0 or j > 0:
+            action = rows[i][1][j - rows[i][0]] if i > 0 else YONLY
+            actions.append(action)
+            i -= action != YONLY
+            j -= action != XONLY
+        actions = np.array(actions[::-1], dtype=np.uint8)
+        return Alignment(score, actions, x, y, bandHit=edge >= score, dropHit=dropHit)
+
+    def _edge(self, values, first, i, j, leaves, n, m):
+        """
+        Bounds the score of the paths leaving the band from a cell on its edge, which is the
+        forward score of the cell plus an upper bound of the rest. Of the a bases left of x 
+        and b of y, k are aligned in pairs and the rest are gaps, which is linear in k, so
+        the bound is the best of k = 0 and min(a, b).
+
+        values: the forward scores of the cells of the row
+        first: the column of the first cell of the row
+        i: the row
+        j: the column of the edge cell
+        leaves: whether a step from the cell leaves the band, rather than the table
+        n, m: the lengths of the sequences
+        return: the bound, NEG if the cell is not in the row or is dropped
+        """
+        if not leaves or not first <= j < first + len(values) or \
+                values[j - first] <= self.NEG // 2:
+            return self.NEG
+        a, b = n - i, m - j
+        rest = max(self.insdel * (a + b),
+                   max(self.match, self.subst) * min(a, b) + self.insdel * abs(a - b))
+        return int(values[j - first]) + rest
+
+    def _row(self, c, y, j, start, scores):
+        """
+        Computes the forward scores of a row of cells from the cells kept in the row above.
+
+        c: the character of x of this row
+        y: the 2nd DNA sequence as a uint8 array
+        j: the columns of the cells to compute
+        start: the first column of the cells kept in the row above
+        scores: the scores of the cells kept in the row above
+        return: the scores of the cells, and the actions leading into them
+        """
+        above = np.full(len(j) + 1, self.NEG, dtype=np.int64)    # above at columns j - 1, j
+        lo, hi = max(j[0] - 1, start), min(j[-1], start + len(scores) - 1)
+        if lo <= hi:
+            above[lo - j[0] + 1:hi - j[0] + 2] = scores[lo - start:hi - start + 1]
+
+        up = above[1:] + self.insdel                                # use X only
+        diagonal = above[:-1].copy()                                # use both X & Y
+        if len(y) > 0:
+            diagonal += np.where(y[j - 1] == c, self.match, self.subst)
+        if j[0] == 0:
+            diagonal[0] = self.NEG
+        best = np.maximum(diagonal, up)
+        gaps = self.insdel * j
+        values = np.maximum.accumulate(best - gaps) + gaps          # then use Y only
+        directions = np.where(values > best, YONLY, np.where(diagonal >= up, MATCH, XONLY))
+        return values, directions.astype(np.uint8)
+
+
+class DiagonalAligner(object):
+
+    """
+    Aligns two DNA sequences computing the whole table of suffix scores one anti-diagonal
+    i + j at a time, as numpy vector operations, since the cells of an anti-diagonal only 
+    depend on the next two. The scores are kept for three anti-diagonals, and the optimal
+    action of every cell is stored as a direction code, 1 byte per cell, to trace back the
+    alignment. The actions are preferred in the same order as DeterministicSolver, so the 
+    alignment is the solver's optimal path.
+    """
+
+    NEG = -(1 << 60)        # the score of the cells out of the table
+
+    def __init__(self, game):
+        """
+        Constructor
+
+        game: the DnaAlignGame, whose scores are used
+        """
+        self.match = game.reward_match
+        self.subst = game.penalty_subst
+        self.insdel = game.penalty_insdel
+
+    def align(self, x, y):
+        """
+        Aligns two DNA sequences.
+
+        x: the 1st DNA sequence
+        y: the 2nd DNA sequence
+        return: the optimal Alignment
+        """
+        x, y = sequence(x), sequence(y)
+        n, m = len(x), len(y)
+        px = np.append(x, np.uint8(0))          # pad the ends to slice i == n and j == m
+        py = np.append(y, np.uint8(0))[::-1]    # reversed, as j decreases along a diagonal
+
+        lows = np.maximum(0, np.arange(n + m + 1) - m)      # the range of i of a diagonal
+        highs = np.minimum(n, np.arange(n + m + 1))
+        offsets = np.concatenate([[0], np.cumsum(highs - lows + 1)])
+        directions = np.empty(offsets[-1], dtype=np.uint8)
+
+        scores = [np.full(n + 2, self.NEG, dtype=np.int64) for _ in range(3)]
+        for d in range(n + m, -1, -1):
+            current, next1, next2 = scores[d % 3], scores[(d + 1) % 3], scores[(d + 2) % 3]
+            lo, hi = lows[d], highs[d]
+            if d == n + m:
+                current.fill(self.NEG)
+                current[n] = 0                          # terminal
+                directions[offsets[d]] = MATCH
+                continue
+
+            i = slice(lo, hi + 1)
+            after = slice(lo + 1, hi + 2)
+            chars = py[m - d + lo:m - d + hi + 1]     # y[j] for j from d - lo down to d - hi
+            both = next2[after] + np.where(px[i] == chars, self.match, self.subst)
+            if d - lo == m:
+                both[0] = self.NEG                      # j == m, i == n is NEG already
+            xonly = next1[after] + self.insdel
+            yonly = next1[i] + self.insdel
+
+            best = np.maximum(both, np.maximum(xonly, yonly))
+            codes = np.where(both == best, MATCH, np.where(xonly == best, XONLY, YONLY))
+            current.fill(self.NEG)
+            current[i] = best
+            directions[offsets[d]:offsets[d + 1]] = codes
+
+        actions = np.empty(n + m, dtype=np.uint8)
+        i = j = k = 0
+        while i < n or j < m:
+            d = i + j
+            action = directions[offsets[d] + i - lows[d]]
+            actions[k] = action
+            k += 1
+            i += action != YONLY
+            j += action != XONLY
+        return Alignment(int(scores[0][0]), actions[:k], x, y)
+
+
+def readFasta(source):
+
+    """
+    Streams the records of a FASTA file, holding one sequence in memory at a time.
+
+    source:     the path of the FASTA file, or an iterable of its lines
+    return:     a generator of (name, sequence as bytes), the name is the first word of
+                the header line
+    """
+
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for record in readFasta(f):
+                yield record
+        return
+
+    name, lines = None, []
+    for line in source:
+        if isinstance(line, str):
+            line = line.encode('ascii')
+        line = line.strip()
+        if line.startswith(b'>'):
+            if name is not None:
+                yield name, b''.join(lines)
+            header = line[1:].split()
+            name, lines = (header[0].decode() if header else ''), []
+        elif line and name is not None:
+            lines.append(line.upper())
+    if name is not None:
+        yield name, b''.join(lines)
+
+
+def alignOne(aligner, query, name, reference):
+
+    """
+    Aligns the query with one reference, the task of a worker process of alignMany().
+
+    aligner:    the alignment engine
+    query:      the query sequence
+    name:       the name of the reference
+    reference:  the reference sequence
+    return:     (name, Alignment)
+    """
+
+    return name, aligner.align(query, reference)
+
+
+def alignMany(aligner, query, references, workers=None):
+
+    """
+    Aligns one query against many references streamed through a pool of worker processes.
+    Only a few references per worker are read ahead, so the references are never loaded at
+    once, e.g. alignMany(LinearAligner(game), query, readFasta(path)).
+
+    aligner:    the alignment engine, e.g. LinearAligner, BandedAligner or DiagonalAligner
+    query:      the query sequence, as x of the alignments
+    references: an iterable of (name, sequence)
+    workers:    the number of processes, by default the number of CPUs, 1 to align in this
+                process
+    return:     a generator of (name, Alignment) in the order they are aligned
+    """
+
+    query = bytes(sequence(query))
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for name, reference in references:
+            yield alignOne(aligner, query, name, reference)
+        return
+
+    with futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for name, reference in references:
+            pending.add(pool.submit(alignOne, aligner, query, name, reference))
+            if len(pending) >= 2 * workers:     # read ahead a few references per worker
+                done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in futures.as_completed(pending):
+            yield future.result()
+
+
+def topHits(aligner, query, references, k, workers=None):
+
+    """
+    Keeps only the k best-scoring alignments of alignMany() in a bounded heap.
+
+    aligner:    the alignment engine
+    query:      the query sequence
+    references: an iterable of (name, sequence)
+    k:          the number of hits to keep
+    workers:    the number of processes
+    return:     a list of the best (name, Alignment), in decreasing score
+    """
+
+    heap = []                       # the k best (score, order, name, alignment)
+    order = itertools.count()
+    for name, alignment in alignMany(aligner, query, references, workers):
+        if alignment.score is None:         # abandoned by the X-drop
+            continue
+        item = (alignment.score, -next(order), name, alignment)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+    return [(name, alignment) for _, _, name, alignment in sorted(heap, reverse=True)]
+
+
+if __name__ == '__main__':
+
+    from dna import DnaAlignGame
+
+    """
+    An example of aligning two DNA sequences in linear memory:
+    """
+    game = DnaAlignGame()
+    aligner = LinearAligner(game)
+    alignment = aligner.align('TTCATA', 'TGCTCGTA')
+    print('The max utility is %f' % alignment.score)
+    print('The alignment is %s' % alignment.cigar())
+    print('\n'.join(alignment.aligned()))
@@ -0,0 +1,454 @@
+"""
+benchmarks.py
+
+Benchmarks the solvers on larger instances of the example games, run
+python benchmarks.py parallel [types] [max cores] to see how the parallel solver scales,
+python benchmarks.py align [lengths...] to compare the alignment engines with the solver,
+python benchmarks.py graph to compare the compiled state graph with the recursive solvers,
+python benchmarks.py suite [baseline] [threshold] to run the benchmark suite of all the games
+and solver modes, and to compare it against the JSON baseline, saved on the first run, by
+default benchmarks.json, which is specific to the machine and not committed, delete it to
+save a new one,
+python benchmarks.py startup [runs] to measure the startup of the command line,
+python benchmarks.py sampling [samples...] to compare the accuracy and the runtime of the
+sampling solver against the exact solver.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+import tracemalloc
+import numpy as np
+from knapsack import KnapsackGame
+from dna import DnaAlignGame
+from blackjack import BlackjackGame
+from dpsolver import DeterministicSolver, StochasticSolver
+from dpgraph import GraphSolver
+from dpsample import SampledSolver
+from alignment import DiagonalAligner, LinearAligner
+
+
+def knapsackInstance(types, seed=0):
+
+    """
+    Generates a random knapsack problem, with the capacity about a third of the total weight.
+
+    types:      the number of item types
+    seed:       the random seed
+    return:     the capacity, items, weights and values for KnapsackGame.reset()
+    """
+
+    rng = np.random.RandomState(seed)
+    items = rng.randint(1, 4, types)
+    weights = rng.randint(1, 20, types).astype(float)
+    values = rng.randint(1, 30, types).astype(float)
+    capacity = float(np.sum(items * weights) // 3)
+    return capacity, items, weights, values
+
+
+def blackjackStates(count, seed=0):
+
+    """
+    Samples the initial states of the Blackjack policy grid.
+
+    count:      the number of states, at most the 170 cells of the grid
+    seed:       the random seed
+    return:     a list of (usableace, playersum, dealercard) for BlackjackGame.reset()
+    """
+
+    cells = [(usableace, playersum, dealercard) for usableace in (0, 1)
+             for playersum in range(12 if usableace else 4, 21) for dealercard in range(1, 11)]
+    rng = np.random.RandomState(seed)
+    return [cells[n] for n in sorted(rng.permutation(len(cells))[:count])]
+
+
+def dnaPair(length, mutation=0.1, seed=0):
+
+    """
+    Generates a random DNA sequence and a mutated copy of it.
+
+    length:     the length of the sequences
+    mutation:   the probability of substituting each base in the copy
+    seed:       the random seed
+    return:     the two sequences as bytes
+    """
+
+    rng = np.random.RandomState(seed)
+    bases = np.frombuffer(b'ACGT', dtype=np.uint8)
+    x = bases[rng.randint(0, 4, length)]
+    y = x.copy()
+    mutated = rng.rand(length) < mutation
+    y[mutated] = bases[rng.randint(0, 4, mutated.sum())]
+    return x.tobytes(), y.tobytes()
+
+
+def benchAlign(lengths=(50, 100, 200, 400), seed=0):
+
+    """
+    Aligns random DNA pairs of increasing lengths with the recursive DeterministicSolver
+    and the numpy alignment engines, checks they score the same and prints the wall times.
+
+    lengths:    the lengths of the DNA sequences, the recursive solver needs 2 frames each
+    seed:       the random seed of the sequences
+    return:     a list of (length, solver seconds, diagonal seconds, linear seconds)
+    """
+
+    game = DnaAlignGame()
+    engines = [DiagonalAligner(game), LinearAligner(game)]
+
+    results = []
+    print('%8s %12s %12s %12s' % ('length', 'solver', 'diagonal', 'linear'))
+    for length in lengths:
+        x, y = dnaPair(length, seed=seed)
+        start = time.time()
+        optimal, utility = DeterministicSolver(game).solve(game.reset(x, y))
+        seconds = [time.time() - start]
+        for engine in engines:
+            start = time.time()
+            score = engine.align(x, y).score
+            seconds.append(time.time() - start)
+            if score != utility:
+                raise AssertionError('%s scores %d, the solver %d'
+                                     % (type(engine).__name__, score, utility))
+        print('%8d %11.3fs %11.3fs %11.3fs' % tuple([length] + seconds))
+        results.append(tuple([length] + seconds))
+    return results
+
+
+def benchParallel(types=20, cores=(1, 2, 4, 8, 16), seed=0):
+
+    """
+    Solves a large knapsack problem with DeterministicSolver.solveParallel() on an increasing
+    number of cores, against the serial solve(), and prints the wall times and the number
+    of subproblems solved of every run next to the serial ones, and the speedups. The serial
+    solve() prunes by the branch and bound, and so do the workers from the shared incumbent,
+    so the subproblems tell how much of the pruning the workers lose. The default problem
+    takes the serial solve() about 25 seconds and 126k subproblems, as the smaller ones are
+    over before the worker processes pay off their start.
+
+    types:      the number of item types of the knapsack problem
+    cores:      the numbers of worker processes to try
+    seed:       the random seed of the problem
+    return:     a list of (cores, seconds, utility, subproblems), where 0 cores is the serial
+                solve()
+    """
+
+    game = KnapsackGame()
+    instance = knapsackInstance(types, seed)
+
+    print('%d CPUs, %d item types' % (os.cpu_count(), types))
+    print('%8s %11s %11s %12s %12s %8s' % ('cores', 'seconds', 'serial', 'subproblems',
+                                           'serial', 'speedup'))
+    results = []
+    for n in (0,) + tuple(cores):
+        solver = DeterministicSolver(game)
+        state = game.reset(*instance)
+        start = time.time()
+        if n == 0:
+            optimal, utility = solver.solve(state)
+        else:
+            optimal, utility = solver.solveParallel(state, workers=n)
+        seconds = time.time() - start
+        results.append((n, seconds, utility, solver.cachedCounter))
+
+        if n > 0 and utility != results[0][2]:
+            raise AssertionError('parallel utility %f differs from serial %f'
+                                 % (utility, results[0][2]))
+        print('%8s %10.3fs %10.3fs %12d %12d %7.2fx' % (n or 'serial', seconds, results[0][1],
+                                                       solver.cachedCounter, results[0][3],
+                                                       results[0][1] / seconds))
+    print('utility %f' % results[0][2])
+    return results
+
+
+def benchGraph(types=10, seed=0):
+
+    """
+    Solves every cell of the Blackjack policy grid, and a knapsack problem, with the recursive
+    solvers and with the GraphSolver compiled once, checks they agree and prints the wall
+    times of the compile, the backward induction and the queries.
+
+    types:      the number of item types of the knapsack problem
+    seed:       the random seed of the knapsack problem
+    return:     a list of (problem, solver seconds, compile seconds, induction seconds,
+                query seconds)
+    """
+
+    game = BlackjackGame()
+    blackjack = [(game, True, game.reset(usableace, playersum, dealercard))
+                 for usableace in (0, 1) for playersum in range(12 if usableace else 4, 21)
+                 for dealercard in range(1, 11)]
+    game = KnapsackGame()
+    knapsack = [(game, False, game.reset(*knapsackInstance(types, seed)))]
+
+    results = []
+    print('%10s %10s %10s %10s %10s' % ('problem', 'solver', 'compile', 'induction', 'queries'))
+    for name, problems in (('blackjack', blackjack), ('knapsack', knapsack)):
+        game, stochastic = problems[0][:2]
+        solver = (StochasticSolver if stochastic else DeterministicSolver)(game)
+        start = time.time()
+        expected = [solver.solve(state)[1] for _, _, state in problems]
+        seconds = [time.time() - start]
+
+        graph = GraphSolver(game, stochastic)
+        start = time.time()
+        for _, _, state in problems:
+            graph.compile(state)
+        seconds.append(time.time() - start)
+        start = time.time()
+        graph.backwardInduction()
+        seconds.append(time.time() - start)
+        start = time.time()
+        utilities = [graph.solve(state)[1] for _, _, state in problems]
+        seconds.append(time.time() - start)
+
+        if utilities != expected:
+            raise AssertionError('the graph solver differs from the recursive solver on %s'
+                                 % name)
+        print('%10s %9.3fs %9.3fs %9.3fs %9.3fs' % tuple([name] + seconds))
+        results.append(tuple([name] + seconds))
+    return results
+
+
+def benchSampling(samples=(2, 4, 8, 16, 32, 64), seed=0):
+
+    """
+    Solves every cell of the Blackjack policy grid with the exact StochasticSolver, and
+    with the SampledSolver of every number of samples, and prints the wall times, the mean
+    and max absolute errors of the utilities, how many optimal actions agree with the exact
+    ones, and how many exact utilities lie within the 95% confidence intervals.
+
+    samples:    the numbers of samples of every action to try
+    seed:       the random seed of the draws
+    return:     a list of (samples, seconds, mean error, max error, agreement, coverage),
+                samples 0 for the exact solver
+    """
+
+    game = BlackjackGame()
+    cells = [game.reset(usableace, playersum, dealercard) for usableace in (0, 1)
+             for playersum in range(12 if usableace else 4, 21) for dealercard in range(1, 11)]
+    solver = StochasticSolver(game)
+    start = time.time()
+    exact = [solver.solve(state) for state in cells]
+    results = [(0, time.time() - start, 0., 0., 1., 1.)]
+    utilities = np.array([utility for _, utility in exact])
+
+    print('%8s %10s %10s %10s %10s %10s' % ('samples', 'seconds', 'mean error', 'max error',
+                                            'agreement', 'coverage'))
+    print('%8s %9.3fs %10.4f %10.4f %10.3f %10.3f' % (('exact',) + results[0][1:]))
+    for count in samples:
+        sampled = SampledSolver(game, count, seed=seed)
+        start = time.time()
+        estimates = [sampled.solve(state) for state in cells]
+        seconds = time.time() - start
+        intervals = np.array([sampled.interval(state) for state in cells])
+
+        errors = np.abs(np.array([utility for _, utility in estimates]) - utilities)
+        agreement = np.mean([e[0] == s[0] for e, s in zip(exact, estimates)])
+        coverage = np.mean((intervals[:, 0] <= utilities) & (utilities <= intervals[:, 1]))
+        results.append((count, seconds, errors.mean(), errors.max(), agreement, coverage))
+        print('%8d %9.3fs %10.4f %10.4f %10.3f %10.3f' % results[-1])
+    return results
+
+
+def benchStartup(runs=5):
+
+    """
+    Measures the wall time of starting the command line of python -m dpcli in new
+    processes, against the bare interpreter and the imports of the modules, the best of the
+    runs each.
+
+    runs:       the number of runs of every command
+    return:     a list of (command, seconds)
+    """
+
+    commands = [('python', ['-c', 'pass']),
+                ('import dpsolver', ['-c', 'import dpsolver']),
+                ('import blackjack_results', ['-c', 'import blackjack_results']),
+                ('-m dpcli --help', ['-m', 'dpcli', '--help'])]
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for name, args in commands:
+        seconds = []
+        for _ in range(runs):
+            start = time.time()
+            subprocess.run([sys.executable] + args, cwd=here, check=True,
+                           stdout=subprocess.DEVNULL)
+            seconds.append(time.time() - start)
+        print('%26s %9.3fs' % (name, min(seconds)))
+        results.append((name, min(seconds)))
+    return results
+
+
+WORKLOADS = {                  # name: (the sizes, the solver modes)
+    'knapsack': ((6, 9, 12), ('recursive', 'iterative', 'graph')),
+    'dna': ((50, 100, 200), ('recursive', 'iterative', 'graph')),
+    'blackjack': ((10, 50, 170), ('recursive', 'iterative', 'graph')),
+}
+
+
+def workload(name, size, seed=0):
+
+    """
+    Generates a seeded workload of a game.
+
+    name:       'knapsack' of the number of item types, 'dna' of the sequence length, or
+                'blackjack' of the number of initial states
+    size:       the size of the workload
+    seed:       the random seed
+    return:     the game, whether it is stochastic, and a function giving the list of the
+                initial states, which resets the game
+    """
+
+    if name == 'knapsack':
+        game = KnapsackGame()
+        instance = knapsackInstance(size, seed)
+        return game, False, lambda: [game.reset(*instance)]
+    elif name == 'dna':
+        game = DnaAlignGame()
+        x, y = dnaPair(size, seed=seed)
+        return game, False, lambda: [game.reset(x, y)]
+    elif name == 'blackjack':
+        game = BlackjackGame()
+        cells = blackjackStates(size, seed)
+        return game, True, lambda: [game.reset(*cell) for cell in cells]
+    raise ValueError('unknown workload %r' % name)
+
+
+def measure(name, size, mode, seed=0, repeat=3):
+
+    """
+    Solves a workload with a solver mode, timing the best of a few runs, then measuring the
+    peak memory of another run with tracemalloc, which slows it down.
+
+    name:       the name of the workload
+    size:       the size of the workload
+    mode:       'recursive' or 'iterative' DeterministicSolver or StochasticSolver, or 'graph'
+                for the GraphSolver
+    seed:       the random seed of the workload
+    repeat:     the number of timed runs
+    return:     a dict of the workload, the mode, the seconds, the subproblems solved and per
+                second, the peak bytes and the sum of the utilities
+    """
+
+    game, stochastic, states = workload(name, size, seed)
+
+    def run():
+        if mode == 'graph':
+            solver = GraphSolver(game, stochastic)
+            roots = states()
+            for state in roots:                 # compile all, then solve the graph once
+                solver.compile(state)
+            utilities = [solver.solve(state)[1] for state in roots]
+            return utilities, len(solver.states)
+        solverType = StochasticSolver if stochastic else DeterministicSolver
+        solver = solverType(game, iterative=(mode == 'iterative'))
+        utilities = [solver.solve(state)[1] for state in states()]
+        return utilities, solver.cachedCounter
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        utilities, subproblems = run()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'workload': name, 'size': size, 'mode': mode, 'seconds': min(seconds),
+            'subproblems': subproblems, 'perSecond': subproblems / min(seconds),
+            'peakBytes': peak, 'utility': float(np.sum(utilities))}
+
+
+def benchSuite(workloads=WORKLOADS, seed=0, repeat=3):
+
+    """
+    Measures every size of every workload with every solver mode.
+
+    workloads:  a dict of the workload names to their sizes and modes
+    seed:       the random seed of the workloads
+    repeat:     the number of timed runs of each
+    return:     the list of the results of measure()
+    """
+
+    results = []
+    print('%10s %6s %10s %10s %12s %14s %10s' % ('workload', 'size', 'mode', 'seconds',
+                                                 'subproblems', 'per second', 'peak MB'))
+    for name, (sizes, modes) in workloads.items():
+        for size in sizes:
+            for mode in modes:
+                result = measure(name, size, mode, seed, repeat)
+                print('%10s %6d %10s %9.3fs %12d %14.0f %10.2f'
+                      % (name, size, mode, result['seconds'], result['subproblems'],
+                         result['perSecond'], result['peakBytes'] / 2 ** 20))
+                results.append(result)
+    return results
+
+
+def compareBaseline(results, path, threshold=0.25):
+
+    """
+    Compares the results of benchSuite() against a baseline saved as JSON.
+
+    results:    the list of the results of measure()
+    path:       the JSON file of the baseline results
+    threshold:  the fraction of more seconds or peak bytes than the baseline to regress
+    return:     a list of the messages of the regressions, and of the utilities changed
+    """
+
+    with open(path) as f:
+        baseline = {(b['workload'], b['size'], b['mode']): b for b in json.load(f)}
+
+    regressions = []
+    for result in results:
+        base = baseline.get((result['workload'], result['size'], result['mode']))
+        if base is None:
+            continue
+        name = '%s %d %s' % (result['workload'], result['size'], result['mode'])
+        if not np.isclose(result['utility'], base['utility']):
+            regressions.append('%s: utility %f, the baseline %f'
+                               % (name, result['utility'], base['utility']))
+        for key in ('seconds', 'peakBytes'):
+            if result[key] > base[key] * (1 + threshold):
+                regressions.append('%s: %s %g, %.0f%% more than the baseline %g'
+                                   % (name, key, result[key],
+                                      100. * (result[key] / base[key] - 1), base[key]))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'parallel':
+        types = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        maxCores = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+        cores = tuple(n for n in (1, 2, 4, 8, 16) if n <= maxCores)
+        benchParallel(types, cores)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'align':
+        lengths = tuple(int(n) for n in sys.argv[2:]) or (50, 100, 200, 400)
+        benchAlign(lengths)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'graph':
+        benchGraph()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'sampling':
+        benchSampling(tuple(int(n) for n in sys.argv[2:]) or (2, 4, 8, 16, 32, 64))
+    elif len(sys.argv) > 1 and sys.argv[1] == 'startup':
+        benchStartup(int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'suite':
+        baseline = sys.argv[2] if len(sys.argv) > 2 else 'benchmarks.json'
+        threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.25
+        results = benchSuite()
+        if not os.path.exists(baseline):
+            with open(baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+            print('saved the baseline to %s' % baseline)
+        else:
+            regressions = compareBaseline(results, baseline, threshold)
+            for message in regressions:
+                print('REGRESSION ' + message)
+            sys.exit(1 if regressions else 0)
+    else:
+        print(__doc__)
@@ -10,6 +10,15 @@ counted as either 1 or 11, whichever to maximize the holder's goal.
 
 import numpy as np
 import hashlib
+import operator
+
+CARDS = np.arange(0, 10)        # all possible card points, shared by all the steps
+CARDS[0:2] += 10                # 10, J, Q, K and Ace, counted as 11 first
+PROBS = np.zeros(10)            # card points' probabilities
+PROBS[0] = 4. * 4. / 52.        # 10, J, Q, K
+PROBS[1:10] = 4. / 52.          # Ace and 2-9
+CARDS.setflags(write=False)     # read-only, as step() returns them to every caller
+PROBS.setflags(write=False)
 
 class BlackjackGame(object):
 
@@ -56,6 +65,42 @@ class BlackjackGame(object):
         return hashlib.sha1(state).hexdigest()
 
 
+    def encode(self, state):
+
+        """
+        Optionally, encodes a game state into a bounded integer index, which lets the solver
+        cache in dense arrays instead of a dict of hash values. Sums are at most 31 and 
+        usable aces at most 3, so the state packs into 3 x 32 x 4 x 32 x 4 indices.
+
+        state:      a state of the Blackjack game
+        return:     an integer index in [0, encodeSize())
+        """
+
+        turn, playersum, usableace, dealersum, dealerace = state.tolist()[:5]
+        return int((((turn * 32 + playersum) * 4 + usableace) * 32 + dealersum) * 4 + dealerace)
+
+
+    def encodeSize(self):
+
+        """
+        return:     the number of distinct integer indices given by encode()
+        """
+
+        return 3 * 32 * 4 * 32 * 4
+
+
+    def fingerprint(self):
+
+        """
+        Optionally, identifies the parameters of the game, so that a saved policy store is
+        only reused for the same rules.
+
+        return:     a string of the rules, the infinite deck has no parameters
+        """
+
+        return 'infinite deck'
+
+
     def actionDomain(self, state):
         
         """
@@ -98,12 +143,9 @@ class BlackjackGame(object):
                     together with the assosiated probabilities and rewards.
         """
 
-        newstates = np.tile(state, (10, 1))
-        cards = np.arange(0, 10)        # all possible card points
-        cards[0:2] += 10
-        probs = np.zeros(10)            # card points' probabilities
-        probs[0] = 4. * 4. / 52.        # 10, J, Q, K
-        probs[1:10] = 4. / 52.          # Ace and 2-9
+        newstates = np.empty((10, len(state)))
+        newstates[:] = state
+        cards, probs = CARDS, PROBS     # the same for every step of the infinite deck
         rewards = np.zeros(10)          # rewards are zeros unless end game
         
         if action == 0:                                         # player hit
@@ -140,3 +182,233 @@ class BlackjackGame(object):
         newstate[0] = 2                                         # signal game end
         reward = np.sign(newstate[1] - newstate[3]) 
         return np.array([newstate]), 1, reward                  # 1 win, -1 loss, 0 draw
+
+
+HAND = 3 * 32 * 4 * 32 * 4      # the number of hands packed in the low digits of a shoe state
+TURN = 32 * 4 * 32 * 4          # the place value of the turn in a hand
+
+class ShoeBlackjackGame(object):
+
+    """
+    Define the game object for the Blackjack game dealt from a finite shoe of some decks, 
+    where the probabilities of the cards depend on the cards remaining in the shoe. 
+    The state is a single integer: the hand, packed like BlackjackGame.encode(), in the low
+    digits, and the remaining number of every card point in the high digits. Drawing a card
+    subtracts its place value, and the draws of every composition of the shoe and the 
+    next hands of every hand are precomputed once, so a step is a few integer additions.
+    """
+
+    def __init__(self, decks=1):
+        self.decks = decks
+        self.full = [16 * decks] + [4 * decks] * 9  # the cards of CARDS in the full shoe
+        self.radix = [HAND]                         # the place values of the card counts
+        for count in self.full[:-1]:
+            self.radix.append(self.radix[-1] * (count + 1))
+        self.draws = {}         # the drawable cards of every composition of the shoe
+        self.hands = {}         # the next hands and rewards of every hand and action
+        self.maxDraws = 2 ** 16 # the compositions kept, cleared when more
+
+
+    def reset(self, usableace, playersum, dealercard, removed=()):
+
+        """
+        Reset the game to it's initial state, with the atrributes specific to the game. 
+        Take the Blackjack problem as an examples:
+        
+        usableace:      whether the player has an usable Ace (unconverted to 11)
+        playersum:      the sum of the player's card
+        dealercard:     the visible card of the dealer, removed from the shoe
+        removed:        the other cards already dealt out of the shoe, e.g. the player's
+                        cards, 1 for an Ace and 10 for the court cards
+        
+        return:     an initial state object, needs not care its implementation
+        """
+
+        counts = list(self.full)
+        for card in (dealercard,) + tuple(removed):
+            counts[card % 10] -= 1                  # 10 is at 0, Ace at 1, as in CARDS
+        if min(counts) < 0:
+            raise ValueError('more cards removed than in a shoe of %d decks' % self.decks)
+
+        dealersum = 11 if dealercard == 1 else dealercard   # initially count ace as 11
+        hand = self.pack(0, playersum, usableace, dealersum, int(dealercard == 1))
+        return sum(map(operator.mul, counts, self.radix)) + hand
+
+
+    @staticmethod
+    def pack(turn, playersum, usableace, dealersum, dealerace):
+
+        """
+        Packs a hand into the low digits of a state.
+
+        return:     the integer of the hand in [0, HAND)
+        """
+
+        return int((((turn * 32 + playersum) * 4 + usableace) * 32 + dealersum) * 4 + dealerace)
+
+
+    def decode(self, state):
+
+        """
+        Unpacks a game state.
+
+        state:      a state of the Blackjack game
+        return:     (turn, playersum, usableace, dealersum, dealerace), and the list of the
+                    remaining number of every card point of CARDS in the shoe
+        """
+
+        state, hand = divmod(state, HAND)
+        hand, dealerace = divmod(hand, 4)
+        hand, dealersum = divmod(hand, 32)
+        hand, usableace = divmod(hand, 4)
+        turn, playersum = divmod(hand, 32)
+        counts = []
+        for count in self.full:
+            state, remaining = divmod(state, count + 1)
+            counts.append(remaining)
+        return (turn, playersum, usableace, dealersum, dealerace), counts
+
+
+    def hash(self, state):
+
+        """
+        For checking overlapping subproblems, gives an unique hash value of a game state.
+
+        state:      a state of the Blackjack game
+        return:     an unique hash value for the game state, the packed state itself
+        """
+
+        return state
+
+
+    def fingerprint(self):
+
+        """
+        Optionally, identifies the parameters of the game, so that a saved policy store is
+        only reused for the same rules.
+
+        return:     a string of the rules and the number of decks
+        """
+
+        return 'finite shoe of %d decks' % self.decks
+
+
+    def actionDomain(self, state):
+        
+        """
+        Given a game state, specify its allowed actions.
+
+        state:      a state of the Blackjack game
+        return:     an array of possible actions, the same as BlackjackGame
+        """
+
+        hand = state % HAND
+        turn, playersum, dealersum = hand // TURN, hand // 512 % 32, hand // 4 % 32
+        if turn == 0:           # player turns
+            return [0, 1]       # player hit or stick
+        elif turn == 1:         # dealer turns
+            if dealersum < 17 or dealersum < playersum:
+                return [2]      # dealer must hit when sum < 17 or smaller than player
+            return [3]          # dealer stick
+        return []               # game end
+
+
+    def _draws(self, composition):
+
+        """
+        Precomputes the cards which can be drawn from a composition of the shoe.
+
+        composition:    the high digits of a state, the remaining cards in the shoe
+        return:         the indices of the cards in CARDS, their probabilities, and their
+                        place values to subtract from the state
+        """
+
+        draws = self.draws.get(composition)
+        if draws is None:
+            if len(self.draws) >= self.maxDraws:
+                self.draws.clear()
+            counts = self.decode(composition)[1]
+            total = float(sum(counts))
+            cards = [k for k in range(10) if counts[k] > 0]
+            draws = self.draws[composition] = (cards, np.array([counts[k] / total for k in cards]),
+                                               [self.radix[k] for k in cards])
+        return draws
+
+
+    def _hands(self, hand, action):
+
+        """
+        Precomputes the next hands of drawing every card of CARDS to a hand.
+
+        hand:       the low digits of a state
+        action:     0 - player hits, 2 - dealer hits
+        return:     the list of the next hands, and the array of the rewards, of every card
+        """
+
+        hands = self.hands.get((hand, action))
+        if hands is None:
+            (turn, playersum, usableace, dealersum, dealerace), _ = self.decode(hand)
+            nexts, rewards = [], np.zeros(10)
+            for k, card in enumerate(CARDS.tolist()):
+                if action == 0:
+                    total, aces, reward = playersum + card, usableace + (card == 11), -1
+                else:
+                    total, aces, reward = dealersum + card, dealerace + (card == 11), 1
+                if total > 21 and aces > 0:         # use up 1 ace
+                    total, aces = total - 10, aces - 1
+                end = 2 if total > 21 else turn     # game end for bust
+                rewards[k] = reward if total > 21 else 0
+                if action == 0:
+                    nexts.append(self.pack(end, total, aces, dealersum, dealerace))
+                else:
+                    nexts.append(self.pack(end, playersum, usableace, total, aces))
+            hands = self.hands[(hand, action)] = nexts, rewards
+        return hands
+
+
+    def step(self, state, action):
+        
+        """
+        Given a game state, take a step forward with the specified action.
+
+        state:      the current state of the Blackjack game
+        action:     0 - player hits
+                    1 - player sticks
+                    2 - dealer hits
+                    3 - dealer sticks
+
+        return:     a list of all possible next states after taking the action, 
+                    together with the assosiated probabilities and rewards.
+        """
+
+        hand = state % HAND
+        if action == 1:                                         # player stick
+            return [state + TURN], 1, 0                         # signal dealer turns
+        elif action == 3:                                       # dealer stick
+            reward = np.sign(hand // 512 % 32 - hand // 4 % 32) # 1 win, -1 loss, 0 draw
+            return [state + TURN], 1, reward                    # signal game end
+
+        composition = state - hand
+        cards, probs, places = self._draws(composition)
+        nexts, rewards = self._hands(hand, action)
+        newstates = [composition - place + nexts[k] for k, place in zip(cards, places)]
+        return newstates, probs, rewards[cards]
+
+
+if __name__ == '__main__':
+
+    from dpsolver import StochasticSolver, BoundedCache
+
+    """
+    An example of a player of 16 against every dealer card, from shoes of 1 to 8 decks, 
+    each solved with a cache of 64 MB at most.
+    """
+    for decks in (1, 2, 4, 6, 8):
+        game = ShoeBlackjackGame(decks)                     # init the game object
+        cache = BoundedCache(64 * 2 ** 20)                  # within the memory budget
+        solver = StochasticSolver(game, cache=cache)        # init the solver with the game
+        results = [solver.solve(game.reset(0, 16, dealercard, removed=(10, 6)))
+                   for dealercard in range(1, 11)]          # the player holds 10 and 6
+        print('%d decks: %s' % (decks, ' '.join('%s%+.3f' % ('HS'[optimal], utility)
+                                                   for optimal, utility in results)))
+        print('    %d subproblems solved, %s' % (solver.cachedCounter, cache.stats()))
@@ -1,120 +1,136 @@
 """
 blackjack_results.py
 
-Solves the Blackjack game, and shows the utilities and policy plan.
+Solves the Blackjack game, and shows the utilities and policy plan. The plotting libraries
+are only imported when a plot is drawn, and nothing is solved at import, so the functions
+can be reused by the command line of dpsolver.
 """
 
 """
 0. The header.
 """
+import os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import axes3d, Axes3D
-import seaborn as sns
-from blackjack import BlackjackGame
-from dpsolver import StochasticSolver
 
-game = BlackjackGame()
-solver = StochasticSolver(game)
+CARDNAMES = ['A', 2, 3, 4, 5, 6, 7, 8, 9, 10]
+LOWEST = {0: 4, 1: 12}          # the lowest player sum without and with an usable Ace
 
-"""
-1. First, solve the cases when the player has no usuable Ace.
-"""
-policy = np.zeros((20, 10))
-values = np.zeros((20, 10))
-for playersum in np.arange(4, 21):
-    for dealercard in np.arange(1, 11):
-        init = game.reset(0, playersum, dealercard)
-        optimal, value = solver.solve(init)
-        policy[playersum-1, dealercard-1] = optimal
-        values[playersum-1, dealercard-1] = value
 
-"""
-1.1 Plot the policy.
-"""
-df = pd.DataFrame(policy[3:])
-df.columns = ['A', 2, 3, 4, 5, 6, 7, 8, 9, 10]
-df.index = np.arange(4, 21)
+def solveGrid(solver, game, usableace):
 
-fig = plt.figure(figsize=(3,6))
-ax = sns.heatmap(df, cmap='gray', cbar=False, linecolor='black', linewidths=0.1, vmin=-1, vmax=1)
-ax.invert_yaxis()
-ax.set_xlabel('Dealer Card')
-ax.set_ylabel('Player Sum')
-ax.set_title('Player Policy (/wo Usable Ace)')
+    """
+    Solves the policy grid of the player sums against the dealer cards.
 
-"""
-1.2 Plot the 3D utility values graph
-"""
-fig = plt.figure(figsize=(10,8))
-x = np.arange(3, 20)
-y = np.arange(0, 10)
-X, Y = np.meshgrid(x, y)
-
-Z = values[X, Y]
-ax = plt.axes(projection='3d')
-ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap='viridis')
-ax.view_init(40, -120)
-ax.set_xticks(np.arange(4, 21, 2))
-ax.set_yticks(np.arange(1, 11, 2))
-ax.set_xlabel('Player Sum')
-ax.set_ylabel('Dealer Card')
-ax.set_zlabel('Utility Value')
-ax.invert_yaxis()
-ax.set_title('/wo Usable Ace')
-plt.show()
+    solver:     the StochasticSolver of the game
+    game:       the BlackjackGame, or the ShoeBlackjackGame
+    usableace:  whether the player has an usable Ace
 
-"""
-2. Then solve the cases when the player got an usuable Ace.
-"""
-policy = np.zeros((20, 10))
-values = np.zeros((20, 10))
-for playersum in np.arange(12, 21):
-    for dealercard in np.arange(1, 11):
-        init = game.reset(1, playersum, dealercard)
-        optimal, value = solver.solve(init)
-        policy[playersum-1, dealercard-1] = optimal
-        values[playersum-1, dealercard-1] = value
+    return:     the optimal actions and the utilities, 20 x 10 arrays indexed by the player
+                sum - 1 and the dealer card - 1, zeros below the lowest player sum
+    """
 
-"""
-2.1 Plot the policy diagram.
-"""
-df = pd.DataFrame(policy[11:])
-df.columns = ['A', 2, 3, 4, 5, 6, 7, 8, 9, 10]
-df.index = np.arange(12, 21)
+    policy = np.zeros((20, 10))
+    values = np.zeros((20, 10))
+    for playersum in np.arange(LOWEST[usableace], 21):
+        for dealercard in np.arange(1, 11):
+            init = game.reset(usableace, playersum, dealercard)
+            optimal, value = solver.solve(init)
+            policy[playersum-1, dealercard-1] = optimal
+            values[playersum-1, dealercard-1] = value
+    return policy, values
 
-fig = plt.figure(figsize=(3,3))
-ax = sns.heatmap(df, cmap='gray', cbar=False, linecolor='black', linewidths=0.1, vmin=-1, vmax=1)
-ax.invert_yaxis()
-ax.set_xlabel('Dealer Card')
-ax.set_ylabel('Player Sum')
-ax.set_title('Player Policy (/w Usable Ace)')
 
-"""
-2.2 Plot the 3D utility values graph
-"""
-fig = plt.figure(figsize=(10,8))
-x = np.arange(3, 20)
-y = np.arange(0, 10)
-X, Y = np.meshgrid(x, y)
-
-Z = values[X, Y]
-ax = plt.axes(projection='3d')
-ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap='viridis')
-ax.view_init(45, -120)
-ax.set_xticks(np.arange(4, 21, 2))
-ax.set_yticks(np.arange(1, 11, 2))
-ax.set_xlabel('Player Sum')
-ax.set_ylabel('Dealer Card')
-ax.set_zlabel('Utility Value')
-ax.invert_yaxis()
-ax.set_title('/w Usable Ace')
-plt.show()
+def plotPolicy(policy, usableace):
 
-"""
-3 Let's examine how overlapping subproblem reduce the complexity.
-"""
-print(solver.counter)
-print(solver.cachedCounter)
+    """
+    Plots the policy as a heatmap.
+
+    policy:     the optimal actions of solveGrid()
+    usableace:  whether the player has an usable Ace
+    """
+
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    lowest = LOWEST[usableace]
+    df = pd.DataFrame(policy[lowest-1:])
+    df.columns = CARDNAMES
+    df.index = np.arange(lowest, 21)
+
+    fig = plt.figure(figsize=(3, 6 if lowest < 12 else 3))
+    ax = sns.heatmap(df, cmap='gray', cbar=False, linecolor='black', linewidths=0.1, vmin=-1, vmax=1)
+    ax.invert_yaxis()
+    ax.set_xlabel('Dealer Card')
+    ax.set_ylabel('Player Sum')
+    ax.set_title('Player Policy (%s Usable Ace)' % ('/w' if usableace else '/wo'))
+    return fig
+
+
+def plotValues(values, usableace):
+
+    """
+    Plots the 3D utility values graph.
+
+    values:     the utilities of solveGrid()
+    usableace:  whether the player has an usable Ace
+    """
+
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import axes3d, Axes3D
+
+    fig = plt.figure(figsize=(10,8))
+    x = np.arange(3, 20)
+    y = np.arange(0, 10)
+    X, Y = np.meshgrid(x, y)
+
+    Z = values[X, Y]
+    ax = plt.axes(projection='3d')
+    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap='viridis')
+    ax.view_init(45 if usableace else 40, -120)
+    ax.set_xticks(np.arange(4, 21, 2))
+    ax.set_yticks(np.arange(1, 11, 2))
+    ax.set_xlabel('Player Sum')
+    ax.set_ylabel('Dealer Card')
+    ax.set_zlabel('Utility Value')
+    ax.invert_yaxis()
+    ax.set_title('/w Usable Ace' if usableace else '/wo Usable Ace')
+    return fig
+
+
+if __name__ == '__main__':
+
+    import matplotlib.pyplot as plt
+    from blackjack import BlackjackGame
+    from dpsolver import StochasticSolver, SolverStats
+
+    game = BlackjackGame()
+    solver = StochasticSolver(game, stats=SolverStats())   # instrumented, see the end
+    store = 'blackjack.dpstore'
+    if os.path.exists(store):
+        solver.load(store)      # warm restart from the policy solved by the previous run
+
+    """
+    1. First, solve the cases when the player has no usuable Ace, and plot the policy and
+    the utility values.
+    """
+    policy, values = solveGrid(solver, game, 0)
+    plotPolicy(policy, 0)
+    plotValues(values, 0)
+    plt.show()
+
+    """
+    2. Then solve the cases when the player got an usuable Ace.
+    """
+    policy, values = solveGrid(solver, game, 1)
+    plotPolicy(policy, 1)
+    plotValues(values, 1)
+    plt.show()
 
+    """
+    3 Let's examine how overlapping subproblem reduce the complexity.
+    """
+    print(solver.counter)
+    print(solver.cachedCounter)
+    print(solver.stats.toJson())    # the hit rate, where the time goes, the depths and branching
+    solver.save(store)
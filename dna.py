@@ -7,18 +7,32 @@ score if for a local match, deduct for a substitution, and deduct another score
 insert or a deletion.
 """
 
+import hashlib
+
+BOTH = (0, 1, 2)                # the action domains, shared by all the states
+X_ONLY = (1,)
+Y_ONLY = (2,)
+NONE = ()
+
 class DnaAlignGame(object):
 
     """
     Define the game object for the DNA alignment problem. 
     Every game object should implement the reset(), hash(), actionDomain(), and step() 
     method, as well as oraganise its internal state as the state object.
+    The game holds the two sequences once, and its state is the pair of offsets (i, j) into
+    them, packed into the single integer i * (len(y) + 1) + j.
     """
 
     def __init__(self):
         self.reward_match = 5       # the reward for a local match
         self.penalty_subst = -2     # the penalty for a local substitution
         self.penalty_insdel = -6    # the penalty for a local insert or deletion
+        self.x = None               # the 1st DNA sequence as bytes
+        self.y = None               # the 2nd DNA sequence as bytes
+        self.width = None           # the number of offsets into y, len(y) + 1
+        self.counts = None          # the base counts of the suffixes of x and y, for bounds
+        self.identity = None        # the 64-bit digest of the sequences and the scores
         
     def reset(self, x, y):
 
@@ -26,27 +40,164 @@ class DnaAlignGame(object):
         Reset the game to it's initial state, with the atrributes specific to the game. 
         Take the DNA alignment problem as an examples:
         
-        x:  the 1st DNA sequence
-        y:  the 2nd DNA sequence
+        x:  the 1st DNA sequence, a str or bytes
+        y:  the 2nd DNA sequence, a str or bytes
         
         return:     an initial state object, needs not care its implementation
         """
 
-        state = (x, y)
+        self.x = x.encode('ascii') if isinstance(x, str) else bytes(x)
+        self.y = y.encode('ascii') if isinstance(y, str) else bytes(y)
+        self.width = len(self.y) + 1
+        self.counts = None          # counted on the first upperBound()
+        digest = hashlib.sha1(self.fingerprint().encode()).digest()
+        self.identity = int.from_bytes(digest[:8], 'little')
+        state = 0                   # both sequences from the start
         return state
 
 
+    def decode(self, state):
+
+        """
+        Unpacks a game state into the offsets into the two sequences.
+
+        state:      a state of the DNA alginment subproblem
+        return:     the offsets (i, j), the subproblem aligns x[i:] with y[j:]
+        """
+
+        return divmod(state, self.width)
+
+
     def hash(self, state):
         
         """
         For checking overlapping subproblems, gives an unique hash value of a game state.
+        The offsets are only meaningful for the sequences of the reset(), so the hash value
+        pairs the state with the digest of the sequences and the scores.
 
         state:      a state of the DNA alginment subproblem
         return:     an unique hash value for the game state
         """
 
-        x, y = state
-        return hash(x + ',' + y)
+        return self.identity, state
+
+
+    def encode(self, state):
+
+        """
+        Optionally, encodes a game state into a bounded integer index, which lets the solver
+        cache in dense arrays instead of a dict of hash values. The state is already packed.
+
+        state:      a state of the DNA alginment subproblem
+        return:     an integer index in [0, encodeSize())
+        """
+
+        return state
+
+
+    def encodeSize(self):
+
+        """
+        return:     the number of distinct integer indices given by encode(), 0 before reset()
+        """
+
+        if self.x is None:
+            return 0
+        return (len(self.x) + 1) * self.width
+
+
+    def instance(self, state):
+
+        """
+        Optionally, tells the instance of a game state, so that a solver reused across the
+        resets caches the encode() of every instance apart. It is the digest of the sequences 
+        and the scores of the reset(), so the scores changed in place for resolve() keep the 
+        keys.
+
+        state:      a state of the DNA alginment subproblem
+        return:     the hashable instance of the state
+        """
+
+        return self.identity
+
+
+    def upperBound(self, state):
+
+        """
+        Optionally, bounds the score still to be gained from a game state, which lets the
+        solver prune the actions by branch and bound. Of the remaining a bases of x and b of
+        y, k are aligned in pairs, of which at most the max-match m, the sum of the common 
+        counts of every base, are matches, and the rest are inserts or deletions. The score 
+        is piecewise linear in k, so the bound is the best of k = 0, m and min(a, b).
+
+        state:      a state of the DNA alginment subproblem
+        return:     an upper bound of the max score from the state
+        """
+
+        if self.counts is None:
+            bases = bytes(sorted(set(self.x) | set(self.y)))
+            self.counts = self._suffixCounts(self.x, bases), self._suffixCounts(self.y, bases)
+        i, j = divmod(state, self.width)
+        a, b = len(self.x) - i, len(self.y) - j
+        m = sum(map(min, self.counts[0][i], self.counts[1][j]))
+
+        def score(k):
+            matches = min(k, m)
+            return (matches * self.reward_match + (k - matches) * self.penalty_subst
+                    + (a + b - 2 * k) * self.penalty_insdel)
+
+        return max(score(0), score(m), score(min(a, b)))
+
+
+    def _suffixCounts(self, sequence, bases):
+
+        """
+        Counts every base in every suffix of a sequence.
+
+        sequence:   the DNA sequence as bytes
+        bases:      the bases to count, as bytes
+        return:     a list of the counts of sequence[i:] for i in 0..len(sequence)
+        """
+
+        counts = [(0,) * len(bases)]
+        for base in reversed(sequence):
+            count = list(counts[-1])
+            count[bases.index(base)] += 1
+            counts.append(tuple(count))
+        counts.reverse()
+        return counts
+
+
+    def dependencies(self, state, action):
+
+        """
+        Optionally, tells which scores of the game a step reads, which lets the solver 
+        re-solve only the affected subproblems when they are changed.
+
+        state:      a state of the DNA alginment subproblem
+        action:     the action taken, or None for the action domain
+        return:     the names of the scores
+        """
+
+        if action is None:
+            return ()
+        elif action == 0:
+            i, j = divmod(state, self.width)
+            return ('reward_match',) if self.x[i] == self.y[j] else ('penalty_subst',)
+        return ('penalty_insdel',)
+
+
+    def fingerprint(self):
+
+        """
+        Optionally, identifies the parameters of the game, so that a saved policy store is
+        only reused with the same scores and sequences.
+
+        return:     a string of the scores and the digests of the sequences
+        """
+
+        return repr([self.reward_match, self.penalty_subst, self.penalty_insdel,
+                     hashlib.sha1(self.x).hexdigest(), hashlib.sha1(self.y).hexdigest()])
 
 
     def actionDomain(self, state):
@@ -61,16 +212,15 @@ class DnaAlignGame(object):
                     2 - use Y only, delete Y or insert X
         """
 
+        i, j = divmod(state, self.width)
+        if i < len(self.x) and j < len(self.y): 
+            return BOTH
+        elif i < len(self.x):
+            return X_ONLY
+        elif j < len(self.y):
+            return Y_ONLY
 
-        x, y = state
-        if len(x) > 0 and len(y) > 0: 
-            return [0, 1, 2]
-        elif len(x) > 0:
-            return [1]
-        elif len(y) > 0:
-            return [2]
-
-        return []
+        return NONE
             
 
     def step(self, state, action):
@@ -86,25 +236,23 @@ class DnaAlignGame(object):
         return:     the next state after taking the action, assosiated with the reward.
         """
 
-        x, y = state
         if action == 0:                     # use both
-            if x[0] == y[0]:
+            i, j = divmod(state, self.width)
+            if self.x[i] == self.y[j]:
                 reward = self.reward_match
             else:
                 reward = self.penalty_subst
             
-            x = x[1:]
-            y = y[1:]
+            state = state + self.width + 1  # i + 1, j + 1
         
         elif action == 1:                   # use x only
             reward = self.penalty_insdel
-            x = x[1:]
+            state = state + self.width      # i + 1
         
         else:                               # use y only 
             reward = self.penalty_insdel
-            y = y[1:]
+            state = state + 1               # j + 1
         
-        state = (x, y)
         return state, reward                # the next state, and how much scored
 
     
@@ -124,5 +272,6 @@ if __name__ == '__main__':
     state = game.reset(x, y)            # reset the game to the initial state
     result = solver.solve(state)        # solve from the initial state
     print('The max utility is %f' % result[1])
-    print('The policy is:')
-    print(list(solver.cache.values()))
+    print('The optimal path is:')
+    policy = solver.policy()            # the compact optimal actions
+    print([(game.decode(state), action, reward) for state, action, reward in policy.path(state)])
@@ -0,0 +1,299 @@
+"""
+dpcli.py
+
+The command line of the solver, run as python -m dpcli. It solves the example games from
+the instances in JSON or CSV files, prints a JSON line of the result of every instance, and
+writes the policies and the value tables in bulk as .npy or CSV files. The games, and the
+plotting libraries, are only imported by the command which needs them, to keep the startup
+low for the batch jobs, see python benchmarks.py startup.
+
+python -m dpcli knapsack INSTANCES [--capacity C] [--out PREFIX] [--format npy|csv]
+python -m dpcli dna INSTANCES [--out PREFIX] [--format npy|csv]
+python -m dpcli blackjack [--decks N] [--memory MB [--spill PATH]] [--out PREFIX]
+                          [--format npy|csv] [--plot]
+
+Every command also takes --timing, to print the seconds of every phase.
+
+A JSON instance of the knapsack is {"capacity": 50, "items": [..], "weights": [..],
+"values": [..]}, and of the DNA alignment {"x": "ACGT..", "y": "AGT.."}, or a list of them.
+A CSV of the knapsack has a row of the weights, values and optionally items of every item
+type of one instance, whose capacity is given by --capacity. A CSV of the DNA alignment has
+a row of x and y of every instance.
+
+The tables have the instance and the key of every solved subproblem, its decoded state, the
+items available of every type and the capacity of the knapsack, or the offsets i and j of
+the DNA alignment, and the policy and the values. With --memory, the Blackjack cache evicts
+to the --spill file beyond the budget, a temporary file by default, removed at the end.
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+import numpy as np
+
+
+def readInstances(path):
+    """
+    Reads the instances from a JSON or CSV file.
+
+    path: the file, by its extension .json or .csv, - for JSON from the standard input
+    return: a list of dicts of the instances, or of the rows of a CSV
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+    if path == '-':
+        instances = json.load(sys.stdin)
+    else:
+        with open(path) as f:
+            instances = json.load(f)
+    return instances if isinstance(instances, list) else [instances]
+
+
+def cacheTable(cache):
+    """
+    Collects the solved subproblems of a cache into columns.
+
+    cache: the solved cache, a dict or any of the caches of dpsolver
+    return: the arrays of the keys, the optimal actions (-1 for none), and the utilities; the
+            64-bit tags of the keys instead, like a PolicyStore, if they do not fit 64 bits;
+            the keys of an InstanceCache are the encoded indices of all its instances
+    """
+    from dpsolver import ArrayCache, InstanceCache, PolicyStore, SpillTable
+
+    if isinstance(cache, InstanceCache):
+        tables = [cacheTable(instance) for instance in cache.caches.values()]
+        return tuple(np.concatenate([table[column] for table in tables] or [[]])
+                     for column in range(3))
+
+    if isinstance(cache, ArrayCache):
+        keys = np.flatnonzero(cache.filled)
+        optimal, utility = cache.optimal[keys], cache.utility[keys]
+        if cache.sparse:
+            extra = sorted(cache.sparse.items())
+            keys = np.append(keys, [key for key, _ in extra])
+            optimal = np.append(optimal, [-1 if o is None else o for _, (o, u) in extra])
+            utility = np.append(utility, [u for _, (o, u) in extra])
+        return keys, optimal, utility
+
+    if isinstance(cache, PolicyStore):      # only the tags of the store are known
+        records = PolicyStore.records(cache)
+        return records['tag'], records['optimal'], records['utility']
+
+    keys, optimal, utility = [], [], []
+    for key, (state, action, value) in cache.items():
+        keys.append(key)
+        optimal.append(-1 if action is None else action)
+        utility.append(value)
+    keys = np.array(keys)
+    if keys.dtype == object:
+        keys = np.array([SpillTable.tag(key) for key in keys], dtype=np.uint64)
+    return keys, np.array(optimal, dtype=np.int64), np.array(utility, dtype=float)
+
+
+def writeTables(prefix, fmt, columns):
+    """
+    Writes the columns of a table in bulk, as a .npy file of every column, or a CSV file.
+
+    prefix: the path prefix of the files, PREFIX_column.npy or PREFIX.csv
+    fmt: 'npy' or 'csv'
+    columns: a list of (name, array) of the columns of the same length
+    return: the list of the files written
+    """
+    if fmt == 'npy':
+        paths = []
+        for name, array in columns:
+            paths.append('%s_%s.npy' % (prefix, name))
+            np.save(paths[-1], np.asarray(array))
+        return paths
+
+    path = prefix + '.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        writer.writerows(zip(*[np.asarray(array).tolist() for _, array in columns]))
+    return [path]
+
+
+def solveInstances(args, instances, build, decode):
+    """
+    Solves the instances of a deterministic game one by one, each with its own solver,
+    printing the result of each, and writes the solved subproblems of all in one table,
+    with the decoded states besides the keys.
+
+    args: the parsed arguments
+    instances: the list of the instances
+    build: a function of an instance, returning the game and its initial state
+    decode: a function of the game, the instance() of the states, or None, and an array of
+            their encode() keys, returning a list of (name, array) of the state columns
+    return: the dict of the seconds spent
+    """
+    from dpsolver import DeterministicSolver, InstanceCache
+
+    seconds = {'solve': 0., 'write': 0.}
+    tables = []
+    for index, instance in enumerate(instances):
+        start = time.perf_counter()
+        game, state = build(instance)
+        solver = DeterministicSolver(game, iterative=True)     # deep problems too
+        optimal, utility = solver.solve(state)
+        path = [action for _, action, _ in solver.policy().path(state)]
+        seconds['solve'] += time.perf_counter() - start
+
+        print(json.dumps({'instance': index, 'utility': float(utility),
+                          'optimal': None if optimal is None else int(optimal),
+                          'path': [int(action) for action in path],
+                          'subproblems': solver.cachedCounter}))
+        parts = solver.cache.caches.items() if isinstance(solver.cache, InstanceCache) \
+            else [(None, solver.cache)]
+        for part, cache in parts:
+            keys, optimal, utility = cacheTable(cache)
+            tables.append([('instance', np.full(len(keys), index)), ('key', keys)]
+                          + decode(game, part, keys)
+                          + [('policy', optimal), ('values', utility)])
+
+    start = time.perf_counter()
+    columns = [(name, np.concatenate([table[column][1] for table in tables]))
+               for column, (name, _) in enumerate(tables[0])] if tables else []
+    writeTables(args.out or args.command + '_solved', args.format, columns)
+    seconds['write'] = time.perf_counter() - start
+    return seconds
+
+
+def knapsack(args):
+    """
+    The knapsack command.
+    """
+    from knapsack import KnapsackGame
+
+    instances = readInstances(args.instances)
+    if args.instances.endswith('.csv'):     # the rows are the item types of one instance
+        if args.capacity is None:
+            raise SystemExit('a CSV knapsack instance needs --capacity')
+        rows = instances
+        instances = [{'capacity': args.capacity,
+                      'items': [int(row.get('items') or 1) for row in rows],
+                      'weights': [float(row['weights']) for row in rows],
+                      'values': [float(row['values']) for row in rows]}]
+
+    def build(instance):
+        game = KnapsackGame()
+        weights = np.asarray(instance['weights'], dtype=float)
+        items = np.asarray(instance.get('items', np.ones(len(weights))), dtype=np.int64)
+        values = np.asarray(instance['values'], dtype=float)
+        return game, game.reset(float(instance['capacity']), items, weights, values)
+
+    types = max([len(instance['weights']) for instance in instances] or [0])
+
+    def decode(game, part, keys):       # the items of every type, 0 past the game's types
+        states = game.decode(keys.astype(np.int64), part).reshape(len(keys), game.N + 1)
+        return [('item%d' % n, states[:, n] if n < game.N else np.zeros(len(keys)))
+                for n in range(types)] + [('capacity', states[:, -1])]
+
+    return solveInstances(args, instances, build, decode)
+
+
+def dna(args):
+    """
+    The dna command.
+    """
+    from dna import DnaAlignGame
+
+    def build(instance):
+        game = DnaAlignGame()
+        return game, game.reset(instance['x'], instance['y'])
+
+    def decode(game, part, keys):
+        i, j = game.decode(keys.astype(np.int64))
+        return [('i', i), ('j', j)]
+
+    return solveInstances(args, readInstances(args.instances), build, decode)
+
+
+def blackjack(args):
+    """
+    The blackjack command, solves the policy grid of both with and without an usable Ace.
+    """
+    from blackjack import BlackjackGame, ShoeBlackjackGame
+    from blackjack_results import solveGrid, LOWEST
+    from dpsolver import StochasticSolver, BoundedCache
+
+    start = time.perf_counter()
+    game = ShoeBlackjackGame(args.decks) if args.decks else BlackjackGame()
+    cache = BoundedCache(args.memory * 2 ** 20, spill=args.spill) if args.memory else None
+    solver = StochasticSolver(game, cache=cache)
+    grids = [solveGrid(solver, game, usableace) for usableace in (0, 1)]
+    seconds = {'solve': time.perf_counter() - start}
+
+    start = time.perf_counter()
+    cells = [(usableace, playersum, dealercard) for usableace in (0, 1)
+             for playersum in range(LOWEST[usableace], 21) for dealercard in range(1, 11)]
+    usableace, playersum, dealercard = np.array(cells).T
+    prefix = args.out or args.command + '_solved'
+    columns = [('usableace', usableace), ('playersum', playersum), ('dealercard', dealercard),
+               ('policy', np.array([grids[a][0][p-1, d-1] for a, p, d in cells], dtype=int)),
+               ('values', np.array([grids[a][1][p-1, d-1] for a, p, d in cells]))]
+    writeTables(prefix, args.format, columns)
+    print(json.dumps({'decks': args.decks, 'cells': len(cells),
+                      'subproblems': solver.cachedCounter}))
+
+    if args.plot:                           # only now the plotting libraries are imported
+        import matplotlib
+        matplotlib.use('Agg')               # headless, the figures are saved to files
+        from blackjack_results import plotPolicy, plotValues
+        for usableace, (policy, values) in enumerate(grids):
+            plotPolicy(policy, usableace).savefig('%s_policy%d.png' % (prefix, usableace))
+            plotValues(values, usableace).savefig('%s_values%d.png' % (prefix, usableace))
+    if cache is not None:
+        cache.close()
+    seconds['write'] = time.perf_counter() - start
+    return seconds
+
+
+def main(argv=None):
+    """
+    Runs the command line.
+
+    argv: the arguments, by default sys.argv[1:]
+    return: the exit code
+    """
+    start = time.perf_counter()
+    parser = argparse.ArgumentParser(prog='python -m dpcli', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    common = argparse.ArgumentParser(add_help=False)   # the options of every command
+    common.add_argument('--out', help='the path prefix of the tables, by default GAME_solved')
+    common.add_argument('--format', choices=('npy', 'csv'), default='npy',
+                        help='write a .npy file of every column, or a CSV file')
+    common.add_argument('--timing', action='store_true',
+                        help='print the seconds of every phase to the standard error')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    for name, command in (('knapsack', knapsack), ('dna', dna), ('blackjack', blackjack)):
+        sub = commands.add_parser(name, parents=[common], help=command.__doc__.strip())
+        sub.set_defaults(run=command)
+        if name != 'blackjack':
+            sub.add_argument('instances', help='the JSON or CSV file of the instances')
+    commands.choices['knapsack'].add_argument('--capacity', type=float,
+                                              help='the capacity of a CSV instance')
+    commands.choices['blackjack'].add_argument('--decks', type=int, default=0,
+                                               help='the decks of a finite shoe, 0 for infinite')
+    commands.choices['blackjack'].add_argument('--memory', type=int,
+                                               help='the MB of the cache, unbounded by default')
+    commands.choices['blackjack'].add_argument('--spill',
+                                               help='the file the cache evicts to beyond '
+                                                    '--memory, by default a temporary file')
+    commands.choices['blackjack'].add_argument('--plot', action='store_true',
+                                               help='save the plots of the policy and values')
+
+    args = parser.parse_args(argv)
+    seconds = {'parse': time.perf_counter() - start}
+    seconds.update(args.run(args))
+    if args.timing:
+        sys.stderr.write(json.dumps(seconds) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
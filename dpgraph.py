@@ -0,0 +1,169 @@
+"""
+dpgraph.py
+
+Compiles the reachable states of an acyclic game into a graph of flat arrays once, and solves
+it by backward induction level by level with numpy, instead of calling the game's methods on
+every subproblem of every solve.
+"""
+import numpy as np
+from mdpsolver import MdpSolver
+
+
+def ranges(starts, ends):
+    """
+    Concatenates the integer ranges starts[i]:ends[i] without a Python loop.
+
+    starts: an array of the starts of the ranges
+    ends: an array of the ends of the ranges
+    return: the array of all the integers in the ranges, in order
+    """
+    counts = ends - starts
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+class GraphSolver(MdpSolver):
+
+    """
+    The solver of the compiled state graph of an acyclic game, deterministic or stochastic.
+    The states are enumerated into the sparse arrays of the MdpSolver from one or more roots,
+    and sorted into levels by their heights: the terminals are level 0, and every other
+    state is one level above its highest next state. Solving a level only needs the values
+    of the levels below, so the whole graph is solved in one vectorized pass per level, and
+    every query of the compiled states is then answered by the arrays. The utilities and
+    the optimal actions are the same as DeterministicSolver and StochasticSolver.
+    """
+
+    def __init__(self, game, stochastic=True, discount=1.0):
+        """
+        Constructor
+
+        game: the game object modelling the problem to be solved
+        stochastic: whether the game's step() returns the next states with probabilities
+                    like the StochasticSolver's games, or one next state like the
+                    DeterministicSolver's games
+        discount: the discount factor of the future rewards, 1 for none
+        """
+        super(GraphSolver, self).__init__(game, discount)
+        self.stochastic = stochastic
+        self.levels = None      # the arrays to solve every level, built by _sort()
+
+    def compile(self, state):
+        """
+        Enumerates the states reachable from a state into the graph, adding to the states
+        enumerated before.
+
+        state: a root state of the game
+        return: the index of the state
+        """
+        expanded = self.expanded
+        index = super(GraphSolver, self).compile(state)
+        if self.expanded > expanded:
+            self.levels = None
+        return index
+
+    def transitions(self, state, action):
+        """
+        Steps forward with an action into all the possible next states.
+
+        state: a state of the game
+        action: the action to take
+        return: the next states, with their probabilities and rewards
+        """
+        if self.stochastic:
+            return self.game.step(state, action)
+        nextState, reward = self.game.step(state, action)
+        return [nextState], 1., reward
+
+    def _sort(self):
+        """
+        Sorts the states into levels by their heights, processing the states whose next
+        states are all sorted, from the terminals up, and groups the rows and transitions
+        of every level for the induction.
+
+        return: a list of (states, rows, starts, groups) of every level above 0, where the
+                starts are the first rows of the states in the rows of the level, and every
+                group is (the local rows, a matrix of their transitions) of the rows of the
+                same number of transitions
+        """
+        if self.levels is not None:
+            return self.levels
+
+        arrays = self._freeze()
+        count = len(self.states)
+        sources = arrays['stateOf'][arrays['rowOf']]
+        targets = arrays['nextIndex']
+        order = np.argsort(targets, kind='stable')                  # the edges by the target
+        edgeStart = np.searchsorted(targets[order], np.arange(count + 1))
+        pending = np.bincount(sources, minlength=count)             # the edges not sorted yet
+
+        height = np.full(count, -1, dtype=np.int64)
+        frontier = np.flatnonzero(pending == 0)
+        level = 0
+        while len(frontier) > 0:
+            height[frontier] = level
+            edges = order[ranges(edgeStart[frontier], edgeStart[frontier + 1])]
+            sourcesDone = sources[edges]
+            pending -= np.bincount(sourcesDone, minlength=count)
+            candidates = np.unique(sourcesDone)
+            frontier = candidates[pending[candidates] == 0]
+            level += 1
+        if (height < 0).any():
+            raise ValueError('the game is not acyclic, solve it with the MdpSolver instead')
+
+        stateStart = np.array(self.stateStart, dtype=np.int64)
+        rowStart = np.array(self.rowStart, dtype=np.int64)
+        self.levels = []
+        for level in range(1, height.max(initial=0) + 1):
+            states = np.flatnonzero(height == level)
+            rows = ranges(stateStart[states], stateStart[states + 1])
+            rowCounts = stateStart[states + 1] - stateStart[states]
+            starts = np.cumsum(rowCounts) - rowCounts   # the first local row of every state
+            counts = rowStart[rows + 1] - rowStart[rows]
+            groups = []
+            for width in np.unique(counts).tolist():
+                local = np.flatnonzero(counts == width)
+                groups.append((local, rowStart[rows[local]][:, None] + np.arange(width)))
+            self.levels.append((states, rows, starts, groups))
+        return self.levels
+
+    def backwardInduction(self):
+        """
+        Solves every compiled state, level by level from the terminals up. The expected
+        utility of every action sums the transitions in the same order as StochasticSolver,
+        so the results are identical to the last bit.
+
+        return: the utility of every state
+        """
+        levels = self._sort()
+        arrays = self._freeze()
+        values = np.zeros(len(self.states))
+        policy = np.full(len(self.states), -1, dtype=np.int64)
+        for states, rows, starts, groups in levels:
+            q = np.empty(len(rows))
+            for local, transitions in groups:
+                utilities = self.discount * values[arrays['nextIndex'][transitions]]
+                q[local] = np.sum(arrays['probs'][transitions]
+                                  * (utilities + arrays['rewards'][transitions]), axis=1)
+            best = np.maximum.reduceat(q, starts)
+            values[states] = best
+            candidates = np.where(q >= np.repeat(best, np.diff(np.append(starts, len(rows)))),
+                                  np.arange(len(rows)), len(rows))
+            policy[states] = rows[np.minimum.reduceat(candidates, starts)]
+
+        self.values = values
+        self.policy = policy
+        return values
+
+    def solve(self, state):
+        """
+        Answers the optimal action and the utility of a state from the solved graph, which
+        is compiled from the state and solved again first if the state is new.
+
+        state: feed in the state of the game
+        return: the optimal action and the accumulated utility
+        """
+        index = self.compile(state)
+        if self.values is None or len(self.values) < len(self.states):
+            self.backwardInduction()
+        row = self.policy[index]
+        return (None if row < 0 else self.actions[row]), self.values[index]
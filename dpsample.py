@@ -0,0 +1,168 @@
+"""
+dpsample.py
+
+Approximates the stochastic DP problems whose state spaces are too large for the exact
+StochasticSolver, by sampling the next states of every action instead of summing over all
+of them, with a value table bounded in memory, and confidence intervals on the estimates.
+"""
+import math
+import numpy as np
+from dpsolver import Solver, BoundedCache
+
+
+class SampledSolver(Solver):
+
+    """
+    The sampling solver for the games of the StochasticSolver, the same reset(), hash(),
+    actionDomain() and step(). The expected utility of an action is estimated from a number
+    of next states drawn by the probabilities of step(), each distinct one solved once and
+    weighted by how many times it is drawn, so an action of few next states costs no more
+    than the exact sum. The estimates are cached like the exact solvers, as (state, optimal,
+    utility, standard error) in a BoundedCache by default. The standard error of a state adds
+    the variance of its samples to the errors of the next states estimated, as if they are
+    independent. An evicted state is read back with its error from the spill of the cache,
+    if any, or estimated again from new samples when visited. The estimates are not exact,
+    so the APIs of the exact solvers which rely on it are disabled or restricted below. The
+    policy() covers the sampled states only, so its path() may reach a state never drawn.
+    """
+
+    stochastic = True
+
+    def __init__(self, game, samples=32, budget=64 * 2 ** 20, seed=0, cache=None, stats=None):
+        """
+        Constructor
+
+        game: the game object modelling the problem to be solved
+        samples: the number of next states drawn for every action
+        budget: the memory budget in bytes of the default BoundedCache
+        seed: the random seed of the draws
+        cache: the cache object, by default a BoundedCache of the budget
+        stats: a SolverStats to instrument the solver, None for no overhead
+        """
+        if samples < 2:
+            raise ValueError('at least 2 samples are needed to estimate the errors')
+        self.samples = samples
+        self.budget = budget
+        self.seed = seed
+        self.rng = np.random.RandomState(seed)
+        cache = BoundedCache(budget) if cache is None else cache
+        super(SampledSolver, self).__init__(game, False, cache, stats)
+
+    def options(self):
+        """
+        return: the keyword arguments besides the game to construct a solver like this one,
+                e.g. in the worker processes of solveMany()
+        """
+        return {'samples': self.samples, 'budget': self.budget, 'seed': self.seed}
+
+    def solveMany(self, states, workers=None, merge=False, shared=None, alphas=None, 
+                  owners=None, incumbent=None):
+        """
+        Estimates many initial states on a pool of worker processes, see Solver.solveMany().
+        Every worker draws from the same seed. The SharedTable and the branch and bound of 
+        the exact solvers are not supported, as they would drop the standard errors.
+
+        states: the initial states of the game
+        workers: the number of processes, by default the number of CPUs
+        merge: whether to merge the workers' caches and counters into this solver at the end
+        return: a generator of (state, optimal, utility) in the order they are estimated
+        """
+        if shared is not None or alphas is not None or incumbent is not None:
+            raise ValueError('the SampledSolver has no shared table or branch and bound')
+        return super(SampledSolver, self).solveMany(states, workers, merge, owners=owners)
+
+    def solveAnytime(self, state, deadline=None, budget=None):
+        """
+        Not supported: the estimates are never proven optimal, and the recursive estimate()
+        cannot be suspended. Use solve() or estimate() instead.
+        """
+        raise NotImplementedError('the SampledSolver cannot solve by a deadline or a budget')
+
+    def solve(self, state):
+        """
+        Estimates the DP problem by recursively calls to estimate the smaller problems.
+
+        state: feed in the initial state of the game
+        return: the optimal action and the estimated expected utility
+        """
+        return self.estimate(state)[:2]
+
+    def estimate(self, state):
+        """
+        Estimates a state, and the standard error of its utility.
+
+        state: a state of the game
+        return: the optimal action, the estimated expected utility, and its standard error
+        """
+        self.counter += 1
+        stateKey = self.key(state)
+        if stateKey in self.cache:
+            return self.cache[stateKey][1:]
+
+        self.cachedCounter += 1
+        actionSet = self.game.actionDomain(state)
+        if len(actionSet) == 0:
+            return None, 0, 0.
+
+        maxUtility = -np.inf
+        optimal = None
+        error = 0.
+        for action in actionSet:
+            nextStates, probs, rewards = self.game.step(state, action)
+            count = len(nextStates)
+            probs = np.broadcast_to(np.asarray(probs, float), count)
+            rewards = np.broadcast_to(np.asarray(rewards, float), count)
+            if count == 1:
+                draws = np.array([self.samples])
+            else:
+                draws = self.rng.multinomial(self.samples, probs / probs.sum())
+
+            drawn = np.flatnonzero(draws)       # solve every distinct next state once
+            estimates = np.array([self.estimate(nextStates[n])[1:] for n in drawn])
+            totals = rewards[drawn] + estimates[:, 0]
+            weights = draws[drawn] / float(self.samples)
+            expectedValue = np.sum(weights * totals)
+            variance = np.sum(draws[drawn] * (totals - expectedValue) ** 2) / (self.samples - 1)
+
+            if expectedValue > maxUtility:
+                maxUtility = expectedValue
+                optimal = action
+                error = np.sqrt(variance / self.samples
+                                + np.sum((weights * estimates[:, 1]) ** 2))
+
+        self.cache[stateKey] = state, optimal, maxUtility, error
+        return optimal, maxUtility, error
+
+    def interval(self, state, confidence=0.95):
+        """
+        The confidence interval of the expected utility of a state, by the normal
+        approximation of its estimate.
+
+        state: a state of the game
+        confidence: the probability of the interval
+        return: the lower and upper bounds of the expected utility
+        """
+        _, utility, error = self.estimate(state)
+        z = normalQuantile(0.5 + confidence / 2.)
+        return utility - z * error, utility + z * error
+
+
+def normalQuantile(p):
+    """
+    The quantile of the standard normal distribution, by bisection on its cumulative 
+    distribution function 0.5 * (1 + erf(z / sqrt(2))), like statistics.NormalDist().inv_cdf()
+    of python 3.8.
+
+    p: the probability, in (0, 1)
+    return: the z of the probability
+    """
+    if not 0 < p < 1:
+        raise ValueError('the probability must be in (0, 1)')
+    low, high = -40., 40.
+    for _ in range(100):
+        z = (low + high) / 2.
+        if 0.5 * (1. + math.erf(z / math.sqrt(2.))) < p:
+            low = z
+        else:
+            high = z
+    return (low + high) / 2.
@@ -0,0 +1,365 @@
+"""
+dpserver.py
+
+A long-lived local solve service. It keeps one solver per game, so the cache solved by a
+request answers the later requests sharing its subproblems, and solves the requests arriving
+together in one batch per solver, run
+python dpserver.py [port] to serve on localhost, then POST the requests to /solve and GET
+the metrics from /metrics. A request is a JSON object of the game and its parameters, or a
+list of them, e.g.
+
+{"game": "knapsack", "capacity": 50, "items": [..], "weights": [..], "values": [..]}
+{"game": "dna", "x": "ACGT..", "y": "AGT.."}
+{"game": "blackjack", "decks": 0, "usableace": 0, "playersum": 12, "dealercard": 5}
+
+and is answered by {"optimal": .., "utility": .., "cached": .., "batch": .., "seconds": ..}.
+"""
+import sys
+import json
+import time
+import queue
+import threading
+import collections
+import concurrent.futures
+import urllib.request
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dpsolver import DeterministicSolver, StochasticSolver, InstanceCache, BoundedCache
+
+
+def knapsackRequest(request, game=None):
+    """
+    game: the KnapsackGame to reset, by default a new one
+    return: the KnapsackGame reset by a request, and its initial state
+    """
+    from knapsack import KnapsackGame
+    game = KnapsackGame() if game is None else game
+    weights = np.asarray(request['weights'], dtype=float)
+    items = np.asarray(request.get('items', np.ones(len(weights))), dtype=np.int64)
+    values = np.asarray(request['values'], dtype=float)
+    return game, game.reset(float(request['capacity']), items, weights, values)
+
+
+def dnaRequest(request, game=None):
+    """
+    game: the DnaAlignGame to reset, by default a new one
+    return: the DnaAlignGame reset by a request, and its initial state
+    """
+    from dna import DnaAlignGame
+    game = DnaAlignGame() if game is None else game
+    defaults = DnaAlignGame()                       # the scores not given by the request
+    for name in ('reward_match', 'penalty_subst', 'penalty_insdel'):
+        setattr(game, name, request.get(name, getattr(defaults, name)))
+    return game, game.reset(request['x'], request['y'])
+
+
+def blackjackRequest(request, game=None):
+    """
+    game: the game of the same decks to reset, by default a new one
+    return: the BlackjackGame, or the ShoeBlackjackGame of the decks of a request, and its
+            initial state
+    """
+    from blackjack import BlackjackGame, ShoeBlackjackGame
+    decks = int(request.get('decks', 0))
+    if game is None:
+        game = ShoeBlackjackGame(decks) if decks else BlackjackGame()
+    return game, game.reset(int(request['usableace']), int(request['playersum']),
+                            int(request['dealercard']))
+
+
+GAMES = {   # name: (the builder of the game and the state, the solver type, the parameters
+            #        of a different game which needs its own solver)
+    'knapsack': (knapsackRequest, DeterministicSolver, ()),
+    'dna': (dnaRequest, DeterministicSolver, ()),
+    'blackjack': (blackjackRequest, StochasticSolver, ('decks',)),
+}
+
+
+class SolveService(object):
+
+    """
+    The solvers of the service, one for every game configuration, identified by the game's
+    name and the parameters which make a different game, e.g. the decks of the Blackjack
+    shoe, and the least recently used are dropped beyond maxSolvers. The keys of the states
+    include the instance, e.g. the sequences of the DNA alignment, so the instances of a
+    game share the solver, and its cache where they share subproblems. The solvers are not
+    thread-safe, so a single batching thread solves all the requests: it waits for the 
+    first request, collects the others arriving within the window, groups them by the
+    configuration, and solves the distinct initial states of every instance of a group with
+    solveMany() of the warm solver, its game reset to the instance, answering the duplicates
+    once. The caches of the warm solvers are bounded too: the games which tell the instance
+    of a state evict their least recently used instances beyond maxEntries, the others
+    evict their entries beyond cacheBudget to a spill file.
+    """
+
+    def __init__(self, window=0.002, maxBatch=256, maxSolvers=16, maxEntries=2 ** 23,
+                 cacheBudget=256 * 2 ** 20, timeout=60.):
+        """
+        Constructor
+
+        window: the seconds to wait for more requests after the first of a batch
+        maxBatch: the most requests of a batch
+        maxSolvers: the most solvers kept, one per game configuration
+        maxEntries: the most entries of the InstanceCache of a solver
+        cacheBudget: the memory budget in bytes of the BoundedCache of a solver
+        timeout: the seconds the HTTP handler waits for the answers of a request, None for
+                 no limit
+        """
+        self.window = window
+        self.maxBatch = maxBatch
+        self.maxSolvers = maxSolvers
+        self.maxEntries = maxEntries
+        self.cacheBudget = cacheBudget
+        self.timeout = timeout
+        self.solvers = collections.OrderedDict()    # configuration: solver, by recent use
+        self.metrics = collections.OrderedDict()    # configuration: its counters
+        self.pending = queue.Queue()                # (configuration, ..., future) to solve
+        self.requests = 0       # records the requests answered
+        self.batches = 0        # records the batches solved
+        self.solveSeconds = 0.  # records the seconds of the batches
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, name='dp-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, request):
+        """
+        Queues a request for the next batch.
+
+        request: the dict of the game and its parameters
+        return: a concurrent.futures.Future of the answer
+        """
+        future = concurrent.futures.Future()
+        try:
+            build, solverType, parameters = GAMES[request['game']]
+            game, state = build(request)
+            configuration = ':'.join([request['game']] +
+                                     [str(request.get(name, 0)) for name in parameters])
+            instance = game.fingerprint()
+        except Exception as error:
+            future.set_exception(ValueError('bad request: %r' % (error,)))
+            return future
+        self.pending.put((configuration, instance, request, game, solverType, state,
+                          time.time(), future))
+        return future
+
+    def solve(self, requests, timeout=None):
+        """
+        Solves the requests, waiting for the answers.
+
+        requests: a list of the dicts of the requests
+        timeout: the seconds to wait for all the answers, None for no limit
+        return: the list of the answers, raises concurrent.futures.TimeoutError when late
+        """
+        futures = [self.submit(request) for request in requests]
+        deadline = None if timeout is None else time.time() + timeout
+        return [future.result(None if deadline is None else max(deadline - time.time(), 0))
+                for future in futures]
+
+    def _solver(self, configuration, game, solverType):
+        """
+        return: the warm solver of a configuration, or a new one from the game
+        """
+        solver = self.solvers.pop(configuration, None)
+        if solver is None:
+            if hasattr(game, 'encode') and hasattr(game, 'instance'):
+                cache = InstanceCache(game, maxEntries=self.maxEntries)
+            else:
+                cache = BoundedCache(self.cacheBudget)      # spills to a temporary file
+            solver = solverType(game, iterative=True, cache=cache)  # threads have small stacks
+            self.metrics.setdefault(configuration, collections.Counter())
+            while len(self.solvers) >= self.maxSolvers:
+                dropped, old = self.solvers.popitem(last=False)
+                self.metrics[dropped]['evictions'] += old.cache.evictions + len(old.cache)
+                if isinstance(old.cache, BoundedCache):
+                    old.cache.close()
+        self.solvers[configuration] = solver
+        return solver
+
+    def _run(self):
+        """
+        The loop of the batching thread.
+        """
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.time() + self.window
+            while len(batch) < self.maxBatch:
+                try:
+                    batch.append(self.pending.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            start = time.time()
+            groups = collections.OrderedDict()
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for configuration, items in groups.items():
+                self._solveGroup(configuration, items, len(batch))
+            self.batches += 1
+            self.solveSeconds += time.time() - start
+
+    def _solveGroup(self, configuration, items, size):
+        """
+        Solves the requests of a configuration in a batch.
+
+        configuration: the configuration of the requests
+        items: the queued (configuration, instance, request, game, solver type, state, time,
+               future)
+        size: the number of requests of the batch
+        """
+        try:
+            solver = self._solver(configuration, items[0][3], items[0][4])
+            instances = collections.OrderedDict()   # fingerprint: the items of an instance
+            for item in items:
+                instances.setdefault(item[1], []).append(item)
+            roots = collections.OrderedDict()       # key: the state and the items
+            cached, answers = set(), {}
+            solved = solver.cachedCounter
+            for queued in instances.values():
+                request = queued[0][2]
+                GAMES[request['game']][0](request, solver.game)    # reset to the instance
+                states = collections.OrderedDict()
+                for item in queued:
+                    key = solver.key(item[5])
+                    states.setdefault(key, item[5])
+                    roots.setdefault(key, (item[5], []))[1].append(item)
+                cached.update(key for key in states if key in solver.cache)
+                for state, optimal, utility in solver.solveMany(list(states.values()), 1):
+                    answers[solver.key(state)] = optimal, utility
+        except Exception as error:
+            for item in items:
+                item[-1].set_exception(error)
+            return
+
+        metrics = self.metrics[configuration]
+        metrics['requests'] += len(items)
+        metrics['hits'] += sum(len(roots[key][1]) for key in cached)
+        metrics['subproblems'] += solver.cachedCounter - solved
+        metrics['batches'] += 1
+        now = time.time()
+        for key, (state, queued) in roots.items():
+            optimal, utility = answers[key]
+            for item in queued:
+                item[-1].set_result({
+                    'optimal': None if optimal is None else np.asarray(optimal).tolist(),
+                    'utility': float(utility),
+                    'cached': key in cached,
+                    'batch': size,
+                    'seconds': now - item[6],
+                })
+        self.requests += len(items)
+
+    def report(self):
+        """
+        Summarizes the metrics of the service.
+
+        return: a dict of the throughput, and the cache size and counters of every solver,
+                whose evictions count the entries evicted from its caches, or dropped with
+                its solvers
+        """
+        uptime = time.time() - self.started
+        solvers = {}
+        for configuration, metrics in self.metrics.items():
+            solver = self.solvers.get(configuration)
+            solvers[configuration] = dict(metrics, entries=len(solver.cache) if solver else 0,
+                                          warm=solver is not None)
+            solvers[configuration]['evictions'] = metrics['evictions'] + \
+                (solver.cache.evictions if solver else 0)
+        return {
+            'uptime': uptime,
+            'requests': self.requests,
+            'batches': self.batches,
+            'meanBatch': self.requests / float(self.batches) if self.batches else 0.,
+            'requestsPerSecond': self.requests / uptime if uptime > 0 else 0.,
+            'solveSeconds': self.solveSeconds,
+            'pending': self.pending.qsize(),
+            'solvers': solvers,
+        }
+
+
+class SolveHandler(BaseHTTPRequestHandler):
+
+    """
+    The HTTP handler of the service, POST /solve and GET /metrics. The service is the
+    attribute of the server.
+    """
+
+    def do_POST(self):
+        if self.path != '/solve':
+            return self._reply(404, {'error': 'not found'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            requests = body if isinstance(body, list) else [body]
+            answers = self.server.service.solve(requests, self.server.service.timeout)
+        except concurrent.futures.TimeoutError:
+            return self._reply(504, {'error': 'not solved within %g seconds'
+                                              % self.server.service.timeout})
+        except Exception as error:
+            return self._reply(400, {'error': str(error)})
+        self._reply(200, answers if isinstance(body, list) else answers[0])
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            return self._reply(404, {'error': 'not found'})
+        self._reply(200, self.server.service.report())
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass                    # quiet, see /metrics
+
+
+class SolveServer(ThreadingHTTPServer):
+
+    """
+    The HTTP server of the service, with a thread for every connection, and a backlog for
+    the bursts of requests to be batched.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(port=8765, host='127.0.0.1', service=None):
+    """
+    Creates the HTTP server of the service, on localhost only by default.
+
+    port: the port to listen, 0 for any free port
+    host: the address to listen
+    service: the SolveService, by default a new one
+    return: the server, call serve_forever() to run it
+    """
+    server = SolveServer((host, port), SolveHandler)
+    server.service = service or SolveService()
+    return server
+
+
+def post(url, payload, timeout=60):
+    """
+    The client of the service.
+
+    url: the URL of the server, e.g. http://127.0.0.1:8765
+    payload: a request, or a list of them
+    timeout: the seconds to wait
+    return: the answer, or the list of them
+    """
+    request = urllib.request.Request(url.rstrip('/') + '/solve', json.dumps(payload).encode(),
+                                     {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+if __name__ == '__main__':
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = serve(port)
+    print('serving on http://127.0.0.1:%d, POST /solve, GET /metrics' % port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
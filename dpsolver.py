@@ -1,24 +1,1844 @@
 """
 dpsolver.py
 """
+import os
+import sys
+import json
+import time
+import queue
+import heapq
+import weakref
+import tempfile
+import hashlib
+import traceback
+import functools
+import collections
+import multiprocessing
 import numpy as np
 
-class DeterministicSolver(object):
+class ArrayCache(object):
 
     """
-    The generic solver for deterministic dynamic programming problem.
+    The dense cache for games which encode their states into bounded integer indices. The 
+    optimal actions and the utilities are stored in preallocated numpy arrays, indexed by 
+    the integer key, instead of a dict of (state, optimal, utility) tuples. Keys beyond the
+    arrays are kept in a small dict of (optimal, utility) instead, the arrays only grow by 
+    reserve(), so a few large keys never allocate the range below them.
+    """
+
+    def __init__(self, size=0, limit=2 ** 24):
+        """
+        Constructor
+
+        size: the number of integer keys to preallocate, e.g. game.encodeSize()
+        limit: the maximum number of integer keys to be stored in the dense arrays
+        """
+        size = min(size, limit)
+        self.optimal = np.full(size, -1, dtype=np.int64)   # -1 for no optimal action
+        self.utility = np.zeros(size)
+        self.filled = np.zeros(size, dtype=bool)            # whether a key is solved
+        self.sparse = {}                                    # keys beyond the limit
+        self.limit = limit
+        self.count = 0
+
+    def reserve(self, size):
+        """
+        Grows the dense arrays to hold the given number of integer keys, up to the limit.
+
+        size: the number of integer keys
+        """
+        old = len(self.filled)
+        size = min(size, self.limit)
+        if size <= old:
+            return
+        self.optimal = np.concatenate([self.optimal, np.full(size - old, -1, dtype=np.int64)])
+        self.utility = np.concatenate([self.utility, np.zeros(size - old)])
+        self.filled = np.concatenate([self.filled, np.zeros(size - old, dtype=bool)])
+
+    def __contains__(self, key):
+        if key < len(self.filled):
+            return self.filled[key]
+        return key in self.sparse
+
+    def __getitem__(self, key):
+        if key >= len(self.filled):
+            return (None,) + self.sparse[key]
+        if not self.filled[key]:
+            raise KeyError(key)
+        optimal = self.optimal[key].item()
+        return None, (None if optimal < 0 else optimal), self.utility[key].item()
+
+    def __setitem__(self, key, value):
+        state, optimal, utility = value         # the state is not kept
+        if key >= len(self.filled):
+            self.count += key not in self.sparse
+            self.sparse[key] = optimal, utility
+            return
+
+        self.count += not self.filled[key]
+        self.optimal[key] = -1 if optimal is None else optimal
+        self.utility[key] = utility
+        self.filled[key] = True
+
+    def __delitem__(self, key):
+        if key >= len(self.filled):
+            del self.sparse[key]
+        elif self.filled[key]:
+            self.filled[key] = False
+            self.optimal[key] = -1
+        else:
+            raise KeyError(key)
+        self.count -= 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return np.flatnonzero(self.filled).tolist() + list(self.sparse)
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+
+class InstanceCache(object):
+
+    """
+    The cache for games which encode their states into a bounded index per instance, e.g.
+    per reset() of the game, and tell the instance of a state by instance(). The keys are
+    the (instance, index) pairs of keyFunction(), and every instance has a cache of its own,
+    the dense ArrayCache of encodeSize() if small, keyed by the index. So a solver may be
+    reused across the instances without folding the instance into every index. With an
+    entry limit, the caches of the least recently used instances are evicted as a whole
+    when a new instance starts, e.g. in a long-lived solver; the instance being solved is
+    never evicted, so it may exceed the limit on its own.
+    """
+
+    def __init__(self, game, denseLimit=2 ** 20, maxEntries=None):
+        """
+        Constructor
+
+        game: the game object, whose encodeSize() sizes the cache of a new instance
+        denseLimit: the largest encodeSize() to preallocate the dense arrays for
+        maxEntries: the most entries of all the instances kept, None for no limit
+        """
+        self.game = game
+        self.denseLimit = denseLimit
+        self.maxEntries = maxEntries
+        self.caches = collections.OrderedDict()     # instance: cache, the last used last
+        self.last = None        # the (instance, cache) of the last lookup
+        self.evictions = 0      # records the entries evicted with their instances
+
+    def cache(self, instance, create=False):
+        """
+        Looks up the cache of an instance.
+
+        instance: the instance of the game
+        create: whether to create the cache of a new instance
+        return: the cache, or None if not found and not created
+        """
+        last = self.last
+        if last is not None and last[0] == instance:
+            return last[1]
+        cache = self.caches.get(instance)
+        if cache is None:
+            if not create:
+                return None
+            if self.maxEntries is not None:
+                self._evict()
+            size = self.game.encodeSize()
+            cache = ArrayCache(size) if 0 < size <= self.denseLimit else {}
+            self.caches[instance] = cache
+        self.caches.move_to_end(instance)
+        self.last = instance, cache
+        return cache
+
+    def _evict(self):
+        """
+        Evicts the least recently used instances until a new one is below the entry limit.
+        """
+        entries = len(self)
+        while self.caches and entries >= self.maxEntries:
+            _, cache = self.caches.popitem(last=False)
+            entries -= len(cache)
+            self.evictions += len(cache)
+        self.last = None
+
+    def __contains__(self, key):
+        instance, index = key
+        last = self.last
+        cache = last[1] if last is not None and last[0] == instance else self.cache(instance)
+        return cache is not None and index in cache
+
+    def __getitem__(self, key):
+        instance, index = key
+        last = self.last
+        cache = last[1] if last is not None and last[0] == instance else self.cache(instance)
+        if cache is None:
+            raise KeyError(key)
+        return cache[index]
+
+    def __setitem__(self, key, value):
+        instance, index = key
+        last = self.last
+        cache = last[1] if last is not None and last[0] == instance else \
+            self.cache(instance, True)
+        cache[index] = value
+
+    def __delitem__(self, key):
+        cache = self.cache(key[0])
+        if cache is None:
+            raise KeyError(key)
+        del cache[key[1]]
+
+    def __len__(self):
+        return sum(len(cache) for cache in self.caches.values())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [(instance, key) for instance, cache in self.caches.items() for key in cache]
+
+    def values(self):
+        return [value for cache in self.caches.values() for value in cache.values()]
+
+    def items(self):
+        return [((instance, key), value) for instance, cache in self.caches.items()
+                for key, value in cache.items()]
+
+
+def mapFile(path, dtype, mode, shape, offset=0):
+    """
+    Memory-maps a file as a plain numpy array, since the indexing of a numpy.memmap is many 
+    times slower for the single elements of the hash tables. The file stays mapped as long 
+    as the array is referenced.
+
+    path: the file
+    dtype, mode, shape, offset: as of numpy.memmap
+    return: the array
+    """
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape, offset=offset).view(np.ndarray)
+
+
+def probe(tags, tag):
+    """
+    Linear probing in an open-addressing table for the slot of a tag.
+
+    tags: the array of 64-bit tags of the table, zero for empty slots
+    tag: the non-zero tag to look for
+    return: the slot of the tag, or the empty slot where it would be inserted
+    """
+    capacity = len(tags)
+    slot = ((tag >> 32) ^ tag) % capacity   # the high bits too, the low bits of the tags
+    while True:                             # of nearby integer keys are alike
+        current = int(tags[slot])
+        if current == tag or current == 0:
+            return slot
+        slot = (slot + 1) % capacity
+
+
+class SpillTable(object):
+
+    """
+    An open-addressing hash table in a memory-mapped file, for the cache entries evicted 
+    from memory. Keys are reduced to 64-bit tags, and only the optimal action (an integer) 
+    and the utility are kept, so the states of the spilled entries are not recovered. The
+    numeric fields after the utility, e.g. the standard errors of the SampledSolver, are
+    kept in a second memory-mapped file, PATH.extra, of the same slots, and every entry of
+    a table has the same number of them.
+    """
+
+    dtype = np.dtype([('tag', np.uint64), ('optimal', np.int64), ('utility', np.float64)])
+    deleted = -2            # the optimal action of a deleted entry
+
+    def __init__(self, path, capacity=1024):
+        """
+        Constructor
+
+        path: the file to spill to, overwritten if exists
+        capacity: the initial number of slots, doubled when half full
+        """
+        self.path = path
+        self.count = 0
+        self.table = mapFile(path, dtype=self.dtype, mode='w+', shape=(capacity,))
+        self.extra = None       # the fields after the utility of every slot, if any
+
+    @staticmethod
+    def tag(key):
+        """
+        Reduces a cache key into a non-zero 64-bit tag, zero marks an empty slot.
+
+        key: the key of a cache entry, an integer or a hash value
+        return: the 64-bit tag
+        """
+        if isinstance(key, (int, np.integer)) and 0 <= key < 2 ** 64:
+            tag = (int(key) * 0x9E3779B97F4A7C15 + 1) & 0xFFFFFFFFFFFFFFFF
+        else:
+            digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+            tag = int.from_bytes(digest, 'little')
+        return tag or 1
+
+    def _find(self, tag):
+        """
+        Finds the slot of a tag, or the empty slot where it would be.
+        """
+        return probe(self.table['tag'], tag)
+
+    def put(self, key, optimal, utility, *extra):
+        """
+        Writes an entry to the table.
+
+        key: the cache key
+        optimal: the optimal action as an integer, or None
+        utility: the utility
+        extra: the numeric fields after the utility, if any
+        """
+        if 2 * (self.count + 1) > len(self.table):
+            self._grow()
+        tag = self.tag(key)
+        slot = self._find(tag)
+        if self.table['tag'][slot] == 0:
+            self.count += 1
+        self.table[slot] = (tag, -1 if optimal is None else optimal, utility)
+        if extra:
+            if self.extra is None:
+                self.extra = mapFile(self.path + '.extra', dtype=np.float64, mode='w+',
+                                       shape=(len(self.table), len(extra)))
+            self.extra[slot] = extra
+
+    def get(self, key):
+        """
+        Reads an entry from the table.
+
+        key: the cache key
+        return: the optimal action, the utility and the extra fields if any, or None if not 
+                spilled
+        """
+        slot = self._find(self.tag(key))
+        tag, optimal, utility = self.table[slot].tolist()
+        if tag == 0 or optimal == self.deleted:
+            return None
+        found = (None if optimal < 0 else optimal), utility
+        if self.extra is not None:
+            found += tuple(self.extra[slot].tolist())
+        return found
+
+    def delete(self, key):
+        """
+        Deletes an entry from the table, its slot is kept as a tombstone for the probing.
+
+        key: the cache key
+        return: whether the entry was in the table
+        """
+        slot = self._find(self.tag(key))
+        if self.table['tag'][slot] == 0 or self.table['optimal'][slot] == self.deleted:
+            return False
+        self.table['optimal'][slot] = self.deleted
+        return True
+
+    def _grow(self):
+        """
+        Doubles the table into a new file, and rehashes the occupied slots.
+        """
+        occupied = (self.table['tag'] != 0) & (self.table['optimal'] != self.deleted)
+        entries = self.table[occupied].copy()
+        self.count = len(entries)           # without the tombstones
+        extra = None if self.extra is None else self.extra[occupied].copy()
+        capacity = 2 * len(self.table)
+        del self.table
+        self.table = mapFile(self.path, dtype=self.dtype, mode='w+', shape=(capacity,))
+        if extra is not None:
+            del self.extra
+            self.extra = mapFile(self.path + '.extra', dtype=np.float64, mode='w+',
+                                   shape=(capacity, extra.shape[1]))
+        for index, (tag, optimal, utility) in enumerate(entries.tolist()):
+            slot = self._find(tag)
+            self.table[slot] = (tag, optimal, utility)
+            if extra is not None:
+                self.extra[slot] = extra[index]
+
+    def close(self):
+        """
+        Releases the memory map and deletes the file.
+        """
+        del self.table
+        os.remove(self.path)
+        if self.extra is not None:
+            del self.extra
+            os.remove(self.path + '.extra')
+
+
+class BoundedCache(object):
+
+    """
+    The cache with a memory budget. When the entries in memory exceed the budget, the least
+    recently used (LRU) or the least reused (LFU) entries are evicted, and spilled to a 
+    memory-mapped SpillTable which is read back on a miss, so the evicted subproblems are
+    not solved again. The entries may also be dropped instead, and the memory saved is then
+    paid for by solving them again, which can multiply the subproblems solved many times
+    over in the overlapping games, e.g. the Blackjack. The entry just added is never
+    evicted by its own insertion. For LFU, a new entry starts at the uses of the last entry
+    evicted rather than zero (the dynamic aging of LFU), so it is not the first to go before
+    it has a chance to be reused, and the entries reused long ago are evicted eventually.
+    """
+
+    def __init__(self, budget, policy='lru', spill=None):
+        """
+        Constructor
+
+        budget: the memory budget in bytes for the entries kept in memory
+        policy: 'lru' evicts the least recently used, 'lfu' evicts the least reused entry
+        spill: the path of the file to spill the evicted entries to, None for a temporary 
+               file created on the first eviction, False to drop them
+        """
+        if policy not in ('lru', 'lfu'):
+            raise ValueError('unknown eviction policy %r' % policy)
+        self.budget = budget
+        self.policy = policy
+        self.entries = collections.OrderedDict()    # key: (value, bytes, uses)
+        self.heap = []                              # (uses, order, key) for 'lfu'
+        self.order = 0
+        self.age = 0                                # the uses of the last evicted for 'lfu'
+        self.found = None                           # the (key, value) of the last lookup
+        self.bytes = 0
+        self.spill = None if spill is None or spill is False else SpillTable(spill)
+        self.spillable = spill is not False
+        self.closer = None if self.spill is None else weakref.finalize(self, self.spill.close)
+        self.hits = 0           # records the lookups found in memory or spilled
+        self.misses = 0         # records the lookups not found
+        self.evictions = 0      # records the entries evicted from memory
+        self.spillReads = 0     # records the lookups read back from the spill
+
+    @staticmethod
+    def entrySize(key, value):
+        """
+        Estimates the memory used by a cache entry, including the state object.
+
+        key: the key of the entry
+        value: the (state, optimal, utility) tuple
+        return: the estimated bytes
+        """
+        size = sys.getsizeof(key) + sys.getsizeof(value) + 100     # with the dict overhead
+        for item in value:
+            size += sys.getsizeof(item)
+            if isinstance(item, (tuple, list)):
+                size += sum(sys.getsizeof(element) for element in item)
+        return size
+
+    def __contains__(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._touch(key, entry)
+            self.found = key, entry[0]
+            return True
+
+        if self.spill is not None:
+            found = self.spill.get(key)
+            if found is not None:           # read back to memory
+                self.hits += 1
+                self.spillReads += 1
+                self[key] = value = (None,) + found
+                self.found = key, value
+                return True
+
+        self.misses += 1
+        return False
+
+    def _touch(self, key, entry):
+        """
+        Records a reuse of an entry for the eviction policy.
+        """
+        if self.policy == 'lru':
+            self.entries.move_to_end(key)
+        else:
+            entry[2] += 1
+            self.order += 1
+            heapq.heappush(self.heap, (entry[2], self.order, key))
+
+    def __getitem__(self, key):
+        if self.found is not None and self.found[0] == key:
+            return self.found[1]            # found by the lookup just before
+        return self.entries[key][0]
+
+    def __setitem__(self, key, value):
+        self.found = None
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        size = self.entrySize(key, value)
+        self.entries[key] = [value, size, self.age + 1]
+        self.bytes += size
+        if self.policy == 'lfu':
+            self.order += 1
+            heapq.heappush(self.heap, (self.age + 1, self.order, key))
+
+        while self.bytes > self.budget and len(self.entries) > 1:
+            self._evict(key)
+
+    def __delitem__(self, key):
+        self.found = None
+        entry = self.entries.pop(key, None)
+        spilled = self.spill is not None and self.spill.delete(key)
+        if entry is None and not spilled:
+            raise KeyError(key)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _evict(self, keep):
+        """
+        Evicts one entry by the policy, and spills it if a spill file is given.
+
+        keep: the key of the entry just added, which is not evicted
+        """
+        if self.policy == 'lru':
+            key, entry = self.entries.popitem(last=False)   # the added one is the last
+        else:
+            kept = None
+            while True:
+                item = heapq.heappop(self.heap)
+                uses, order, key = item
+                entry = self.entries.get(key)
+                if entry is None or entry[2] != uses:
+                    continue                # a stale use
+                if key != keep:
+                    break
+                kept = item
+            if kept is not None:
+                heapq.heappush(self.heap, kept)
+            del self.entries[key]
+            self.age = uses
+            if len(self.heap) > 4 * len(self.entries) + 64:     # drop the stale uses
+                self.heap = [item for item in self.heap 
+                             if item[2] in self.entries and self.entries[item[2]][2] == item[0]]
+                heapq.heapify(self.heap)
+
+        self.bytes -= entry[1]
+        self.evictions += 1
+        if self.spill is None and self.spillable:
+            handle, path = tempfile.mkstemp(prefix='dpspill-')
+            os.close(handle)
+            self.spill = SpillTable(path)
+            self.closer = weakref.finalize(self, self.spill.close)
+        if self.spill is not None:
+            self.spill.put(key, *entry[0][1:])     # all but the state
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def values(self):
+        return [entry[0] for entry in self.entries.values()]
+
+    def items(self):
+        return [(key, entry[0]) for key, entry in self.entries.items()]
+
+    def stats(self):
+        """
+        return: a dict of the hits, misses, evictions and spill reads, as well as the number 
+                of entries and the estimated bytes in memory
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'spillReads': self.spillReads, 'entries': len(self.entries), 
+                'bytes': self.bytes}
+
+    def close(self):
+        """
+        Deletes the spill file if any, also done when the cache is garbage collected.
+        """
+        if self.spill is not None:
+            self.closer()
+            self.spill = None
+
+
+class PolicyStore(object):
+
+    """
+    The persistent store of a solved cache, for warm restarts. The file holds a header with 
+    the fingerprint of the game, followed by the same open-addressing table of (tag, optimal, 
+    utility) records as the SpillTable. The table is memory-mapped read-only, so lookups do 
+    not load the whole store into memory. New entries go to an in-memory overlay cache.
+    """
+
+    magic = b'DPSTORE1'
+    headerSize = 64         # magic, sha256 fingerprint, count, capacity, padding
+
+    def __init__(self, path, fingerprint, overlay=None):
+        """
+        Constructor, opens a saved store.
+
+        path: the file saved by PolicyStore.save()
+        fingerprint: the fingerprint of the game, must match the one saved
+        overlay: the cache for the entries solved after loading, by default a dict
+        """
+        with open(path, 'rb') as f:
+            header = f.read(self.headerSize)
+        if header[:8] != self.magic:
+            raise ValueError('%s is not a policy store' % path)
+        if header[8:40] != self.digest(fingerprint):
+            raise ValueError('%s is saved from a game with different parameters' % path)
+        self.count, capacity = np.frombuffer(header[40:56], dtype=np.uint64).tolist()
+        self.path = path
+        self.table = mapFile(path, dtype=SpillTable.dtype, mode='r', 
+                               offset=self.headerSize, shape=(capacity,))
+        self.tags = self.table['tag']
+        self.overlay = {} if overlay is None else overlay
+
+    @staticmethod
+    def digest(fingerprint):
+        """
+        return: the 32-byte sha256 digest of a fingerprint string
+        """
+        return hashlib.sha256(fingerprint.encode()).digest()
+
+    @classmethod
+    def save(cls, path, cache, fingerprint):
+        """
+        Saves a solved cache to a store file. The optimal actions must be integers, and the 
+        states of the entries are not saved.
+
+        path: the file to write
+        cache: the solved cache, a dict or any of the caches in this module
+        fingerprint: the fingerprint of the game
+        """
+        records = cls.records(cache)
+        capacity = 16
+        while capacity < 2 * len(records):
+            capacity *= 2
+        table = np.zeros(capacity, dtype=SpillTable.dtype)
+        tags = table['tag']
+        count = 0
+        for record in records.tolist():
+            slot = probe(tags, record[0])
+            count += tags[slot] == 0
+            table[slot] = record
+
+        header = cls.magic + cls.digest(fingerprint)
+        header += np.array([count, capacity], dtype=np.uint64).tobytes()
+        with open(path, 'wb') as f:
+            f.write(header.ljust(cls.headerSize, b'\0'))
+            table.tofile(f)
+
+    @staticmethod
+    def records(cache):
+        """
+        Collects the (tag, optimal, utility) records of a cache, including the entries in 
+        the memory-mapped tables of a PolicyStore or a spilling BoundedCache.
+
+        cache: the solved cache
+        return: a structured array of the records
+        """
+        tables = []
+        if isinstance(cache, PolicyStore):
+            tables.append(np.asarray(cache.table[cache.tags != 0]))
+            cache = cache.overlay
+        spill = getattr(cache, 'spill', None)
+        if spill is not None:
+            table = spill.table
+            tables.append(np.asarray(table[(table['tag'] != 0) & 
+                                           (table['optimal'] != SpillTable.deleted)]))
+
+        entries = [(SpillTable.tag(key), -1 if value[1] is None else value[1], value[2])
+                   for key, value in cache.items()]
+        tables.append(np.array(entries, dtype=SpillTable.dtype))
+        return np.concatenate(tables)       # later records overwrite the earlier
+
+    def __contains__(self, key):
+        if key in self.overlay:
+            return True
+        return self.tags[probe(self.tags, SpillTable.tag(key))] != 0
+
+    def __getitem__(self, key):
+        if key in self.overlay:
+            return self.overlay[key]
+        tag, optimal, utility = self.table[probe(self.tags, SpillTable.tag(key))].tolist()
+        if tag == 0:
+            raise KeyError(key)
+        return None, (None if optimal < 0 else optimal), utility
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = value
+
+    def __len__(self):
+        return self.count + len(self.overlay)
+
+    def __iter__(self):
+        return iter(self.overlay)
+
+    def keys(self):
+        return self.overlay.keys()
+
+    def values(self):
+        return self.overlay.values()
+
+    def items(self):
+        return self.overlay.items()
+
+
+def solveWorker(solverType, game, options, store, tasks, results, merge, shared=None, 
+                incumbent=None):
+    """
+    The worker process of Solver.solveMany(), solves the states from the task queue with
+    its own solver, and puts the results to the result queue.
+
+    solverType: the class of the solver
+    game: the game object
+    options: the keyword arguments of the solver besides the game, see Solver.options()
+    store: the path of a PolicyStore to load, or None
+    tasks: the queue of (index, state, alpha), None to finish, where alpha is the utility to
+           beat by the branch and bound, or None to solve exactly
+    results: the queue of ('solved', index, optimal, utility), or ('bounded', index, upper
+             bound) of the states which cannot beat their alpha, then ('done', counter, 
+             cachedCounter, cache items to merge), or ('error', traceback)
+    merge: whether to send the cache items back when done
+    shared: a SharedTable to share the solved subproblems, and the upper bounds of the 
+            pruned ones, with the other workers, or None
+    incumbent: the Incumbent which the alphas are relative to, or None
+    """
+    try:
+        solver = solverType(game, **options)
+        if store is not None:
+            solver.load(store)
+        if shared is not None:
+            solver.cache = SharedCache(shared, solver.cache)
+            if hasattr(solver, 'bounds'):
+                solver.bounds = SharedBounds(shared, solver.bounds)
+        for index, state, alpha in iter(tasks.get, None):
+            if alpha is None:
+                optimal, utility = solver.solve(state)
+                results.put(('solved', index, optimal, utility))
+                continue
+            if incumbent is not None:
+                optimal, utility, exact = incumbent.solveAbove(solver, state, alpha)
+            else:
+                optimal, utility, exact = solver.solveAbove(state, alpha)
+            if exact:
+                results.put(('solved', index, optimal, utility))
+            else:
+                results.put(('bounded', index, utility))
+        items = list(solver.cache.items()) if merge else []
+        results.put(('done', solver.counter, solver.cachedCounter, items))
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+    finally:
+        if shared is not None:
+            shared.close()
+
+
+class Incumbent(object):
+
+    """
+    The best utility found so far of an initial state, shared by the worker processes of
+    DeterministicSolver.solveParallel(), which solve the subproblems of its frontier by the 
+    branch and bound. The alpha of a subproblem is the incumbent less the best reward from
+    the initial state to it, so a worker raises the alpha by as much as the incumbent is 
+    raised since the start, and raises the incumbent by the path through every subproblem
+    it solves exactly.
+    """
+
+    def __init__(self, utility):
+        """
+        Constructor
+
+        utility: the utility of a path of the initial state, which the alphas are from
+        """
+        self.start = utility
+        self.value = multiprocessing.Value('d', utility)
+
+    def solveAbove(self, solver, state, alpha):
+        """
+        Solves a subproblem of the frontier by DeterministicSolver.solveAbove(), above the 
+        alpha raised by the incumbent, and raises the incumbent by its path.
+
+        solver: the DeterministicSolver
+        state: the state of the subproblem
+        alpha: the utility to beat from the start incumbent
+        return: the optimal action, the utility, and whether it is exact or an upper bound
+        """
+        raised = self.value.value - self.start
+        optimal, utility, exact = solver.solveAbove(state, alpha + raised)
+        if exact:
+            path = self.start - alpha + utility         # the reward to the state is start - alpha
+            path -= 1e-9 * max(1., abs(path))           # so the ties with it are solved
+            with self.value.get_lock():
+                if path > self.value.value:
+                    self.value.value = path
+        return optimal, utility, exact
+
+
+class SharedTable(object):
+
+    """
+    The open-addressing table of (tag, optimal, utility) records like the SpillTable, but in
+    a multiprocessing.shared_memory block, so the subproblems solved by one worker process
+    are visible to the others. A record may also hold only an upper bound of the utility of
+    a subproblem pruned by the branch and bound, until it is solved exactly. Inserts are 
+    serialized by a lock, and the tag of a record is written last so lookups need no lock;
+    the utility of an exact record is written before its optimal action, so a bound being 
+    overwritten still reads as a bound. The table does not grow, inserts are dropped once 
+    it is 70% full.
+    """
+
+    bounded = -2            # the optimal action of a record of an upper bound
+
+    def __init__(self, capacity=2 ** 20, name=None, lock=None):
+        """
+        Constructor, creates a new block, or attaches to an existing one by name.
+
+        capacity: the number of slots
+        name: the name of the shared memory block to attach to, None to create
+        lock: the lock of the block to attach to
+        """
+        from multiprocessing import shared_memory      # requires python 3.8
+        size = 8 + capacity * SpillTable.dtype.itemsize
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.owner = os.getpid() if name is None else None     # the process to unlink it
+        self.capacity = capacity
+        self.count = np.ndarray(1, dtype=np.int64, buffer=self.memory.buf)
+        self.table = np.ndarray(capacity, dtype=SpillTable.dtype, buffer=self.memory.buf, 
+                                offset=8)
+        self.tags = self.table['tag']
+        self.lock = multiprocessing.Lock() if lock is None else lock
+        if name is None:
+            self.count[0] = 0
+            self.table[:] = 0
+
+    def __reduce__(self):
+        return SharedTable, (self.capacity, self.memory.name, self.lock)
+
+    def get(self, key):
+        """
+        Reads an entry from the table.
+
+        key: the cache key
+        return: the optimal action and the utility, or None if not found
+        """
+        tag = SpillTable.tag(key)
+        slot = probe(self.tags, tag)
+        if self.tags[slot] != tag:
+            return None
+        tag, optimal, utility = self.table[slot].tolist()
+        if optimal == self.bounded:
+            return None
+        return (None if optimal < 0 else optimal), utility
+
+    def bound(self, key):
+        """
+        Reads the upper bound of a subproblem pruned by the branch and bound.
+
+        key: the cache key
+        return: the upper bound, or None if not found or solved exactly
+        """
+        tag = SpillTable.tag(key)
+        slot = probe(self.tags, tag)
+        if self.tags[slot] != tag:
+            return None
+        tag, optimal, utility = self.table[slot].tolist()
+        return utility if optimal == self.bounded else None
+
+    def put(self, key, optimal, utility):
+        """
+        Writes an entry to the table, unless the table is full.
+
+        key: the cache key
+        optimal: the optimal action as an integer, or None
+        utility: the utility
+        """
+        tag = SpillTable.tag(key)
+        with self.lock:
+            if 10 * self.count[0] >= 7 * self.capacity:
+                return
+            slot = probe(self.tags, tag)
+            if self.tags[slot] == 0:
+                self.count[0] += 1
+            self.table['utility'][slot] = utility
+            self.table['optimal'][slot] = -1 if optimal is None else optimal
+            self.tags[slot] = tag
+
+    def putBound(self, key, upper):
+        """
+        Writes an upper bound to the table, unless the table is full, the subproblem is 
+        solved exactly, or a tighter bound is written already.
+
+        key: the cache key
+        upper: the upper bound of the utility
+        """
+        tag = SpillTable.tag(key)
+        with self.lock:
+            if 10 * self.count[0] >= 7 * self.capacity:
+                return
+            slot = probe(self.tags, tag)
+            if self.tags[slot] == 0:
+                self.count[0] += 1
+            elif self.table['optimal'][slot] != self.bounded or \
+                    self.table['utility'][slot] <= upper:
+                return
+            self.table['utility'][slot] = upper
+            self.table['optimal'][slot] = self.bounded
+            self.tags[slot] = tag
+
+    def close(self):
+        """
+        Detaches from the block, and unlinks it if created by this process.
+        """
+        del self.count, self.table, self.tags
+        self.memory.close()
+        if self.owner == os.getpid():
+            self.memory.unlink()
+
+
+class SharedCache(object):
+
+    """
+    The cache of a worker process which also looks up and publishes the solved subproblems
+    in a SharedTable.
+    """
+
+    def __init__(self, shared, local):
+        """
+        Constructor
+
+        shared: the SharedTable
+        local: the worker's own cache
+        """
+        self.shared = shared
+        self.local = local
+        self.sharedHits = 0     # records the subproblems solved by the other workers
+
+    def __contains__(self, key):
+        if key in self.local:
+            return True
+        found = self.shared.get(key)
+        if found is None:
+            return False
+        self.sharedHits += 1
+        self.local[key] = (None,) + found
+        return True
+
+    def __getitem__(self, key):
+        return self.local[key]
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+        state, optimal, utility = value
+        self.shared.put(key, optimal, utility)
+
+    def __len__(self):
+        return len(self.local)
+
+    def __iter__(self):
+        return iter(self.local)
+
+    def keys(self):
+        return self.local.keys()
+
+    def values(self):
+        return self.local.values()
+
+    def items(self):
+        return self.local.items()
+
+
+class SharedBounds(object):
+
+    """
+    The upper bounds of the subproblems pruned by a worker process, which also looks up and
+    publishes them in a SharedTable, so the other workers do not search them again for the
+    same alpha. It stands in for the dict DeterministicSolver.bounds.
+    """
+
+    def __init__(self, shared, local):
+        """
+        Constructor
+
+        shared: the SharedTable
+        local: the worker's own dict of the bounds
+        """
+        self.shared = shared
+        self.local = local
+
+    def get(self, key, default=None):
+        upper = self.shared.bound(key)
+        if key in self.local and (upper is None or self.local[key] < upper):
+            upper = self.local[key]
+        return default if upper is None else upper
+
+    def __getitem__(self, key):
+        upper = self.get(key)
+        if upper is None:
+            raise KeyError(key)
+        return upper
+
+    def __setitem__(self, key, upper):
+        self.local[key] = upper
+        self.shared.putBound(key, upper)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def pop(self, key, default=None):
+        return self.local.pop(key, default)
+
+    def clear(self):
+        self.local.clear()
+
+
+class Policy(object):
+
+    """
+    The optimal actions of a solved solver, without the utilities and the states, in the 
+    smallest integer type holding them. With the integer keys of encode() the actions are
+    an array indexed by the key, and with the keys of an InstanceCache an array of every
+    instance. The entries of a PolicyStore or a spilling BoundedCache are only known by 
+    their 64-bit tags, so their actions are kept in an open-addressing table of the tags, 
+    like the SpillTable. Otherwise they are a dict by the hash values. Each looks up the 
+    action of a state in O(1), and path() replays the optimal path from a state lazily.
+    """
+
+    def __init__(self, solver, maxDense=2 ** 26):
+        """
+        Constructor
+
+        solver: the DeterministicSolver or StochasticSolver solved
+        maxDense: the largest integer key for the dense array, a dict beyond
+        """
+        self.game = unwrap(solver.game)
+        self.key = keyFunction(self.game)
+        self.stochastic = solver.stochastic
+        self.actions = None     # the array of the action of every key or slot, -1 for none
+        self.tags = None        # the tags of the slots of the actions, if tagged
+        self.table = None       # the dict of the actions by the keys, if neither
+        self.instances = None   # the Policy of the cache of every instance, if per instance
+
+        cache = solver.cache
+        if isinstance(cache, InstanceCache):
+            self.instances = {}
+            for instance, instanceCache in cache.caches.items():
+                policy = self.instances[instance] = object.__new__(Policy)
+                policy.instances = None
+                policy._build(instanceCache, maxDense)
+            return
+        self._build(cache, maxDense)
+
+    def _build(self, cache, maxDense):
+        """
+        Collects the optimal actions of a cache into the array, the tagged table or the dict.
+
+        cache: the solved cache, not an InstanceCache
+        maxDense: the largest integer key for the dense array, a dict beyond
+        """
+        self.actions = self.tags = self.table = None
+        if isinstance(cache, ArrayCache) and not cache.sparse:
+            filled = np.flatnonzero(cache.filled)
+            size = filled[-1] + 1 if len(filled) else 0
+            self.actions = self._compact(cache.optimal[:size])     # the unfilled are -1
+            return
+
+        if isinstance(cache, PolicyStore) or getattr(cache, 'spill', None) is not None:
+            records = PolicyStore.records(cache)
+            capacity = 16
+            while capacity < 2 * len(records):
+                capacity *= 2
+            self.tags = np.zeros(capacity, dtype=np.uint64)
+            actions = np.full(capacity, -1, dtype=np.int64)
+            for tag, optimal, utility in records.tolist():
+                slot = probe(self.tags, tag)
+                self.tags[slot] = tag
+                actions[slot] = optimal
+            self.actions = self._compact(actions)
+            return
+
+        keys, actions = [], []
+        for key, value in cache.items():
+            keys.append(key)
+            actions.append(value[1])
+        dense = all(isinstance(a, (int, np.integer)) or a is None for a in actions) and \
+            all(isinstance(k, (int, np.integer)) and 0 <= k < maxDense for k in keys)
+        if dense:
+            table = np.full(max(keys, default=-1) + 1, -1, dtype=np.int64)
+            table[keys] = [-1 if a is None else a for a in actions]
+            self.actions = self._compact(table)
+        else:
+            self.table = dict(zip(keys, actions))
+
+    @staticmethod
+    def _compact(actions):
+        """
+        return: a copy of an array of actions in the smallest signed integer type holding 
+                them, and -1 for none
+        """
+        largest = int(actions.max(initial=0))
+        for dtype in (np.int8, np.int16, np.int32):
+            if largest <= np.iinfo(dtype).max:
+                return actions.astype(dtype)
+        return actions.astype(np.int64)
+
+    def __getitem__(self, state):
+        return self.action(state)
+
+    def __len__(self):
+        if self.instances is not None:
+            return sum(len(policy) for policy in self.instances.values())
+        if self.table is not None:
+            return len(self.table)
+        return int(np.count_nonzero(self.actions >= 0))
+
+    def action(self, state):
+        """
+        Looks up the optimal action of a state.
+
+        state: a state of the game
+        return: the optimal action, or None if the state is terminal or not solved
+        """
+        key = self.key(state)
+        if self.instances is not None:
+            policy = self.instances.get(key[0])
+            return None if policy is None else policy._action(key[1])
+        return self._action(key)
+
+    def _action(self, key):
+        """
+        Looks up the optimal action of a key, see action().
+        """
+        if self.table is not None:
+            return self.table.get(key)
+        if self.tags is not None:
+            key = probe(self.tags, SpillTable.tag(key))     # the slot of the tag
+            if self.tags[key] == 0:
+                return None
+        if key >= len(self.actions) or self.actions[key] < 0:
+            return None
+        return self.actions[key].item()
+
+    def path(self, state, rng=None):
+        """
+        Replays the optimal path from a state, stepping the game with the optimal actions
+        until a terminal state. The next states of a stochastic game are drawn at random.
+
+        state: the state to start from
+        rng: the numpy RandomState to draw the next states, by default a new one
+        return: a generator of (state, action, reward) of every step on the path
+        """
+        if self.stochastic and rng is None:
+            rng = np.random.RandomState()
+        while len(self.game.actionDomain(state)) > 0:
+            action = self.action(state)
+            if action is None:
+                raise KeyError('the state %r is not solved' % (state,))
+            if self.stochastic:
+                nextStates, probs, rewards = self.game.step(state, action)
+                probs = np.broadcast_to(np.asarray(probs, float), len(nextStates))
+                pick = rng.choice(len(nextStates), p=probs / probs.sum())
+                reward = np.broadcast_to(rewards, len(nextStates))[pick]
+                nextState = nextStates[pick]
+            else:
+                nextState, reward = self.game.step(state, action)
+            yield state, action, reward
+            state = nextState
+
+
+def makeCache(game, denseLimit=2 ** 20):
+    """
+    Chooses the cache for a game, the dense ArrayCache of encodeSize() if the game
+    implements encode() of a small range, and an InstanceCache of them if the game also
+    implements instance(), otherwise a dict keyed by encode() or hash().
+
+    game: the game object modelling the problem to be solved
+    denseLimit: the largest encodeSize() to preallocate the dense arrays for
+    return: the cache object
+    """
+    if hasattr(game, 'encode') and hasattr(game, 'instance'):
+        return InstanceCache(game, denseLimit)
+    size = game.encodeSize() if hasattr(game, 'encode') else 0
+    return ArrayCache(size) if 0 < size <= denseLimit else {}
+
+
+def keyFunction(game):
+    """
+    Chooses how a game's states are keyed in the cache, the integer index from encode() if
+    the game implements it, paired with the instance() of the state if implemented too,
+    otherwise the hash().
+
+    game: the game object modelling the problem to be solved
+    return: the function mapping a state to its key
+    """
+    if not hasattr(game, 'encode'):
+        return game.hash
+    if not hasattr(game, 'instance'):
+        return game.encode
+    instance, encode = game.instance, game.encode
+
+    def key(state):
+        return instance(state), encode(state)
+    return key
+
+
+class GameProxy(object):
+
+    """
+    A proxy of a game, which passes everything through to the game unless overridden.
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+    def __getattr__(self, name):
+        if name == 'game':          # not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.game, name)
+
+
+class InstrumentedGame(GameProxy):
+
+    """
+    A proxy of a game which times its methods called by a solver into a SolverStats.
+    """
+
+    timed = ('hash', 'encode', 'actionDomain', 'step', 'upperBound')
+
+    def __init__(self, game, stats):
+        """
+        Constructor
+
+        game: the game object to time
+        stats: the SolverStats to record into
+        """
+        super(InstrumentedGame, self).__init__(game)
+        for name in self.timed:
+            if hasattr(game, name):
+                setattr(self, name, stats.timer(name, getattr(game, name)))
+
+
+class TrackedGame(GameProxy):
+
+    """
+    A proxy of a game which records into a DependencyTracker the edges from every state to
+    its next states, and the parameters of the game which every state's actions and steps 
+    depend on, by the game's dependencies(). It hides the game's upperBound(), since the 
+    subproblems pruned by the bounds would not be recorded.
+    """
+
+    def __init__(self, game, tracker):
+        """
+        Constructor
+
+        game: the game object to track
+        tracker: the DependencyTracker to record into
+        """
+        super(TrackedGame, self).__init__(game)
+        self.tracker = tracker
+
+    def __getattr__(self, name):
+        if name == 'upperBound':
+            raise AttributeError(name)
+        return super(TrackedGame, self).__getattr__(name)
+
+    def actionDomain(self, state):
+        self.tracker.use(state, None)
+        return self.game.actionDomain(state)
+
+    def step(self, state, action):
+        result = self.game.step(state, action)
+        self.tracker.use(state, action)
+        self.tracker.link(state, result[0] if self.tracker.stochastic else [result[0]])
+        return result
+
+
+def unwrap(game):
+    """
+    return: the game itself, out of the proxies timing or tracking it
+    """
+    while isinstance(game, GameProxy):
+        game = game.game
+    return game
+
+
+class DependencyTracker(object):
+
+    """
+    Records which cached subproblems depend on which parameters of the game, and on which
+    other subproblems, so that after some parameters are changed in place, only the entries
+    depending on them, directly or through their next states, are invalidated and solved 
+    again. The game tells the parameters by dependencies(state, action), which returns the
+    names of the parameters, or (name, index) of an element of an array parameter, read by
+    step(state, action), or by actionDomain(state) and the key of the state if the action 
+    is None. A game without it makes every change invalidate the whole cache.
+    """
+
+    def __init__(self):
+        self.solver = None
+        self.game = None        # the game before wrapped
+        self.stochastic = False # whether the next states of step() are a list
+        self.key = None         # the key function of the cache
+        self.parents = collections.defaultdict(set)     # key: the keys stepping into it
+        self.users = collections.defaultdict(set)       # parameter: the keys reading it
+        self.reuse = {}         # the reuse of the cache by the last resolve()
+
+    def attach(self, solver):
+        """
+        Tracks a solver, which records the dependencies of the subproblems solved from then
+        on, so the cache should be empty.
+
+        solver: the DeterministicSolver or StochasticSolver
+        return: the tracker
+        """
+        self.solver = solver
+        self.game = solver.game
+        self.stochastic = solver.stochastic
+        self.key = keyFunction(unwrap(solver.game))
+        solver.game = TrackedGame(solver.game, self)
+        solver.key = keyFunction(solver.game)
+        solver.tracker = self
+        return self
+
+    def detach(self):
+        """
+        Removes the tracking from the solver, forgetting the dependencies.
+        """
+        self.solver.game = self.game
+        self.solver.key = keyFunction(self.game)
+        self.solver.tracker = None
+        self.solver = None
+        self.parents.clear()
+        self.users.clear()
+
+    def use(self, state, action):
+        """
+        Records the parameters read by an action of a state, or by its action domain.
+        """
+        dependencies = getattr(self.game, 'dependencies', None)
+        if dependencies is not None:
+            key = self.key(state)
+            for parameter in dependencies(state, action):
+                self.users[parameter].add(key)
+
+    def link(self, state, nextStates):
+        """
+        Records the edges from a state to its next states.
+        """
+        key = self.key(state)
+        for nextState in nextStates:
+            self.parents[self.key(nextState)].add(key)
+
+    def invalidate(self, changed):
+        """
+        Deletes the cache entries depending on the changed parameters, and all the entries
+        depending on them in turn.
+
+        changed: the parameters changed, a name changes all its elements
+        return: the number of the cache entries deleted
+        """
+        cache = self.solver.cache
+        if not hasattr(unwrap(self.game), 'dependencies'):
+            deleted = len(cache)
+            for key in list(cache.keys()):
+                del cache[key]
+            return deleted
+
+        changed = set(changed)
+        names = set(p for p in changed if not isinstance(p, tuple))    # changed entirely
+        touched = names | set(p[0] for p in changed if isinstance(p, tuple))
+        pending = set()
+        for parameter, keys in self.users.items():
+            if isinstance(parameter, tuple):
+                affected = parameter in changed or parameter[0] in names
+            else:
+                affected = parameter in touched
+            if affected:
+                pending.update(keys)
+
+        deleted, seen = 0, set(pending)
+        while pending:
+            key = pending.pop()
+            try:
+                del cache[key]
+                deleted += 1
+            except KeyError:        # a terminal or an evicted subproblem
+                pass
+            for parent in self.parents.get(key, ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    pending.add(parent)
+        return deleted
+
+
+class SolverStats(object):
+
     """
-    
-    def __init__(self, game):
+    The instrumentation of a solver: the cache hits and misses, the time spent in every 
+    method of the game and in the solver's own bookkeeping, the histograms of the depths of
+    the subproblems visited and of the numbers of actions of the subproblems expanded, and
+    the subproblems solved per second. Attaching it wraps the game in an InstrumentedGame
+    and the solver's entry and recursive methods, so a solver without stats runs untouched.
+    """
+
+    def __init__(self, callback=None, interval=100000):
+        """
+        Constructor
+
+        callback: called with the stats after every top-level solve, and every interval
+                  subproblems expanded during one
+        interval: the number of subproblems expanded between the callbacks
+        """
+        self.callback = callback
+        self.interval = interval
+        self.solver = None
+        self.game = None        # the game before wrapped
+        self.calls = collections.Counter()      # method name: calls
+        self.seconds = collections.Counter()    # method name: seconds
+        self.depths = collections.Counter()     # depth: subproblems visited
+        self.branching = collections.Counter()  # number of actions: subproblems expanded
+        self.solves = 0         # records the top-level solves
+        self.elapsed = 0.       # records the seconds in the top-level solves
+        self.depth = 0          # the depth of the recursion now
+        self.active = 0         # the nested calls of solve() now
+
+    def timer(self, name, method):
+        """
+        Wraps a method of the game to time its calls.
+
+        name: the name to record the method by
+        method: the method
+        return: the wrapped method
+        """
+        @functools.wraps(method)
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                self.seconds[name] += time.perf_counter() - start
+                self.calls[name] += 1
+
+        if name != 'actionDomain':
+            return timed
+
+        @functools.wraps(method)
+        def branching(state):
+            actions = timed(state)
+            self.branching[len(actions)] += 1
+            if self.callback is not None and self.calls[name] % self.interval == 0:
+                self.callback(self)
+            return actions
+        return branching
+
+    def attach(self, solver):
+        """
+        Instruments a solver, which records into these stats from then on.
+
+        solver: the DeterministicSolver or StochasticSolver
+        return: the stats
+        """
+        self.solver = solver
+        self.game = solver.game
+        solver.game = InstrumentedGame(solver.game, self)
+        solver.key = keyFunction(solver.game)
+        solver.stats = self
+
+        bounded = isinstance(solver, DeterministicSolver) and hasattr(self.game, 'upperBound')
+        if not solver.iterative:                # the depth of the recursive calls
+            recursive = 'solveBounded' if bounded else 'solve'
+            setattr(solver, recursive, self._nested(getattr(solver, recursive)))
+        else:                                   # the depth of the stack of frames
+            entering = '_enterBounded' if bounded else '_enter'
+            setattr(solver, entering, self._stacked(getattr(solver, entering)))
+        solver.solve = self._timed(solver.solve)
+        return self
+
+    def detach(self):
+        """
+        Removes the instrumentation from the solver, keeping the stats recorded.
+        """
+        solver = self.solver
+        for name in ('solve', 'solveBounded', '_enter', '_enterBounded'):
+            solver.__dict__.pop(name, None)
+        solver.game = self.game
+        solver.key = keyFunction(self.game)
+        solver.stats = None
+        self.solver = None
+
+    def _timed(self, solve):
+        """
+        Wraps the solver's solve() to time the top-level solves.
+        """
+        @functools.wraps(solve)
+        def timed(state):
+            self.active += 1
+            start = time.perf_counter()
+            try:
+                return solve(state)
+            finally:
+                self.active -= 1
+                if self.active == 0:
+                    self.elapsed += time.perf_counter() - start
+                    self.solves += 1
+                    if self.callback is not None:
+                        self.callback(self)
+        return timed
+
+    def _nested(self, method):
+        """
+        Wraps a recursive method to record the depth of every call.
+        """
+        @functools.wraps(method)
+        def nested(state, *args):
+            self.depth += 1
+            self.depths[self.depth] += 1
+            try:
+                return method(state, *args)
+            finally:
+                self.depth -= 1
+        return nested
+
+    def _stacked(self, method):
+        """
+        Wraps the visit of an iterative solve to record the depth of the stack.
+        """
+        @functools.wraps(method)
+        def stacked(state, *args):
+            self.depths[len(args[-1]) + 1] += 1
+            return method(state, *args)
+        return stacked
+
+    def report(self):
+        """
+        Summarizes the stats.
+
+        return: a dict of the stats, which is serializable as JSON
+        """
+        solver = self.solver
+        game = sum(self.seconds.values())
+        lookups = solver.counter if solver is not None else 0
+        misses = solver.cachedCounter if solver is not None else 0
+        report = {
+            'solves': self.solves,
+            'seconds': self.elapsed,
+            'lookups': lookups,
+            'hits': lookups - misses,
+            'misses': misses,
+            'hitRate': (lookups - misses) / float(lookups) if lookups else 0.,
+            'subproblemsPerSecond': misses / self.elapsed if self.elapsed else 0.,
+            'gameSeconds': dict(self.seconds),
+            'gameCalls': dict(self.calls),
+            'solverSeconds': max(self.elapsed - game, 0.),
+            'limitedBy': 'game' if game > self.elapsed - game else 'solver',
+            'depths': {str(depth): count for depth, count in sorted(self.depths.items())},
+            'branching': {str(width): count for width, count in sorted(self.branching.items())},
+        }
+        if solver is not None and hasattr(solver, 'prunedCounter'):
+            report['pruned'] = solver.prunedCounter
+        if solver is not None and hasattr(solver.cache, 'stats'):
+            report['cache'] = solver.cache.stats()
+        if solver is not None and solver.tracker is not None:
+            report['reuse'] = solver.tracker.reuse
+        return report
+
+    def toJson(self, path=None):
+        """
+        Exports the report as JSON.
+
+        path: the file to write, None to only return the JSON string
+        return: the JSON string
+        """
+        text = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+
+class Solver(object):
+
+    """
+    The common parts of the deterministic and the stochastic solvers.
+    """
+
+    stochastic = False      # whether step() gives the next states with their probabilities
+
+    def __init__(self, game, iterative=False, cache=None, stats=None):
         """
         Constructor
         
         game: the game object modelling the problem to be solved.
+        iterative: solve with an explicit stack instead of recursive calls
+        cache: the cache object, by default chosen by makeCache()
+        stats: a SolverStats to instrument the solver, None for no overhead
         """
-        self.cache = {}         # for checking overlapping subproblems
+        self.cache = makeCache(game) if cache is None else cache    # for overlapping
+        self.key = keyFunction(game)    # hash or encode the state for the cache
         self.game = game        # solve one game for each solver
         self.counter = 0        # records the complexity without cache
         self.cachedCounter = 0  # records the complexity with cache
+        self.iterative = iterative  # not limited by the recursion depth
+        self.stats = None           # the SolverStats attached
+        self.tracker = None         # the DependencyTracker attached
+        self.searches = {}          # the stacks of the suspended anytime solves, by root key
+        if stats is not None:
+            stats.attach(self)
+
+    def options(self):
+        """
+        return: the keyword arguments besides the game to construct a solver like this one,
+                e.g. in the worker processes of solveMany()
+        """
+        return {'iterative': self.iterative}
+
+    def fingerprint(self):
+        """
+        Identifies the game and its parameters, by the game's fingerprint() if implemented, 
+        as well as how the states are keyed. The parameters of most games are only set by 
+        reset(), so the game must be reset before.
+
+        return: the fingerprint string
+        """
+        game = unwrap(self.game)
+        fingerprint = getattr(game, 'fingerprint', lambda: '')
+        try:
+            parameters = fingerprint()
+        except (TypeError, AttributeError) as error:
+            raise ValueError('the %s has no parameters to identify, reset() the game before '
+                             'saving or loading a policy store (%s)'
+                             % (type(game).__name__, error)) from error
+        return '%s:%s:%s' % (type(game).__name__, self.key.__name__, parameters)
+
+    def save(self, path):
+        """
+        Saves the solved cache to a PolicyStore file.
+
+        path: the file to write
+        """
+        PolicyStore.save(path, self.cache, self.fingerprint())
+
+    def load(self, path):
+        """
+        Memory-maps a PolicyStore file saved for the same game and parameters, which answers 
+        the solved subproblems from then on. The game must be reset to the parameters first.
+
+        path: the file saved by save()
+        """
+        self.cache = PolicyStore(path, self.fingerprint(), self.cache)
+
+    def track(self):
+        """
+        Starts recording the dependencies of the subproblems solved, for resolve().
+
+        return: the DependencyTracker attached
+        """
+        return self.tracker or DependencyTracker().attach(self)
+
+    def resolve(self, state, changed):
+        """
+        Solves again after some parameters of the game are changed in place, reusing the 
+        cache entries which do not depend on them. The solver must be tracked by track() 
+        since its cache was empty. The reuse of the cache is recorded in tracker.reuse.
+
+        state: the initial state of the game
+        changed: the parameters changed, e.g. 'penalty_subst', or ('values', 3)
+        return: the accumulated utility and the optimal action
+        """
+        if self.tracker is None:
+            raise ValueError('the solver is not tracked, call track() before solving')
+        if hasattr(self, 'bounds'):
+            self.bounds.clear()
+        self.searches.clear()
+        entries = len(self.cache)
+        invalidated = self.tracker.invalidate(changed)
+        solved = self.cachedCounter
+        result = self.solve(state)
+        self.tracker.reuse = {
+            'entries': entries,
+            'invalidated': invalidated,
+            'reused': entries - invalidated,
+            'reuseRate': (entries - invalidated) / float(entries) if entries else 0.,
+            'recomputed': self.cachedCounter - solved,
+        }
+        return result
+
+    def policy(self):
+        """
+        return: the compact Policy of the optimal actions solved so far
+        """
+        return Policy(self)
+
+    def solveAnytime(self, state, deadline=None, budget=None):
+        """
+        Solves with an explicit stack like solveIterative(), but suspends the search when the
+        deadline or the budget runs out, and answers the best found so far. Calling again
+        with the same state resumes the search where it stopped, so repeated calls finish
+        the same solve as solve() in the end. The subproblems finished before suspending are
+        in the cache as usual.
+
+        state: feed in the initial state of the game
+        deadline: the time.monotonic() to suspend by, None for no deadline
+        budget: the most subproblems to expand in this call, None for no budget
+        return: the optimal action, the utility, and whether they are proven optimal; if not
+                proven, the best action and utility found so far, which may be None and -inf
+                if no action has been solved yet
+        """
+        stateKey = self.key(state)
+        stack = self.searches.pop(stateKey, None)
+        result = None
+        if stack is None:
+            stack = []
+            result = self._start(state, stack)
+
+        limit = None if budget is None else self.cachedCounter + budget
+        def stop():
+            return ((limit is not None and self.cachedCounter >= limit)
+                    or (deadline is not None and time.monotonic() >= deadline))
+
+        if stack:
+            result = self._resume(stack, result, stop)
+        if result is not None:
+            return result[0], result[1], True
+        self.searches[stateKey] = stack
+        return self._incumbent(stack) + (False,)
+
+    async def solveAsync(self, state, interval=0.01, deadline=None, budget=None):
+        """
+        Solves by solveAnytime() in slices of the interval, handing the control back to the
+        event loop between the slices. Cancelling the task suspends the search at the end of
+        a slice, and a later call with the same state resumes it.
+
+        state: feed in the initial state of the game
+        interval: the seconds of every slice
+        deadline: the time.monotonic() to give up by, None for no deadline
+        budget: the most subproblems to expand in all, None for no budget
+        return: the optimal action, the utility, and whether they are proven optimal
+        """
+        import asyncio          # only imported by the services using it, for the startup
+        limit = None if budget is None else self.cachedCounter + budget
+        while True:
+            end = time.monotonic() + interval
+            if deadline is not None:
+                end = min(end, deadline)
+            left = None if limit is None else max(limit - self.cachedCounter, 0)
+            optimal, utility, proven = self.solveAnytime(state, end, left)
+            if (proven or left == 0
+                    or (deadline is not None and time.monotonic() >= deadline)):
+                return optimal, utility, proven
+            await asyncio.sleep(0)
+
+    def solveMany(self, states, workers=None, merge=False, shared=None, alphas=None, 
+                  owners=None, incumbent=None):
+        """
+        Solves many initial states on a pool of worker processes. Every worker keeps its own
+        cache across the states it solves, starting from the same PolicyStore if loaded.
+        With the alphas, a DeterministicSolver of a game with upperBound() only solves the
+        states which can beat their alpha, the upper bounds of the others are kept in 
+        self.bounds and they are not yielded.
+
+        states: the initial states of the game
+        workers: the number of processes, by default the number of CPUs, 1 to solve the 
+                 states in this process with this solver's cache
+        merge: whether to merge the workers' caches and counters into this solver at the 
+               end, so the later solves start warm
+        shared: a SharedTable through which the workers share their solved subproblems
+        alphas: the utilities to beat of the states, None to solve all of them exactly
+        owners: the worker of every state, in the order it solves them, below the workers
+                and the number of states; None to solve them by any worker in turn
+        incumbent: the Incumbent which the alphas are relative to, raised by the states
+                   solved, or None
+        return: a generator of (state, optimal, utility) in the order they are solved
+        """
+        states = list(states)
+        alphas = [None] * len(states) if alphas is None else list(alphas)
+        workers = min(workers or os.cpu_count(), len(states))
+        if workers <= 1:
+            for state, alpha in zip(states, alphas):
+                if alpha is None:
+                    optimal, utility = self.solve(state)
+                else:
+                    if incumbent is not None:
+                        optimal, utility, exact = incumbent.solveAbove(self, state, alpha)
+                    else:
+                        optimal, utility, exact = self.solveAbove(state, alpha)
+                    if not exact:
+                        continue
+                yield state, optimal, utility
+            return
+
+        store = self.cache.path if isinstance(self.cache, PolicyStore) else None
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        tasks = [context.Queue() for _ in range(workers if owners is not None else 1)]
+        for index, (state, alpha) in enumerate(zip(states, alphas)):
+            tasks[0 if owners is None else owners[index]].put((index, state, alpha))
+        for worker in range(workers):
+            tasks[worker % len(tasks)].put(None)        # signals a worker to finish
+
+        processes = [context.Process(target=solveWorker, args=(
+            type(self), unwrap(self.game), self.options(), store, tasks[worker % len(tasks)],
+            results, merge, shared, incumbent)) for worker in range(workers)]
+        for process in processes:
+            process.start()
+
+        try:
+            running = workers
+            while running:
+                try:
+                    message = results.get(timeout=1)
+                except queue.Empty:
+                    if any(process.exitcode for process in processes):
+                        raise RuntimeError('a solver worker exited unexpectedly')
+                    continue
+
+                if message[0] == 'solved':
+                    index, optimal, utility = message[1:]
+                    yield states[index], optimal, utility
+                elif message[0] == 'bounded':
+                    index, upper = message[1:]
+                    key = self.key(states[index])
+                    self.bounds[key] = min(upper, self.bounds.get(key, np.inf))
+                elif message[0] == 'done':
+                    counter, cachedCounter, items = message[1:]
+                    self.counter += counter
+                    self.cachedCounter += cachedCounter
+                    for key, value in items:
+                        self.cache[key] = value
+                    running -= 1
+                else:
+                    raise RuntimeError('a solver worker failed:\n' + message[1])
+
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+
+class DeterministicSolver(Solver):
+
+    """
+    The generic solver for deterministic dynamic programming problem.
+    If the game implements upperBound(state), an admissible bound on the utility still to
+    be gained from a state, the solver prunes the actions which cannot beat the best found
+    so far (branch and bound), and tries the actions of the best bounds first.
+    """
+
+    def __init__(self, game, iterative=False, cache=None, stats=None):
+        """
+        Constructor
+
+        game: the game object modelling the problem to be solved.
+        iterative: solve with an explicit stack instead of recursive calls
+        cache: the cache object, by default chosen by makeCache()
+        stats: a SolverStats to instrument the solver, None for no overhead
+        """
+        self.bounds = {}        # upper bounds of the pruned subproblems, not exactly solved
+        self.prunedCounter = 0  # records how many subproblems are pruned by the bounds
+        super(DeterministicSolver, self).__init__(game, iterative, cache, stats)
 
     def solve(self, state):
         """
@@ -27,8 +1847,15 @@ class DeterministicSolver(object):
         state: feed in the initial state of the game
         return: the accumulated utility and the optimal action
         """
+        if hasattr(self.game, 'upperBound'):
+            if self.iterative:
+                return self.solveBoundedIterative(state)[:2]
+            return self.solveBounded(state)[:2]
+        if self.iterative:
+            return self.solveIterative(state)
+
         self.counter += 1                       # record how many subproblems
-        stateKey = self.game.hash(state)        # hash the state to check overlapping
+        stateKey = self.key(state)              # hash the state to check overlapping
         if stateKey in self.cache:              # if subproblem is overlapped
             return self.cache[stateKey][1:]     # return solved subproblem immediately
         
@@ -37,31 +1864,428 @@ class DeterministicSolver(object):
         if len(actionSet) == 0:     # terminal condition
             return None, 0          # return recursive call at terminal
 
-        maxUtility = -99999     # maximum utility (with the optimal path)
+        maxUtility = -np.inf    # maximum utility (with the optimal path)
         optimal = None          # optimal action
         for action in actionSet:
             nextState, reward = self.game.step(state, action)
             terminal, utility = self.solve(nextState)   # solve the small subproblem
             total = reward + utility
-            if utility > maxUtility:    # test which action is the best
+            if total > maxUtility:      # test which action is the best
                 maxUtility = total
                 optimal = action
 
         self.cache[stateKey] = state, optimal, maxUtility   # cache the solution
         return optimal, maxUtility  # return optimal action and max utility
+
+    def solveIterative(self, state):
+        """
+        Solves the DP problem with an explicit stack of frames in place of recursive calls, 
+        so a deep state space is bounded by the memory rather than the recursion limit.
+        It visits the subproblems in the same order as solve(), and fills the same cache.
+
+        state: feed in the initial state of the game
+        return: the accumulated utility and the optimal action
+        """
+        stack = []      # frames: [state, key, actions, next index, action, reward, optimal, max]
+        result = self._enter(state, stack)
+        return self._unwind(stack, result)
+
+    def _unwind(self, stack, result, stop=None):
+        """
+        Runs the frames of solveIterative() until the stack is empty, or stop() is true.
+
+        stack: the stack of frames of the unsolved subproblems
+        result: the result of the subproblem just visited, None if a frame is pushed
+        stop: called after every step, to suspend the search when true
+        return: the result of the bottom frame, or None if suspended
+        """
+        while stack:
+            frame = stack[-1]
+            if result is not None:              # a subproblem of the frame is just solved
+                total = frame[5] + result[1]
+                if total > frame[7]:            # test which action is the best
+                    frame[7] = total
+                    frame[6] = frame[4]
+                result = None
+            if stop is not None and stop():
+                return None
+
+            if frame[3] < len(frame[2]):        # step forward with the next action
+                action = frame[2][frame[3]]
+                frame[3] += 1
+                frame[4] = action
+                nextState, frame[5] = self.game.step(frame[0], action)
+                result = self._enter(nextState, stack)
+            else:                               # all actions tried, cache the solution
+                stack.pop()
+                self.cache[frame[1]] = frame[0], frame[6], frame[7]
+                result = frame[6], frame[7]
+
+        return result
+
+    def solveBounded(self, state, alpha=-np.inf):
+        """
+        Solves the DP problem by branch and bound, with the game's upperBound(). A subproblem
+        only needs to be solved exactly if it can score more than alpha, otherwise it may 
+        return an upper bound of no more than alpha. The exact solutions are cached as usual,
+        the upper bounds are kept apart in self.bounds, so the cache holds only exact ones.
+        The utility is the same as without the bounds, the optimal action of the ties may be
+        another one as the actions are tried in the order of their bounds.
+
+        state: feed in the initial state of the game
+        alpha: the utility to beat, from the best of the parent subproblems so far
+        return: the optimal action, the utility, and whether it is exact or an upper bound
+        """
+        self.counter += 1
+        stateKey = self.key(state)
+        if stateKey in self.cache:
+            return self.cache[stateKey][1:] + (True,)
+        if self.bounds.get(stateKey, np.inf) <= alpha:      # pruned before, still can't win
+            return None, self.bounds[stateKey], False
+
+        self.cachedCounter += 1
+        actionSet = self.game.actionDomain(state)
+        if len(actionSet) == 0:
+            return None, 0, True
+
+        maxUtility = -np.inf    # the best exact utility
+        optimal = None
+        upper = -np.inf         # the best upper bound of the pruned actions
+        children = self._children(state, actionSet)
+        for index, (bound, action, nextState, reward) in enumerate(children):
+            threshold = max(alpha, maxUtility)
+            if bound <= threshold:          # so are the rest, in the order of the bounds
+                self.prunedCounter += len(children) - index
+                upper = max(upper, bound)
+                break
+            _, utility, exact = self.solveBounded(nextState, threshold - reward)
+            total = reward + utility
+            if not exact:
+                upper = max(upper, total)
+            elif total > maxUtility:
+                maxUtility = total
+                optimal = action
+
+        return self._settle(state, stateKey, optimal, maxUtility, upper)
+
+    def solveBoundedIterative(self, state, alpha=-np.inf):
+        """
+        Solves the DP problem by branch and bound like solveBounded(), with an explicit stack
+        of frames like solveIterative().
+
+        state: feed in the initial state of the game
+        alpha: the utility to beat
+        return: the optimal action, the utility, and whether it is exact
+        """
+        stack = []      # frames: [state, key, children, next index, alpha, action, reward,
+                        #          optimal, max, upper]
+        result = self._enterBounded(state, alpha, stack)
+        return self._unwindBounded(stack, result)
+
+    def _unwindBounded(self, stack, result, stop=None):
+        """
+        Runs the frames of solveBoundedIterative() until the stack is empty, or stop() is
+        true.
+
+        stack: the stack of frames of the unsolved subproblems
+        result: the result of the subproblem just visited, None if a frame is pushed
+        stop: called after every step, to suspend the search when true
+        return: the result of the bottom frame, or None if suspended
+        """
+        while stack:
+            frame = stack[-1]
+            if result is not None:              # a subproblem of the frame is just solved
+                total = frame[6] + result[1]
+                if not result[2]:
+                    frame[9] = max(frame[9], total)
+                elif total > frame[8]:
+                    frame[8] = total
+                    frame[7] = frame[5]
+                result = None
+            if stop is not None and stop():
+                return None
+
+            threshold = max(frame[4], frame[8])
+            children = frame[2]
+            if frame[3] < len(children) and children[frame[3]][0] > threshold:
+                bound, frame[5], nextState, frame[6] = children[frame[3]]
+                frame[3] += 1
+                result = self._enterBounded(nextState, threshold - frame[6], stack)
+            else:                               # all actions tried or pruned
+                if frame[3] < len(children):
+                    self.prunedCounter += len(children) - frame[3]
+                    frame[9] = max(frame[9], children[frame[3]][0])
+                stack.pop()
+                result = self._settle(frame[0], frame[1], frame[7], frame[8], frame[9])
+
+        return result
+
+    def _enterBounded(self, state, alpha, stack):
+        """
+        Visits a subproblem for solveBoundedIterative(), pushes a frame if it needs solving.
+
+        state: a state of the subproblem
+        alpha: the utility to beat
+        stack: the stack of frames of the unsolved subproblems
+        return: the result like solveBounded() if solved or pruned already, otherwise None
+        """
+        self.counter += 1
+        stateKey = self.key(state)
+        if stateKey in self.cache:
+            return self.cache[stateKey][1:] + (True,)
+        if self.bounds.get(stateKey, np.inf) <= alpha:
+            return None, self.bounds[stateKey], False
+
+        self.cachedCounter += 1
+        actionSet = self.game.actionDomain(state)
+        if len(actionSet) == 0:
+            return None, 0, True
+
+        children = self._children(state, actionSet)
+        stack.append([state, stateKey, children, 0, alpha, None, 0, None, -np.inf, -np.inf])
+        return None
+
+    def _start(self, state, stack):
+        """
+        Visits the initial state of solveAnytime(), with the bounds if the game has them.
+
+        return: the result if solved already, otherwise None with a frame pushed
+        """
+        if hasattr(self.game, 'upperBound'):
+            return self._enterBounded(state, -np.inf, stack)
+        return self._enter(state, stack)
+
+    def _resume(self, stack, result, stop):
+        """
+        Runs the frames of solveAnytime() until the stack is empty, or stop() is true.
+        """
+        if hasattr(self.game, 'upperBound'):
+            return self._unwindBounded(stack, result, stop)
+        return self._unwind(stack, result, stop)
+
+    def _incumbent(self, stack):
+        """
+        Finds the best path of a suspended search: every frame on the stack is reached from
+        the initial state by the rewards of the actions being tried, and its best action 
+        solved exactly so far completes a path.
+
+        stack: the stack of frames of the suspended search
+        return: the first action of the best path, and its utility
+        """
+        action, reward, optimal, best = (5, 6, 7, 8) if hasattr(self.game, 'upperBound') \
+            else (4, 5, 6, 7)
+        first, utility = stack[0][optimal], stack[0][best]
+        prefix = 0
+        for frame, child in zip(stack, stack[1:]):
+            prefix += frame[reward]
+            if prefix + child[best] > utility:
+                first, utility = stack[0][action], prefix + child[best]
+        return first, utility
+
+    def _children(self, state, actionSet):
+        """
+        Steps forward with every action and bounds the utility of each, by the exact utility
+        if cached, otherwise by the reward plus the game's upperBound() of the next state.
+
+        state: a state of the subproblem
+        actionSet: the actions allowed in the state
+        return: a list of (bound, action, next state, reward), the best bound first
+        """
+        children = []
+        for action in actionSet:
+            nextState, reward = self.game.step(state, action)
+            nextKey = self.key(nextState)
+            if nextKey in self.cache:
+                bound = self.cache[nextKey][2]
+            else:
+                bound = min(self.game.upperBound(nextState), self.bounds.get(nextKey, np.inf))
+            children.append((reward + bound, action, nextState, reward))
+        children.sort(key=lambda child: -child[0])      # stable, so ties keep their order
+        return children
+
+    def _settle(self, state, stateKey, optimal, maxUtility, upper):
+        """
+        Concludes a subproblem of the branch and bound. It is solved exactly if none of the
+        pruned actions may beat the best exact utility, otherwise only bounded.
+
+        state: the state of the subproblem
+        stateKey: its key in the cache
+        optimal: the best action solved exactly
+        maxUtility: its utility
+        upper: the best upper bound of the pruned actions
+        return: the optimal action, the utility, and whether it is exact
+        """
+        if upper <= maxUtility:
+            self.bounds.pop(stateKey, None)
+            self.cache[stateKey] = state, optimal, maxUtility
+            return optimal, maxUtility, True
+
+        upper = min(upper, self.bounds.get(stateKey, np.inf))  # the tighter of the bounds
+        self.bounds[stateKey] = upper
+        return None, upper, False
+
+    def solveAbove(self, state, alpha):
+        """
+        Solves a subproblem by the branch and bound, only exactly if it can score more than
+        alpha, recursively or with an explicit stack as the solver is constructed.
+
+        state: a state of the game
+        alpha: the utility to beat
+        return: the optimal action, the utility, and whether it is exact or an upper bound
+        """
+        if self.iterative:
+            return self.solveBoundedIterative(state, alpha)
+        return self.solveBounded(state, alpha)
+
+    def solveParallel(self, state, workers=None, capacity=2 ** 20):
+        """
+        Solves the DP problem on many worker processes. The top levels of the action tree 
+        are expanded until there are 16 subproblems for every worker, which are solved by
+        solveMany() sharing their solved subproblems through a SharedTable, then the top 
+        levels are solved from the cache. The result is the same as solve(). Every worker 
+        owns the subproblems of whole subtrees of the top levels, see _owners(), as the
+        subproblems of the same subtree overlap the most. If the game has upperBound(), the
+        workers keep the pruning of the branch and bound: the utility of a path found by 
+        dive() is the Incumbent, raised by the paths the workers solve, and a subproblem of
+        the frontier only needs to beat it less the best reward leading to the subproblem.
+        The upper bounds of the pruned subproblems are shared too.
+
+        state: feed in the initial state of the game
+        workers: the number of processes, by default the number of CPUs
+        capacity: the number of slots of the SharedTable
+        return: the accumulated utility and the optimal action
+        """
+        workers = workers or os.cpu_count()
+        frontier, prefixes, lineages = self._frontier(state, 16 * workers)
+        owners = self._owners(lineages, workers)
+        incumbent, alphas = None, None
+        if hasattr(self.game, 'upperBound'):
+            alpha = self.dive(state)
+            alpha -= 1e-9 * max(1., abs(alpha))         # so the ties with it are solved
+            incumbent = Incumbent(alpha)
+            alphas = [alpha - prefix for prefix in prefixes]
+        shared = SharedTable(capacity)
+        try:
+            for subState, optimal, utility in self.solveMany(
+                    frontier, workers, shared=shared, alphas=alphas, owners=owners, 
+                    incumbent=incumbent):
+                self.cache[self.key(subState)] = subState, optimal, utility
+        finally:
+            shared.close()
+        if incumbent is None:
+            return self.solve(state)
+        return self.solveAbove(state, incumbent.value.value)[:2]
+
+    def dive(self, state):
+        """
+        Finds a path quickly for an incumbent of the branch and bound, by taking the action
+        of the best bound in every state, see _children().
+
+        state: the initial state of the game
+        return: the utility of the path
+        """
+        utility = 0
+        actionSet = self.game.actionDomain(state)
+        while len(actionSet) > 0:
+            bound, action, state, reward = self._children(state, actionSet)[0]
+            utility += reward
+            actionSet = self.game.actionDomain(state)
+        return utility
+
+    def frontier(self, state, size):
+        """
+        Expands the action tree level by level from a state, until a level has at least the
+        given number of distinct unsolved subproblems, or no more levels.
+
+        state: the initial state of the game
+        size: the number of subproblems wanted
+        return: the list of the subproblems' states at the last level expanded
+        """
+        return self._frontier(state, size)[0]
+
+    def _frontier(self, state, size):
+        """
+        Expands the frontier like frontier(), with the best reward leading to every state,
+        and the position of its ancestor in every level, from the one which leads to it by
+        the best reward.
+
+        return: the list of the states, the list of their rewards from the state, and the
+                list of the tuples of the positions of their ancestors and themselves
+        """
+        level, prefixes, lineages = [state], [0], [()]
+        while 0 < len(level) < size:
+            children = collections.OrderedDict()    # key: (child, best reward, lineage)
+            for parent, prefix, lineage in zip(level, prefixes, lineages):
+                for action in self.game.actionDomain(parent):
+                    child, reward = self.game.step(parent, action)
+                    key = self.key(child)
+                    if key not in self.cache and len(self.game.actionDomain(child)) > 0:
+                        if key not in children or children[key][1] < prefix + reward:
+                            children[key] = child, prefix + reward, lineage
+            if len(children) == 0:
+                break
+            level = [child for child, _, _ in children.values()]
+            prefixes = [prefix for _, prefix, _ in children.values()]
+            lineages = [lineage + (position,) 
+                        for position, (_, _, lineage) in enumerate(children.values())]
+        return level, prefixes, lineages
+
+    @staticmethod
+    def _owners(lineages, workers):
+        """
+        Assigns the subproblems of a frontier to the workers by their subtrees: the subtrees
+        of the shallowest level with at least a subtree for every worker are dealt out, the
+        largest first to the worker with the fewest subproblems so far.
+
+        lineages: the positions of the ancestors of the subproblems, see _frontier()
+        workers: the number of workers
+        return: the worker of every subproblem
+        """
+        depth = len(lineages[0]) if lineages else 0
+        groups = [0] * len(lineages)
+        for level in range(depth):
+            groups = [lineage[level] for lineage in lineages]
+            if len(set(groups)) >= workers:
+                break
+
+        counts = collections.Counter(groups)
+        loads = [0] * workers
+        owner = {}
+        for group, count in sorted(counts.items(), key=lambda item: -item[1]):
+            worker = loads.index(min(loads))
+            owner[group] = worker
+            loads[worker] += count
+        return [owner[group] for group in groups]
+
+    def _enter(self, state, stack):
+        """
+        Visits a subproblem for solveIterative(), pushes a frame if it needs to be solved.
+
+        state: a state of the subproblem
+        stack: the stack of frames of the unsolved subproblems
+        return: the optimal action and the utility if solved already, otherwise None
+        """
+        self.counter += 1
+        stateKey = self.key(state)
+        if stateKey in self.cache:
+            return self.cache[stateKey][1:]
+
+        self.cachedCounter += 1
+        actionSet = self.game.actionDomain(state)
+        if len(actionSet) == 0:
+            return None, 0
+
+        stack.append([state, stateKey, actionSet, 0, None, 0, None, -np.inf])
+        return None
     
     
-class StochasticSolver(object):
+class StochasticSolver(Solver):
 
     """
     The generic solver for stochastic dynamic programming problem.
     """
 
-    def __init__(self, game):
-        self.cache = {}         # for checking overlapping subproblems
-        self.game = game        # solve one game for each solver
-        self.counter = 0        # records the complexity without cache
-        self.cachedCounter = 0  # records the complexity with cache
+    stochastic = True
 
     def solve(self, state):
         
@@ -72,8 +2296,11 @@ class StochasticSolver(object):
         return: the accumulated expected utility and the optimal action
         """
 
+        if self.iterative:
+            return self.solveIterative(state)
+
         self.counter += 1                   # record how many subproblems
-        stateKey = self.game.hash(state)    # hash the state to check overlapping
+        stateKey = self.key(state)          # hash the state to check overlapping
         if stateKey in self.cache:          # if subproblem is overlapped
             return self.cache[stateKey][1:]     # return solved subproblem immediately
         
@@ -82,7 +2309,7 @@ class StochasticSolver(object):
         if len(actionSet) == 0:     # terminal condition
             return None, 0          # return recursive call at terminal
 
-        maxUtility = -99999         # maximum utility (with the optimal path)
+        maxUtility = -np.inf        # maximum utility (with the optimal path)
         optimal = None              # optimal action
         for action in actionSet:
             # step forward and output the state objects, probabilities and rewards for 
@@ -96,4 +2323,120 @@ class StochasticSolver(object):
                 optimal = action
 
         self.cache[stateKey] = state, optimal, maxUtility
-        return optimal, maxUtility 
\ No newline at end of file
+        return optimal, maxUtility 
+
+    def solveIterative(self, state):
+
+        """
+        Solves the DP problem with an explicit stack of frames in place of recursive calls, 
+        so a deep state space is bounded by the memory rather than the recursion limit.
+        It visits the subproblems in the same order as solve(), and fills the same cache.
+
+        state: feed in the initial state of the game
+        return: the accumulated expected utility and the optimal action
+        """
+
+        # frames: [state, key, actions, next index, action, next states, probs, rewards, 
+        #          utilities of the next states solved so far, optimal, max]
+        stack = []
+        result = self._enter(state, stack)
+        return self._unwind(stack, result)
+
+    def _unwind(self, stack, result, stop=None):
+
+        """
+        Runs the frames of solveIterative() until the stack is empty, or stop() is true.
+
+        stack: the stack of frames of the unsolved subproblems
+        result: the result of the subproblem just visited, None if a frame is pushed
+        stop: called after every step, to suspend the search when true
+        return: the result of the bottom frame, or None if suspended
+        """
+
+        while stack:
+            frame = stack[-1]
+            if result is not None:              # a next state of the frame is just solved
+                frame[8].append(result[1])
+                result = None
+            if stop is not None and stop():
+                return None
+
+            if frame[5] is not None:
+                if len(frame[8]) < len(frame[5]):   # solve the next possible state
+                    result = self._enter(frame[5][len(frame[8])], stack)
+                    continue
+
+                utilities = np.array(frame[8])
+                expectedValue = np.sum(frame[6] * (utilities + frame[7]))
+                if expectedValue > frame[10]:
+                    frame[10] = expectedValue
+                    frame[9] = frame[4]
+                frame[5] = None
+
+            if frame[3] < len(frame[2]):        # step forward with the next action
+                action = frame[2][frame[3]]
+                frame[3] += 1
+                frame[4] = action
+                frame[5], frame[6], frame[7] = self.game.step(frame[0], action)
+                frame[8] = []
+            else:                               # all actions tried, cache the solution
+                stack.pop()
+                self.cache[frame[1]] = frame[0], frame[9], frame[10]
+                result = frame[9], frame[10]
+
+        return result
+
+    def _enter(self, state, stack):
+
+        """
+        Visits a subproblem for solveIterative(), pushes a frame if it needs to be solved.
+
+        state: a state of the subproblem
+        stack: the stack of frames of the unsolved subproblems
+        return: the optimal action and the expected utility if solved, otherwise None
+        """
+
+        self.counter += 1
+        stateKey = self.key(state)
+        if stateKey in self.cache:
+            return self.cache[stateKey][1:]
+
+        self.cachedCounter += 1
+        actionSet = self.game.actionDomain(state)
+        if len(actionSet) == 0:
+            return None, 0
+
+        stack.append([state, stateKey, actionSet, 0, None, None, None, None, None, None, 
+                      -np.inf])
+        return None
+
+    def _start(self, state, stack):
+
+        """
+        Visits the initial state of solveAnytime().
+
+        return: the result if solved already, otherwise None with a frame pushed
+        """
+
+        return self._enter(state, stack)
+
+    def _resume(self, stack, result, stop):
+
+        """
+        Runs the frames of solveAnytime() until the stack is empty, or stop() is true.
+        """
+
+        return self._unwind(stack, result, stop)
+
+    def _incumbent(self, stack):
+
+        """
+        Finds the best of a suspended search. An expectation is only known when all the next
+        states are solved, so it is the best action of the initial state solved so far.
+
+        stack: the stack of frames of the suspended search
+        return: the best action and its expected utility
+        """
+
+        return stack[0][9], stack[0][10]
+
@@ -0,0 +1,115 @@
+"""
+inventory.py
+
+This demos how to solve an inventory control problem with the MDP solver. Every day the
+shop orders items to restock, then sells as many as the random demand, as far as in stock.
+The stock goes up and down forever, so the states cycle, and the future profits are
+discounted, which the recursive StochasticSolver cannot solve.
+"""
+
+import math
+import numpy as np
+
+class InventoryGame(object):
+
+    """
+    Define the game object for the inventory control problem.
+    Every game object should implement the reset(), hash(), actionDomain(), and step()
+    method, as well as oraganise its internal state as the state object.
+    The state is the number of items in stock at the start of a day.
+    """
+
+    def __init__(self):
+        self.price = 10.            # the revenue for selling an item
+        self.cost = 6.              # the cost for ordering an item
+        self.fixedCost = 8.         # the cost for placing an order of any size
+        self.holding = 1.           # the cost for holding an item in the shop for a day
+        self.capacity = None        # the max number of items in the shop
+        self.demands = None         # the probabilities of the demand of a day, 0..capacity
+
+    def reset(self, stock, capacity=20, demand=5.):
+
+        """
+        Reset the game to it's initial state, with the atrributes specific to the game.
+        Take the inventory problem as an examples:
+
+        stock:      the number of items in stock
+        capacity:   the max number of items in the shop
+        demand:     the mean of the Poisson demand of a day
+
+        return:     an initial state object, needs not care its implementation
+        """
+
+        self.capacity = capacity
+        self.demands = np.array([math.exp(-demand) * demand ** n / math.factorial(n)
+                                 for n in range(capacity + 1)])
+        return stock
+
+
+    def hash(self, state):
+
+        """
+        For checking overlapping subproblems, gives an unique hash value of a game state.
+
+        state:      the number of items in stock
+        return:     an unique hash value for the game state
+        """
+
+        return state
+
+
+    def actionDomain(self, state):
+
+        """
+        Given a game state, specify its allowed actions.
+
+        state:      the number of items in stock
+        return:     the numbers of items allowed to order, up to the capacity
+        """
+
+        return range(self.capacity - state + 1)
+
+
+    def step(self, state, action):
+
+        """
+        Given a game state, take a step forward with the specified action.
+
+        state:      the number of items in stock
+        action:     the number of items to order
+
+        return:     an array of all possible next states after taking the action,
+                    together with the assosiated probabilities and rewards.
+        """
+
+        stock = state + action
+        sales = np.arange(stock + 1)                    # the demand beyond the stock is lost
+        probs = self.demands[:stock + 1].copy()
+        probs[-1] = 1 - probs[:-1].sum()
+        cost = self.cost * action + (self.fixedCost if action > 0 else 0) + self.holding * stock
+        rewards = self.price * sales - cost
+        return stock - sales, probs, rewards
+
+
+if __name__ == '__main__':
+
+    from mdpsolver import MdpSolver
+
+    """
+    An example of a shop of 20 items, selling 5 a day on average, and discounting by 5% a day.
+    """
+    game = InventoryGame()                          # init the game object
+    solver = MdpSolver(game, discount=0.95)         # init the MDP solver with the game
+
+    state = game.reset(0, capacity=20, demand=5.)   # reset the game to the initial state
+    result = solver.solve(state)                    # solve from the initial state
+    print('The max utility is %f, converged in %d iterations'
+          % (result[1], len(solver.residuals)))
+    print('The number of items to order in every stock is:')
+    print([(stock, solver.solve(stock)[0]) for stock in range(game.capacity + 1)])
+
+    solver = MdpSolver(game, discount=0.95)         # or solve by policy iteration
+    solver.compile(state)                           # from the states reachable from the state
+    residuals = solver.policyIteration()
+    print('Policy iteration converged in %d iterations, the max utility is %f'
+          % (len(residuals), solver.solve(state)[1]))
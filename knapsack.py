@@ -7,6 +7,9 @@ of the weight capacity of the knapsack.
 """
 import numpy as np
 import hashlib
+import math
+import operator
+import fractions
 
 class KnapsackGame(object):
 
@@ -18,9 +21,15 @@ class KnapsackGame(object):
     
     def __init__(self):
         self.capacity = None    # remaining capacity in the knapsack
+        self.items = None       # an array of availability of the N items
         self.weights = None     # an array of weights of the N items
         self.values = None      # an array of values of the N items
         self.N = None           # number of items
+        self.radix = None       # place values of the item numbers in the state index
+        self.size = None        # number of distinct state indices
+        self.order = None       # (item, weight, value) of positive values, best ratio first
+        self.identity = None    # the 64-bit digest of the items, weights and values
+        self.put = None         # (total weight, weights list) to find the weights put
 
     def reset(self, capacity, items, weights, values):
 
@@ -37,9 +46,23 @@ class KnapsackGame(object):
         """
         
         self.capacity = capacity
+        self.items = items
         self.weights = weights
         self.values = values
         self.N = len(items)
+        self.radix = [1]
+        for n in items:
+            self.radix.append(self.radix[-1] * (int(n) + 1))
+        self.size = self.radix.pop()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.asarray(values, dtype=float) / weights
+        self.order = [(n, float(weights[n]), float(values[n]))
+                      for n in np.argsort(-ratios, kind='stable').tolist() if values[n] > 0]
+        digest = hashlib.sha1()
+        for array in (items, weights, values):
+            digest.update(np.asarray(array, dtype=float).tobytes())
+        self.identity = int.from_bytes(digest.digest()[:8], 'little')
+        self.put = (float(np.dot(items, weights)), np.asarray(weights, dtype=float).tolist())
         state = np.zeros(self.N + 1)
         state[ :self.N] = items  # items available
         state[-1] = capacity
@@ -58,6 +81,125 @@ class KnapsackGame(object):
         return hashlib.sha1(state).hexdigest()
 
 
+    def encode(self, state):
+
+        """
+        Optionally, encodes a game state into a bounded integer index, which lets the solver
+        cache in dense arrays instead of a dict of hash values. The item availability is
+        encoded in the mixed radix of the items, and the rest of the state is implied by the
+        instance() of the state.
+
+        state:      a state of the knapsack subproblem
+        return:     an integer index in [0, encodeSize())
+        """
+
+        items = state.tolist()              # the capacity is dropped by map() at the end
+        if self.size > 2 ** 53:             # too many states to be exact in floating point
+            items = map(int, items)
+        return int(sum(map(operator.mul, items, self.radix)))
+
+
+    def decode(self, index, instance=None):
+
+        """
+        Unpacks the encode() of game states back into the states, e.g. to write the solved
+        subproblems of a cache by their items and capacity.
+
+        index:      an index given by encode(), or an array of them
+        instance:   the instance() of the states, by default the capacity of the reset()
+        return:     the state, the items available and the remaining capacity, or an array
+                    of a state in every row
+        """
+
+        index = np.asarray(index)
+        items = [index // place % (int(n) + 1) for place, n in zip(self.radix, self.items)]
+        start = self.capacity if instance is None else instance[1]
+        capacity = start - self.put[0] + sum(map(operator.mul, items, self.put[1]))
+        return np.stack(items + [np.asarray(capacity, dtype=float)], axis=-1).astype(float)
+
+
+    def encodeSize(self):
+
+        """
+        return:     the number of distinct integer indices given by encode(), 0 before reset()
+        """
+
+        return 0 if self.size is None else self.size
+
+
+    def instance(self, state):
+
+        """
+        Optionally, tells the instance of a game state, so that a solver reused across the 
+        capacities and the resets caches the encode() of every instance apart. It is the
+        digest of the items, weights and values of the reset(), and the capacity the 
+        knapsack started with, which is the remaining capacity plus the weights put.
+
+        state:      a state of the knapsack subproblem
+        return:     the hashable instance of the state
+        """
+
+        items = state.tolist()
+        start = items[-1] + self.put[0] - sum(map(operator.mul, items, self.put[1]))
+        return self.identity, round(start, 9)
+
+
+    def upperBound(self, state):
+
+        """
+        Optionally, bounds the utility still to be gained from a game state, which lets the
+        solver prune the actions by branch and bound. The bound is the fractional relaxation,
+        filling the remaining capacity with the best value per weight first, and a fraction
+        of the last item that fits partly.
+
+        state:      a state of the knapsack subproblem
+        return:     an upper bound of the max utility from the state
+        """
+
+        items = state.tolist()
+        capacity = items[-1]
+        bound = 0.0
+        for n, weight, value in self.order:
+            available = items[n] * weight
+            if available <= capacity:
+                capacity -= available
+                bound += items[n] * value
+            else:
+                bound += value * capacity / weight
+                break
+        return bound
+
+
+    def dependencies(self, state, action):
+
+        """
+        Optionally, tells which parameters of the game a step reads, which lets the solver
+        re-solve only the affected subproblems when they are changed. The action domain 
+        compares all the weights, and the encoded state implies the capacity by them.
+
+        state:      a state of the knapsack subproblem
+        action:     the item number put into the knapsack, or None for the action domain
+        return:     the names of the parameters, or (name, index) of their elements
+        """
+
+        if action is None:
+            return ('weights',)
+        return (('values', int(action)),)
+
+
+    def fingerprint(self):
+
+        """
+        Optionally, identifies the parameters of the game, so that a saved policy store is
+        only reused for the same knapsack problem.
+
+        return:     a string of the capacity, the items, the weights and the values
+        """
+
+        return repr([float(self.capacity), np.asarray(self.items).tolist(), 
+                     np.asarray(self.weights).tolist(), np.asarray(self.values).tolist()])
+
+
     def actionDomain(self, state):
 
         """
@@ -88,6 +230,177 @@ class KnapsackGame(object):
         return state, self.values[action]               # value increased in the knapsack
 
 
+class KnapsackEngine(object):
+
+    """
+    The dedicated engine for the bounded knapsack problem of the KnapsackGame. Instead of the
+    availability of every item, a subproblem is only the remaining capacity: the weights are
+    scaled to integers, every item type is split into pieces of 1, 2, 4, ... items to be put
+    or not, and the max utility of every capacity is kept in a 1-D numpy table updated piece
+    by piece. The chosen items are recovered by splitting the pieces in halves and the
+    capacity where the halves score the best, like Hirschberg's alignment, in O(capacity)
+    memory and about twice the time of the table. Before the table, the pieces certainly put
+    or not by the bounds of the greedy solution are fixed, which leaves few pieces on random
+    problems. Items of no positive value are never put, where the KnapsackGame keeps putting
+    items while any fits, so the utilities agree when the values are not negative.
+    """
+
+    def __init__(self, maxScale=10 ** 6):
+        """
+        Constructor
+
+        maxScale: the largest scale of the weights to make them integers, the weights which
+                  need more, e.g. of many distinct denominators, are rejected by reset()
+        """
+        self.maxScale = maxScale
+        self.N = None           # number of items
+        self.scale = None       # the weights and the capacity are multiplied by the scale
+        self.capacity = None    # the scaled capacity
+        self.weights = None     # the scaled weights of the pieces
+        self.values = None      # the values of the pieces
+        self.item = None        # the item of the pieces
+        self.count = None       # the number of items of the pieces
+
+    def reset(self, capacity, items, weights, values):
+
+        """
+        Reset the engine to a knapsack problem, with the same parameters as KnapsackGame.
+
+        capacity:   the capacity of the knapsack
+        items:      an array storing the number of each item
+        weights:    an array storing the weight of each item
+        values:     an array storing the value of each item
+        """
+
+        items = np.asarray(items, dtype=np.int64)
+        weights = np.asarray(weights, dtype=float)
+        values = np.asarray(values, dtype=float)
+        self.N = len(items)
+
+        self.scale = 1              # the least common multiple of the denominators
+        for weight in np.unique(weights).tolist():
+            denominator = fractions.Fraction(weight).limit_denominator(self.maxScale).denominator
+            self.scale = self.scale * denominator // math.gcd(self.scale, denominator)
+            if self.scale > self.maxScale:      # the table would not fit, nor be exact
+                raise ValueError('the weights need a scale over maxScale=%d to be integers, '
+                                 'solve with the KnapsackGame instead' % self.maxScale)
+        self.capacity = int(np.floor(capacity * self.scale + 1e-9))
+        scaled = np.rint(weights * self.scale).astype(np.int64)
+
+        pieces = []                 # binary splitting: 1, 2, 4, ..., and the rest
+        for n in range(self.N):
+            if values[n] <= 0 or scaled[n] > self.capacity:
+                continue
+            remaining, size = int(items[n]), 1
+            while remaining > 0:
+                size = min(size, remaining)
+                pieces.append((n, size))
+                remaining -= size
+                size *= 2
+
+        pieces = np.array(pieces, dtype=np.int64).reshape(-1, 2)
+        self.item, self.count = pieces[:, 0], pieces[:, 1]
+        self.weights = scaled[self.item] * self.count
+        self.values = values[self.item] * self.count
+
+    def table(self, pieces, capacity):
+
+        """
+        Computes the max utility of every capacity with a set of pieces.
+
+        pieces:     the indices of the pieces
+        capacity:   the largest scaled capacity
+        return:     a float array of the max utilities of the capacities 0..capacity
+        """
+
+        table = np.zeros(capacity + 1)
+        buffer = np.empty(capacity + 1)             # no temporary arrays in the loop
+        reach = 0                                   # the table is flat beyond the reach
+        for weight, value in zip(self.weights[pieces].tolist(), self.values[pieces].tolist()):
+            if weight == 0:
+                table += value
+            elif weight <= capacity:
+                table[reach + 1:reach + weight + 1] = table[reach]
+                reach = min(reach + weight, capacity)
+                shifted = np.add(table[:reach + 1 - weight], value, out=buffer[:reach + 1 - weight])
+                np.maximum(table[weight:reach + 1], shifted, out=table[weight:reach + 1])
+        table[reach + 1:] = table[reach]
+        return table
+
+    def solve(self):
+
+        """
+        Solves the knapsack problem.
+
+        return:     the max utility, and an array of the number of each item chosen
+        """
+
+        taken, core = self.reduce()
+        capacity = self.capacity - int(self.weights[taken].sum())
+        utility = self.values[taken].sum() + self.table(core, capacity)[-1]
+        chosen = taken.tolist()
+        self._choose(core, capacity, chosen)
+        chosen = np.array(chosen, dtype=np.int64)
+        counts = np.bincount(self.item[chosen], weights=self.count[chosen], minlength=self.N)
+        return utility, counts.astype(np.int64)
+
+    def reduce(self):
+
+        """
+        Fixes the pieces which are put or not in every optimal solution, so that only the
+        rest, the core around the break piece of the greedy, is left to the table. A greedy
+        solution by value per weight gives the lower bound, and with the ratio r of the break
+        piece, sum(max(0, value - r * weight)) + r * capacity is an upper bound, which drops
+        by |value - r * weight| when a piece is forced the other way than its sign.
+
+        return:     an array of the pieces always put, and an array of the core pieces
+        """
+
+        pieces = np.argsort(-self.values / self.weights, kind='stable')
+        weights = self.weights[pieces]
+        room = self.capacity - np.cumsum(weights)
+        broken = int(np.searchsorted(-room, 0, side='right'))   # the first piece not fit
+        if broken == len(pieces):
+            return pieces, pieces[:0]                           # all pieces fit
+
+        lower, remaining = 0.0, self.capacity                   # the greedy solution
+        for piece in pieces.tolist():
+            if self.weights[piece] <= remaining:
+                remaining -= self.weights[piece]
+                lower += self.values[piece]
+
+        ratio = self.values[pieces[broken]] / weights[broken]
+        reduced = self.values[pieces] - ratio * weights
+        upper = np.maximum(reduced, 0).sum() + ratio * self.capacity
+        fixed = upper - np.abs(reduced) < lower - 1e-9 * max(1.0, abs(lower))
+        return pieces[fixed & (reduced > 0)], pieces[~fixed]
+
+    def _choose(self, pieces, capacity, chosen):
+
+        """
+        Recovers the chosen pieces, splitting them in halves and the capacity between them.
+
+        pieces:     the indices of the pieces
+        capacity:   the scaled capacity for the pieces
+        chosen:     the list to append the indices of the chosen pieces to
+        """
+
+        if len(pieces) == 1:
+            if self.weights[pieces[0]] <= capacity:     # pieces of no value are dropped
+                chosen.append(pieces[0])
+            return
+        if len(pieces) == 0:
+            return
+
+        half = len(pieces) // 2
+        first = self.table(pieces[:half], capacity)
+        total = first + self.table(pieces[half:], capacity)[::-1]
+        split = int(np.argmax(total))
+        del first, total
+        self._choose(pieces[:half], split, chosen)
+        self._choose(pieces[half:], capacity - split, chosen)
+
+
 if __name__ == '__main__':       
 
     from dpsolver import DeterministicSolver
@@ -108,5 +421,13 @@ if __name__ == '__main__':
     state = game.reset(10, items, weights, values)  # reset the game to the initial state
     result = solver.solve(state)                    # solve from the initial state
     print('The max utility is %f' % result[1])
-    print('The policy is:')
-    print(list(solver.cache.values()))
+    print('The optimal path is:')
+    policy = solver.policy()                        # the compact optimal actions
+    for state, action, reward in policy.path(game.reset(10, items, weights, values)):
+        print('    put item %d of value %.1f in the capacity of %.1f' % (action, reward,
+                                                                    state[-1]))
+
+    engine = KnapsackEngine()                       # or with the dedicated engine
+    engine.reset(10, items, weights, values)
+    utility, counts = engine.solve()
+    print('The max utility is %f, by the items %s' % (utility, counts))
@@ -0,0 +1,264 @@
+"""
+mdpsolver.py
+
+Solves the Markov decision processes of the games with the stochastic solver's interface by
+value iteration and policy iteration, which, unlike the recursive StochasticSolver, works on
+games whose states may cycle back, and discounts the future rewards.
+"""
+import numpy as np
+from dpsolver import keyFunction
+
+
+class MdpSolver(object):
+
+    """
+    The iterative solver for Markov decision processes. The states reachable from the initial
+    states are enumerated once into sparse arrays in the CSR layout: the actions of state s
+    are the rows stateStart[s]:stateStart[s+1], and the transitions of row a are the entries
+    rowStart[a]:rowStart[a+1] of nextIndex, probs and rewards. Every sweep of the iterations
+    is then a few vectorized numpy operations over all the transitions.
+    """
+
+    def __init__(self, game, discount=1.0, tolerance=1e-9, maxIterations=100000):
+        """
+        Constructor
+
+        game: the game object with the stochastic step() of the problem to be solved
+        discount: the discount factor of the future rewards, 1 for none
+        tolerance: the iterations stop when no value changes more than the tolerance
+        maxIterations: the most iterations before giving up converging
+        """
+        self.game = game
+        self.key = keyFunction(game)    # hash or encode the state for the index
+        self.discount = discount
+        self.tolerance = tolerance
+        self.maxIterations = maxIterations
+
+        self.index = {}         # the state index of every state key
+        self.states = []        # the reachable states
+        self.expanded = 0       # the states before are enumerated with their actions
+        self.stateStart = [0]   # the first action row of every state, and the end
+        self.actions = []       # the action of every row
+        self.rowStart = [0]     # the first transition of every row, and the end
+        self.nextIndex = []     # the next state index of every transition
+        self.probs = []         # the probability of every transition
+        self.rewards = []       # the reward of every transition
+        self.arrays = None      # the numpy arrays of the above, built by _freeze()
+
+        self.values = None      # the utility of every state
+        self.policy = None      # the optimal row of every state, -1 at the terminals
+        self.residuals = []     # the residual of every iteration of the last solve
+        self.counter = 0        # records how many states are enumerated
+
+    def compile(self, state):
+        """
+        Enumerates the states reachable from a state into the sparse arrays, adding to the
+        states enumerated before.
+
+        state: an initial state of the game
+        return: the index of the state
+        """
+        index = self._visit(state)
+        while self.expanded < len(self.states):
+            state = self.states[self.expanded]
+            for action in self.game.actionDomain(state):
+                nextStates, probs, rewards = self.transitions(state, action)
+                count = len(nextStates)
+                self.actions.append(action)
+                self.nextIndex.extend(self._visit(nextState) for nextState in nextStates)
+                self.probs.extend(np.broadcast_to(np.asarray(probs, float), count).tolist())
+                self.rewards.extend(np.broadcast_to(np.asarray(rewards, float), count).tolist())
+                self.rowStart.append(len(self.nextIndex))
+            self.stateStart.append(len(self.actions))
+            self.expanded += 1
+        return index
+
+    def transitions(self, state, action):
+        """
+        Steps forward with an action into all the possible next states.
+
+        state: a state of the game
+        action: the action to take
+        return: the next states, with their probabilities and rewards
+        """
+        return self.game.step(state, action)
+
+    def _visit(self, state):
+        """
+        Indexes a state, appending it to the states to enumerate if it is new.
+
+        state: a state of the game
+        return: the index of the state
+        """
+        stateKey = self.key(state)
+        index = self.index.get(stateKey)
+        if index is None:
+            index = self.index[stateKey] = len(self.states)
+            self.states.append(state)
+            self.counter += 1
+            self.arrays = None
+        return index
+
+    def _freeze(self):
+        """
+        Builds the numpy arrays of the enumerated states for the iterations.
+
+        return: a dict of the arrays
+        """
+        if self.arrays is None:
+            stateStart = np.array(self.stateStart, dtype=np.int64)
+            rowStart = np.array(self.rowStart, dtype=np.int64)
+            live = stateStart[:-1] < stateStart[1:]                 # not terminal
+            self.arrays = {
+                'stateOf': np.repeat(np.arange(len(self.states)), np.diff(stateStart)),
+                'rowOf': np.repeat(np.arange(len(self.actions)), np.diff(rowStart)),
+                'live': live,
+                'starts': stateStart[:-1][live],
+                'nextIndex': np.array(self.nextIndex, dtype=np.int64),
+                'probs': np.array(self.probs),
+                'rewards': np.array(self.rewards),
+            }
+        return self.arrays
+
+    def backup(self, values):
+        """
+        One Bellman backup of all the states.
+
+        values: the utility of every state
+        return: the expected utility of every row, and the max of every state
+        """
+        arrays = self._freeze()
+        targets = arrays['rewards'] + self.discount * values[arrays['nextIndex']]
+        q = np.bincount(arrays['rowOf'], weights=arrays['probs'] * targets,
+                        minlength=len(self.actions))
+        backed = np.zeros(len(self.states))
+        if len(arrays['starts']) > 0:
+            backed[arrays['live']] = np.maximum.reduceat(q, arrays['starts'])
+        return q, backed
+
+    def greedy(self, q, values):
+        """
+        Chooses the first action of the max expected utility in every state, the same as the
+        recursive solvers choose between ties.
+
+        q: the expected utility of every row
+        values: the max of every state
+        return: the optimal row of every state, -1 at the terminals
+        """
+        arrays = self._freeze()
+        rows = np.arange(len(self.actions))
+        candidates = np.where(q >= values[arrays['stateOf']], rows, len(self.actions))
+        policy = np.full(len(self.states), -1, dtype=np.int64)
+        if len(arrays['starts']) > 0:
+            policy[arrays['live']] = np.minimum.reduceat(candidates, arrays['starts'])
+        return policy
+
+    def _initialValues(self):
+        """
+        return: the values of the last solve for the states enumerated before, zeros for the
+                new ones, to start the iterations warm
+        """
+        values = np.zeros(len(self.states))
+        if self.values is not None:
+            values[:len(self.values)] = self.values
+        return values
+
+    def valueIteration(self):
+        """
+        Solves the utility of every enumerated state by value iteration, repeating the
+        Bellman backup until no value changes more than the tolerance.
+
+        return: the list of the max changes of the values, one every iteration
+        """
+        values = self._initialValues()
+        self.residuals = []
+        for _ in range(self.maxIterations):
+            q, backed = self.backup(values)
+            self.residuals.append(float(np.max(np.abs(backed - values), initial=0)))
+            values = backed
+            if self.residuals[-1] <= self.tolerance:
+                break
+        else:
+            raise RuntimeError('value iteration did not converge in %d iterations, residual %g'
+                               % (self.maxIterations, self.residuals[-1]))
+
+        self.values = values
+        self.policy = self.greedy(q, values)
+        return self.residuals
+
+    def policyIteration(self):
+        """
+        Solves the utility of every enumerated state by policy iteration, evaluating the
+        policy by vectorized sweeps, then improving it greedily, until the policy is stable.
+        An action is only replaced by a better one by more than the tolerance, so the ties
+        do not cycle.
+
+        return: the list of the Bellman residuals of the evaluated policies, one every
+                improvement
+        """
+        arrays = self._freeze()
+        values = self._initialValues()
+        q, backed = self.backup(values)
+        policy = self.greedy(q, backed)
+        self.residuals = []
+        for _ in range(self.maxIterations):
+            values = self.evaluate(policy, values)
+            q, backed = self.backup(values)
+            self.residuals.append(float(np.max(np.abs(backed - values), initial=0)))
+
+            best = self.greedy(q, backed)
+            live = arrays['live']
+            better = q[best[live]] > q[policy[live]] + self.tolerance
+            if not better.any():
+                break
+            policy[np.flatnonzero(live)[better]] = best[live][better]
+        else:
+            raise RuntimeError('policy iteration did not converge in %d iterations'
+                               % self.maxIterations)
+
+        self.values = values
+        self.policy = policy
+        return self.residuals
+
+    def evaluate(self, policy, values):
+        """
+        Evaluates the utility of every state following a policy, by sweeping until no value
+        changes more than the tolerance.
+
+        policy: the row of every state, -1 at the terminals
+        values: the initial guess of the utilities
+        return: the utility of every state
+        """
+        arrays = self._freeze()
+        chosen = np.zeros(len(self.actions), dtype=bool)
+        chosen[policy[policy >= 0]] = True
+        selected = chosen[arrays['rowOf']]
+        stateOf = arrays['stateOf'][arrays['rowOf'][selected]]
+        nextIndex = arrays['nextIndex'][selected]
+        probs = arrays['probs'][selected]
+        expected = np.bincount(stateOf, weights=probs * arrays['rewards'][selected],
+                               minlength=len(self.states))
+
+        for _ in range(self.maxIterations):
+            swept = expected + np.bincount(stateOf, minlength=len(self.states),
+                                           weights=probs * self.discount * values[nextIndex])
+            residual = np.max(np.abs(swept - values), initial=0)
+            values = swept
+            if residual <= self.tolerance:
+                return values
+        raise RuntimeError('policy evaluation did not converge in %d iterations, residual %g'
+                           % (self.maxIterations, residual))
+
+    def solve(self, state):
+        """
+        Solves the MDP from a state by value iteration, enumerating its reachable states
+        first if new, and answers from the solved values otherwise.
+
+        state: feed in the initial state of the game
+        return: the optimal action and the accumulated expected utility
+        """
+        index = self.compile(state)
+        if self.values is None or len(self.values) < len(self.states):
+            self.valueIteration()
+        row = self.policy[index]
+        return (None if row < 0 else self.actions[row]), self.values[index]
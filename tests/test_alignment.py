@@ -0,0 +1,62 @@
+"""
+test_alignment.py
+
+Regression tests of the DNA aligners, run python -m pytest from the root.
+"""
+import random
+from dna import DnaAlignGame
+from alignment import BandedAligner, LinearAligner
+
+
+def test_xdrop_reports_pruning():
+    game = DnaAlignGame()
+    alignment = BandedAligner(game, xdrop=10).align('CCTCCGCCT', 'TCGTGAATT')
+    assert LinearAligner(game).score('CCTCCGCCT', 'TCGTGAATT') == -4
+    assert alignment.score == -7 and alignment.dropHit
+
+
+def test_banded_exact_unless_hit():
+    game = DnaAlignGame()
+    linear = LinearAligner(game)
+    rng = random.Random(0)
+    for _ in range(300):
+        x = ''.join(rng.choice('ACGT') for _ in range(rng.randint(0, 12)))
+        y = ''.join(rng.choice('ACGT') for _ in range(rng.randint(0, 12)))
+        for band, xdrop in ((None, 10), (None, 30), (3, None), (3, 20)):
+            alignment = BandedAligner(game, band, xdrop).align(x, y)
+            if not alignment.bandHit and not alignment.dropHit:
+                assert alignment.score == linear.score(x, y), (x, y, band, xdrop)
+
+
+def mutate(rng, x, edits):
+    y = list(x)
+    for _ in range(edits):
+        k = rng.randrange(len(y) + 1)
+        if rng.random() < 0.5:
+            y.insert(k, rng.choice('ACGT'))
+        elif y:
+            y[min(k, len(y) - 1)] = rng.choice('ACGT')
+    return ''.join(y)
+
+
+def test_narrow_band_exact_unless_hit():
+    game = DnaAlignGame()
+    linear = LinearAligner(game)
+    alignment = BandedAligner(game, 1).align('CGGGTCGCTAAGATCTGAGGATTTT', 'TCTTGAACGGTTATATCACTTC')
+    assert alignment.score == 1 and alignment.bandHit
+    rng = random.Random(0)
+    for _ in range(200):
+        x = ''.join(rng.choice('ACGT') for _ in range(rng.randint(20, 80)))
+        for y in (mutate(rng, x, rng.randint(0, 8)),
+                  ''.join(rng.choice('ACGT') for _ in range(rng.randint(20, 80)))):
+            for band in (1, 2):
+                alignment = BandedAligner(game, band).align(x, y)
+                if not alignment.bandHit:
+                    assert alignment.score == linear.score(x, y), (x, y, band)
+
+
+def test_xdrop_without_gap_penalty():
+    game = DnaAlignGame()
+    game.penalty_insdel = 0
+    alignment = BandedAligner(game, xdrop=10).align('GATTACA', 'GCATGCT')
+    assert alignment.score == LinearAligner(game).score('GATTACA', 'GCATGCT')
@@ -0,0 +1,16 @@
+"""
+test_blackjack.py
+
+Regression tests of the Blackjack games, run python -m pytest from the root.
+"""
+import numpy as np
+import pytest
+from blackjack import BlackjackGame, PROBS
+
+
+def test_step_probabilities_are_read_only():
+    game = BlackjackGame()
+    _, probs, _ = game.step(game.reset(0, 12, 5), 0)
+    with pytest.raises(ValueError):
+        probs /= probs.sum()
+    np.testing.assert_allclose(PROBS.sum(), 1.)
@@ -0,0 +1,50 @@
+"""
+test_dna.py
+
+Regression tests of the DNA alignment game with the solver, run python -m pytest from the root.
+"""
+from dpsolver import DeterministicSolver, ArrayCache
+from dna import DnaAlignGame
+
+
+def fresh(x, y):
+    game = DnaAlignGame()
+    return DeterministicSolver(game).solve(game.reset(x, y))[1]
+
+
+def test_solver_reused_across_resets():
+    game = DnaAlignGame()
+    solver = DeterministicSolver(game)
+    for x, y in (('AAAA', 'AAAA'), ('CCCC', 'GGGG'), ('ACGTA', 'AGT'), ('AAAA', 'AAAA')):
+        utility = solver.solve(game.reset(x, y))[1]
+        assert utility == fresh(x, y)
+    assert fresh('CCCC', 'GGGG') == -8
+
+
+def test_solver_before_reset():
+    game = DnaAlignGame()
+    solver = DeterministicSolver(game)
+    assert solver.solve(game.reset('GATTACA', 'GCATGCT'))[1] == fresh('GATTACA', 'GCATGCT')
+
+
+def test_dense_cache_per_instance():
+    game = DnaAlignGame()
+    solver = DeterministicSolver(game)
+    for x, y in (('ACGTA', 'AGT'), ('GATTACA', 'GCATGCT')):
+        solver.solve(game.reset(x, y))
+        assert game.encodeSize() == (len(x) + 1) * (len(y) + 1)
+    assert [len(cache.filled) for cache in solver.cache.caches.values()] == [6 * 4, 8 * 8]
+    assert all(isinstance(cache, ArrayCache) for cache in solver.cache.caches.values())
+
+
+def test_policy_is_dense_per_instance():
+    game = DnaAlignGame()
+    solver = DeterministicSolver(game)
+    for x, y in (('ACGTA', 'AGT'), ('GATTACA', 'GCATGCT')):
+        state = game.reset(x, y)
+        utility = solver.solve(state)[1]
+    policy = solver.policy()
+    assert len(policy.instances) == 2
+    for instance in policy.instances.values():
+        assert instance.table is None and instance.actions.dtype.itemsize == 1
+    assert sum(reward for _, _, reward in policy.path(state)) == utility
@@ -0,0 +1,52 @@
+"""
+test_dpcli.py
+
+Regression tests of the command line, run python -m pytest from the root.
+"""
+import sys
+import json
+import subprocess
+import numpy as np
+from dpcli import main
+
+
+def test_tables_have_the_decoded_states(tmp_path, capsys):
+    instances = tmp_path / 'instances.json'
+    instances.write_text(json.dumps([
+        {'capacity': 7, 'items': [2, 1], 'weights': [2, 3], 'values': [3, 4]},
+        {'capacity': 5, 'items': [1, 1, 2], 'weights': [1, 2, 2], 'values': [1, 3, 2]}]))
+    prefix = str(tmp_path / 'knapsack')
+    assert main(['knapsack', str(instances), '--out', prefix]) == 0
+    table = {name: np.load('%s_%s.npy' % (prefix, name))
+             for name in ('instance', 'key', 'item0', 'item1', 'item2', 'capacity')}
+    first = table['instance'] == 0
+    assert table['item2'][first].max() == 0
+    assert 7. in table['capacity'][first] and 5. in table['capacity'][~first]
+    initial = first & (table['item0'] == 2) & (table['item1'] == 1)
+    assert table['capacity'][initial].tolist() == [7.]
+    assert table['key'][initial].tolist() == [2 * 1 + 1 * 3]
+
+    instances.write_text(json.dumps({'x': 'ACGT', 'y': 'AGT'}))
+    prefix = str(tmp_path / 'dna')
+    assert main(['dna', str(instances), '--out', prefix, '--format', 'csv']) == 0
+    with open(prefix + '.csv') as f:
+        header = f.readline().strip().split(',')
+        rows = [dict(zip(header, line.strip().split(','))) for line in f]
+    assert header[:4] == ['instance', 'key', 'i', 'j']
+    offsets = {(int(row['i']), int(row['j'])) for row in rows}
+    assert (0, 0) in offsets and all(i <= 4 and j <= 3 for i, j in offsets)
+    assert len(capsys.readouterr().out.splitlines()) == 3
+
+
+def test_blackjack_memory_spills(tmp_path, capsys):
+    prefix = str(tmp_path / 'blackjack')
+    spill = tmp_path / 'spill'
+    assert main(['blackjack', '--memory', '1', '--spill', str(spill), '--out', prefix]) == 0
+    assert json.loads(capsys.readouterr().out)['cells'] == 260
+    assert not spill.exists()
+
+
+def test_module_runs_the_command_line():
+    done = subprocess.run([sys.executable, '-m', 'dpcli', '--help'], check=True,
+                          stdout=subprocess.PIPE, universal_newlines=True)
+    assert 'python -m dpcli' in done.stdout
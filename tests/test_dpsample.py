@@ -0,0 +1,59 @@
+"""
+test_dpsample.py
+
+Regression tests of the sampling solver, run python -m pytest from the root.
+"""
+from dpsolver import BoundedCache
+import numpy as np
+import pytest
+from dpsample import SampledSolver, normalQuantile
+from blackjack import BlackjackGame, ShoeBlackjackGame
+
+
+def test_spilled_estimates_keep_their_errors(tmp_path):
+    game = ShoeBlackjackGame(1)
+    cache = BoundedCache(20000, spill=str(tmp_path / 'spill'))
+    solver = SampledSolver(game, 8, cache=cache)
+    for playersum in (19, 20):
+        for dealercard in range(1, 11):
+            optimal, utility, error = solver.estimate(game.reset(0, playersum, dealercard))
+            assert error >= 0
+    assert cache.stats()['spillReads'] > 0
+    cache.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_many_workers_estimate_with_the_same_options():
+    game = ShoeBlackjackGame(1)
+    states = [game.reset(0, playersum, 10) for playersum in (12, 20)]
+    solver = SampledSolver(game, 4, seed=3)
+    results = list(solver.solveMany(states, 2))
+    assert sorted(len(result) for result in results) == [3, 3]
+    for _, optimal, utility in results:
+        assert optimal is not None and -1.5 <= utility <= 1.5
+    with pytest.raises(ValueError):
+        list(solver.solveMany(states, 2, alphas=[0., 0.]))
+
+
+def test_exact_only_apis_are_disabled():
+    game = BlackjackGame()
+    solver = SampledSolver(game, 4)
+    state = game.reset(0, 16, 10)
+    with pytest.raises(NotImplementedError):
+        solver.solveAnytime(state)
+    solver.solve(state)
+    policy = solver.policy()
+    assert policy.stochastic
+    first, action, _ = next(policy.path(state, np.random.RandomState(0)))
+    assert first is state and action == policy.action(state)
+
+
+def test_interval_uses_the_normal_quantile():
+    assert abs(normalQuantile(0.975) - 1.959964) < 1e-6
+    assert abs(normalQuantile(0.5)) < 1e-12
+    game = BlackjackGame()
+    solver = SampledSolver(game, 16)
+    low, high = solver.interval(game.reset(0, 16, 10), 0.95)
+    _, utility, _ = solver.estimate(game.reset(0, 16, 10))
+    assert low <= utility <= high
+    assert abs((utility - low) - (high - utility)) < 1e-9
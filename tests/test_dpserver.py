@@ -0,0 +1,68 @@
+"""
+test_dpserver.py
+
+Regression tests of the solve service, run python -m pytest from the root.
+"""
+import threading
+import urllib.error
+import pytest
+from dpsolver import DeterministicSolver, StochasticSolver
+from dpserver import SolveService, serve, post
+from dna import DnaAlignGame
+from blackjack import BlackjackGame
+
+
+def fresh(x, y, **scores):
+    game = DnaAlignGame()
+    for name, score in scores.items():
+        setattr(game, name, score)
+    return DeterministicSolver(game).solve(game.reset(x, y))[1]
+
+
+def test_instances_share_a_solver():
+    service = SolveService()
+    requests = [dict(game='dna', x='AAAA', y='AAAA'), dict(game='dna', x='CCCC', y='GGGG'),
+                dict(game='dna', x='GATTACA', y='GCATGCT', penalty_subst=-3),
+                dict(game='dna', x='GATTACA', y='GCATGCT'), dict(game='dna', x='AAAA', y='AAAA')]
+    answers = service.solve(requests, timeout=60)
+    assert [answer['utility'] for answer in answers] == [
+        fresh('AAAA', 'AAAA'), fresh('CCCC', 'GGGG'),
+        fresh('GATTACA', 'GCATGCT', penalty_subst=-3), fresh('GATTACA', 'GCATGCT'),
+        fresh('AAAA', 'AAAA')]
+    assert list(service.solvers) == ['dna']
+    assert service.solve(requests[1:2], timeout=60)[0]['cached']
+
+
+def test_warm_caches_are_bounded():
+    service = SolveService(maxEntries=10, cacheBudget=20000)
+    requests = [dict(game='dna', x=x, y='GCATGCT') for x in ('GATTACA', 'CATTAGA', 'ACGTACG')]
+    answers = service.solve(requests + requests[:1], timeout=60)
+    assert [answer['utility'] for answer in answers] == [
+        fresh(request['x'], request['y']) for request in requests + requests[:1]]
+    metrics = service.report()['solvers']['dna']
+    assert metrics['evictions'] > 0 and metrics['entries'] < 28     # 28 unbounded
+
+    game = BlackjackGame()
+    exact = StochasticSolver(game)
+    requests = [dict(game='blackjack', usableace=0, playersum=playersum, dealercard=10)
+                for playersum in range(4, 21)]
+    answers = service.solve(requests, timeout=60)
+    for request, answer in zip(requests, answers):
+        state = game.reset(0, request['playersum'], 10)
+        assert abs(answer['utility'] - exact.solve(state)[1]) < 1e-9
+    assert service.report()['solvers']['blackjack:0']['evictions'] > 0
+    service.solvers['blackjack:0'].cache.close()
+
+
+def test_handler_times_out():
+    server = serve(0, service=SolveService(window=0.5, timeout=0.01))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post('http://127.0.0.1:%d' % server.server_port,
+                 dict(game='dna', x='GATTACA', y='GCATGCT'))
+        assert error.value.code == 504
+    finally:
+        server.shutdown()
+        server.server_close()
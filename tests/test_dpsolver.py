@@ -0,0 +1,102 @@
+"""
+test_dpsolver.py
+
+Regression tests of the caches and the solvers, run python -m pytest from the root.
+"""
+import pytest
+from dpsolver import ArrayCache, BoundedCache, DeterministicSolver, StochasticSolver, makeCache
+from blackjack import BlackjackGame
+from dna import DnaAlignGame
+from knapsack import KnapsackGame
+
+
+class SizedGame(object):
+
+    """
+    A game with encode() of a given range, only for choosing the cache.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+    def encode(self, state):
+        return state
+
+    def encodeSize(self):
+        return self.size
+
+
+def test_make_cache_dense_only_for_small_ranges():
+    assert isinstance(makeCache(SizedGame(1000)), ArrayCache)
+    assert makeCache(SizedGame(2 ** 40)) == {}
+    assert makeCache(SizedGame(0)) == {}
+
+
+def test_array_cache_keeps_large_keys_sparse():
+    cache = ArrayCache(16)
+    cache[3] = None, 1, 2.
+    cache[2 ** 40] = None, 0, 5.
+    assert len(cache.filled) == 16
+    assert cache[2 ** 40] == (None, 0, 5.)
+    assert cache[3] == (None, 1, 2.)
+    assert len(cache) == 2
+
+
+def test_lfu_cache_reads_back_spilled_entries(tmp_path):
+    game = DnaAlignGame()
+    exact = DeterministicSolver(game).solve(game.reset('GTCAGCTTAC', 'TAGCATCGAC'))
+    for iterative in (False, True):
+        cache = BoundedCache(1000, 'lfu', str(tmp_path / 'spill'))
+        solver = DeterministicSolver(game, iterative, cache)
+        assert solver.solve(game.reset('GTCAGCTTAC', 'TAGCATCGAC')) == exact
+        assert cache.stats()['spillReads'] > 0
+        cache.close()
+
+
+def test_lfu_cache_does_not_thrash(tmp_path):
+    evictions = {}
+    for policy in ('lru', 'lfu'):
+        game = BlackjackGame()
+        cache = BoundedCache(30000, policy, str(tmp_path / policy))
+        solver = StochasticSolver(game, cache=cache)
+        for playersum in range(4, 21):
+            for dealercard in range(1, 11):
+                solver.solve(game.reset(0, playersum, dealercard))
+        evictions[policy] = cache.stats()['evictions']
+        cache.close()
+    assert evictions['lfu'] < 1.5 * evictions['lru']
+
+
+def test_bounded_cache_does_not_solve_evicted_again():
+    solved = []
+    for cache in (None, BoundedCache(30000), BoundedCache(30000, 'lfu')):
+        game = BlackjackGame()
+        solver = StochasticSolver(game, cache=cache)
+        for playersum in range(4, 21):
+            solver.solve(game.reset(0, playersum, 10))
+        solved.append(solver.cachedCounter)
+        if cache is not None:
+            assert cache.stats()['evictions'] > 0 and cache.stats()['spillReads'] > 0
+            cache.close()
+    assert max(solved) <= 1.05 * solved[0]
+
+
+def test_bounded_cache_deletes_spilled_entries():
+    cache = BoundedCache(0)
+    for key in range(3):
+        cache[key] = None, key, 1.
+    del cache[0]
+    assert 0 not in cache and 1 in cache and len(cache) == 1
+    with pytest.raises(KeyError):
+        del cache[0]
+    cache.close()
+
+
+def test_load_before_reset(tmp_path):
+    game = DnaAlignGame()
+    solver = DeterministicSolver(game)
+    solver.solve(game.reset('GATTACA', 'GCATGCT'))
+    solver.save(str(tmp_path / 'dna.dpstore'))
+    for game in (DnaAlignGame(), KnapsackGame()):
+        with pytest.raises(ValueError, match='reset'):
+            DeterministicSolver(game).load(str(tmp_path / 'dna.dpstore'))
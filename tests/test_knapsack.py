@@ -0,0 +1,98 @@
+"""
+test_knapsack.py
+
+Regression tests of the knapsack game with the solver, run python -m pytest from the root.
+"""
+import numpy as np
+import pytest
+from dpsolver import DeterministicSolver, InstanceCache, ArrayCache
+from knapsack import KnapsackGame, KnapsackEngine
+from benchmarks import knapsackInstance
+
+ITEMS = np.array([1, 2, 1, 3])
+WEIGHTS = np.array([4., 3., 5., 2.])
+VALUES = np.array([9., 5., 11., 3.5])
+
+
+def fresh(capacity, values=VALUES):
+    game = KnapsackGame()
+    return DeterministicSolver(game).solve(game.reset(capacity, ITEMS, WEIGHTS, values))[1]
+
+
+def test_solver_reused_across_capacities():
+    game = KnapsackGame()
+    solver = DeterministicSolver(game)
+    for capacity in (10., 20., 5., 10.):
+        utility = solver.solve(game.reset(capacity, ITEMS, WEIGHTS, VALUES))[1]
+        assert utility == fresh(capacity)
+
+
+def test_solve_many_roots_of_capacities():
+    game = KnapsackGame()
+    solver = DeterministicSolver(game)
+    roots = [game.reset(capacity, ITEMS, WEIGHTS, VALUES) for capacity in (5., 10., 20.)]
+    utilities = [utility for _, _, utility in solver.solveMany(roots, workers=1)]
+    assert utilities == [fresh(5.), fresh(10.), fresh(20.)]
+
+
+def test_solver_reused_across_values():
+    game = KnapsackGame()
+    solver = DeterministicSolver(game)
+    solver.solve(game.reset(10., ITEMS, WEIGHTS, VALUES))
+    assert solver.solve(game.reset(10., ITEMS, WEIGHTS, VALUES * 2))[1] == fresh(10., VALUES * 2)
+
+
+def test_solve_parallel_with_incumbent():
+    for iterative in (False, True):
+        game = KnapsackGame()
+        solver = DeterministicSolver(game, iterative)
+        state = game.reset(20., ITEMS, WEIGHTS, VALUES)
+        assert solver.solveParallel(state, workers=2)[1] == fresh(20.)
+
+
+def test_dense_cache_per_instance():
+    game = KnapsackGame()
+    solver = DeterministicSolver(game)
+    for capacity in (10., 20.):
+        state = game.reset(capacity, ITEMS, WEIGHTS, VALUES)
+        solver.solve(state)
+        assert 0 <= game.encode(state) < game.encodeSize() == 2 * 3 * 2 * 4
+    assert isinstance(solver.cache, InstanceCache) and len(solver.cache.caches) == 2
+    assert all(isinstance(cache, ArrayCache) for cache in solver.cache.caches.values())
+
+
+def test_policy_is_dense_per_instance():
+    game = KnapsackGame()
+    solver = DeterministicSolver(game)
+    roots = [game.reset(capacity, ITEMS, WEIGHTS, VALUES) for capacity in (10., 20.)]
+    for root in roots:
+        solver.solve(root)
+    policy = solver.policy()
+    for instance in policy.instances.values():
+        assert instance.table is None and instance.actions.dtype == np.int8
+        assert len(instance.actions) <= game.encodeSize()
+    for root in roots:
+        assert sum(reward for _, _, reward in policy.path(root)) == solver.solve(root)[1]
+
+
+def test_solve_parallel_work_close_to_serial():
+    instance = knapsackInstance(15, 0)
+    game = KnapsackGame()
+    serial = DeterministicSolver(game)
+    utility = serial.solve(game.reset(*instance))[1]
+    for workers in (2, 4):
+        solver = DeterministicSolver(game)
+        assert solver.solveParallel(game.reset(*instance), workers)[1] == utility
+        assert solver.cachedCounter <= 1.3 * serial.cachedCounter
+
+
+def test_engine_rejects_scales_over_the_limit():
+    engine = KnapsackEngine(maxScale=100)
+    weights = np.array([0.5, 0.25, 1.1, 2.])
+    engine.reset(10, ITEMS, weights, VALUES)
+    assert engine.scale == 20
+    game = KnapsackGame()
+    exact = DeterministicSolver(game).solve(game.reset(10, ITEMS, weights, VALUES))[1]
+    assert abs(engine.solve()[0] - exact) < 1e-9
+    with pytest.raises(ValueError):     # each denominator is under 100, their LCM is not
+        engine.reset(10, ITEMS, [1 / 7., 1 / 11., 1 / 13., 2.], VALUES)